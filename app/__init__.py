@@ -1 +1,5 @@
 # Bible Study Generator Application
+import time
+
+# Reference point for the startup timing report (see app.startup)
+STARTED = time.monotonic()
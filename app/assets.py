@@ -0,0 +1,216 @@
+"""
+Fingerprinted, precompressed static assets
+
+    python -m app.assets
+
+copies static/ into STATIC_BUILD_DIR with content-hashed names (style.css ->
+style.<hash>.css) plus gzip and brotli variants, and writes manifest.json.
+The app runs the same build at startup, skipping files already built, so a
+build-time run (see the Dockerfile) leaves nothing to do on a cold instance.
+"""
+import os
+import sys
+import gzip
+import json
+import time
+import hashlib
+import logging
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.exceptions import HTTPException
+from starlette.responses import Response
+from starlette.staticfiles import StaticFiles
+from app.cache import atomic_write, DATA_DIR
+
+logger = logging.getLogger(__name__)
+
+# Source static files, and where fingerprinted and precompressed copies are written
+STATIC_DIR = os.getenv("STATIC_DIR", "static")
+STATIC_BUILD_DIR = os.getenv("STATIC_BUILD_DIR", os.path.join(DATA_DIR, "static"))
+
+# Text types get compressed variants (images and fonts are compressed already)
+COMPRESSIBLE_EXTENSIONS = (".css", ".js", ".html", ".svg", ".json", ".txt", ".map")
+
+# Precompressed variants by encoding, in order of preference
+ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+
+# A fingerprinted URL always names the same bytes, so browsers keep it for a
+# year without revalidating; unversioned URLs are revalidated on every use
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE_CONTROL = "no-cache"
+
+# Dynamic responses of these types are gzipped when at least GZIP_MINIMUM_SIZE bytes
+COMPRESSIBLE_TYPES = ("application/json", "text/html", "text/plain")
+GZIP_MINIMUM_SIZE = int(os.getenv("GZIP_MINIMUM_SIZE", 1000))
+
+
+def fingerprinted_name(path: str, data: bytes) -> str:
+    """path with a hash of the content before its extension"""
+    base, extension = os.path.splitext(path)
+    return f"{base}.{hashlib.sha256(data).hexdigest()[:12]}{extension}"
+
+
+def compress(data: bytes, encoding: str) -> bytes:
+    """Compressed data, or None if the encoding is unavailable (brotli is optional)"""
+    if encoding == "gzip":
+        return gzip.compress(data, compresslevel=9, mtime=0)
+    try:
+        import brotli
+    except ImportError:
+        return None
+    return brotli.compress(data, quality=11)
+
+
+def write_if_changed(path: str, data: bytes) -> bool:
+    """Atomically write a file unless it already holds data; returns whether it was written"""
+    try:
+        with open(path, "rb") as f:
+            if f.read() == data:
+                return False
+    except FileNotFoundError:
+        pass
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    atomic_write(path, data)
+    return True
+
+
+def build_assets(source_dir: str = STATIC_DIR, build_dir: str = STATIC_BUILD_DIR) -> dict:
+    """
+    Copy static files into build_dir under their own and fingerprinted names,
+    with compressed variants of text files smaller than the original
+    Returns the manifest: source path -> fingerprinted path (relative, with /)
+    """
+    start = time.monotonic()
+    manifest = {}
+    written = 0
+    missing_encodings = set()
+
+    for root, _, files in os.walk(source_dir):
+        for name in sorted(files):
+            source = os.path.join(root, name)
+            path = os.path.relpath(source, source_dir).replace(os.sep, "/")
+            with open(source, "rb") as f:
+                data = f.read()
+            manifest[path] = fingerprinted_name(path, data)
+
+            variants = {"": data}
+            if path.endswith(COMPRESSIBLE_EXTENSIONS):
+                for encoding, suffix in ENCODINGS:
+                    # Content-addressed variants only need compressing once
+                    if os.path.exists(os.path.join(build_dir, manifest[path] + suffix)):
+                        with open(os.path.join(build_dir, manifest[path] + suffix), "rb") as f:
+                            variants[suffix] = f.read()
+                        continue
+                    compressed = compress(data, encoding)
+                    if compressed is None:
+                        missing_encodings.add(encoding)
+                    elif len(compressed) < len(data):
+                        variants[suffix] = compressed
+
+            for target in (path, manifest[path]):
+                for suffix, content in variants.items():
+                    written += write_if_changed(os.path.join(build_dir, target + suffix), content)
+
+    write_if_changed(
+        os.path.join(build_dir, "manifest.json"), json.dumps(manifest, indent=2, sort_keys=True).encode("utf-8")
+    )
+    if missing_encodings:
+        logger.info(f"Not writing {', '.join(sorted(missing_encodings))} variants (brotli is not installed)")
+    logger.info(f"Built {len(manifest)} static assets in {time.monotonic() - start:.3f}s ({written} files written)")
+    return manifest
+
+
+def accepted_encodings(headers: Headers) -> set:
+    """Content codings the client accepts (ignoring any with q=0)"""
+    accepted = set()
+    for token in headers.get("accept-encoding", "").split(","):
+        coding, _, params = token.partition(";")
+        if params.replace(" ", "").lower() in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            continue
+        if coding.strip():
+            accepted.add(coding.strip().lower())
+    return accepted
+
+
+class StaticAssets(StaticFiles):
+    """
+    Serves built static files, picking a precompressed variant by
+    Accept-Encoding; fingerprinted files are cached as immutable
+    """
+
+    def __init__(self, directory: str, manifest: dict):
+        super().__init__(directory=directory)
+        self.immutable = set(manifest.values())
+
+    async def get_response(self, path: str, scope) -> Response:
+        accepted = accepted_encodings(Headers(scope=scope))
+        response = None
+        for encoding, suffix in ENCODINGS:
+            if encoding not in accepted:
+                continue
+            try:
+                response = await super().get_response(path + suffix, scope)
+            except HTTPException:
+                continue
+            # The media type is already guessed from the name without the suffix
+            if response.status_code == 200:
+                response.headers["Content-Encoding"] = encoding
+            break
+        if response is None:
+            response = await super().get_response(path, scope)
+
+        response.headers["Vary"] = "Accept-Encoding"
+        is_immutable = path.replace(os.sep, "/") in self.immutable
+        response.headers["Cache-Control"] = IMMUTABLE_CACHE_CONTROL if is_immutable else REVALIDATE_CACHE_CONTROL
+        return response
+
+
+class CompressionMiddleware:
+    """
+    ASGI middleware gzipping complete JSON, HTML and plain-text responses
+    Streamed responses (Server-Sent Events, files) pass through untouched, so
+    events are never held back in a compression buffer
+    """
+
+    def __init__(self, app, minimum_size: int = GZIP_MINIMUM_SIZE, compresslevel: int = 6):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.compresslevel = compresslevel
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or "gzip" not in accepted_encodings(Headers(scope=scope)):
+            await self.app(scope, receive, send)
+            return
+
+        held = None
+
+        async def send_compressed(message):
+            nonlocal held
+            if message["type"] == "http.response.start":
+                headers = Headers(raw=message["headers"])
+                content_type = headers.get("content-type", "").split(";")[0].strip()
+                if content_type in COMPRESSIBLE_TYPES and "content-encoding" not in headers:
+                    # Hold the headers until the body shows whether to compress
+                    held = message
+                    return
+            elif message["type"] == "http.response.body" and held is not None:
+                start, held = held, None
+                body = message.get("body", b"")
+                if not message.get("more_body", False) and len(body) >= self.minimum_size:
+                    body = gzip.compress(body, compresslevel=self.compresslevel)
+                    headers = MutableHeaders(raw=start["headers"])
+                    headers["Content-Encoding"] = "gzip"
+                    headers["Content-Length"] = str(len(body))
+                    headers.add_vary_header("Accept-Encoding")
+                    message = {**message, "body": body}
+                await send(start)
+            await send(message)
+
+        await self.app(scope, receive, send_compressed)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    source_dir = sys.argv[1] if len(sys.argv) > 1 else STATIC_DIR
+    build_dir = sys.argv[2] if len(sys.argv) > 2 else STATIC_BUILD_DIR
+    build_assets(source_dir, build_dir)
@@ -1,9 +1,11 @@
 import os
+import threading
+from datetime import datetime
 from fastapi import Request, HTTPException
 from fastapi.responses import RedirectResponse
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import Flow
-from googleapiclient.discovery import build
+
+# The Google auth and API client libraries are imported on first use to keep
+# cold starts fast (/health and /login do not need them)
 
 # Allow OAuth over HTTP (Cloud Run terminates HTTPS, so internal traffic is HTTP)
 os.environ['OAUTHLIB_INSECURE_TRANSPORT'] = '1'
@@ -21,8 +23,74 @@ SCOPES = [
 ]
 
 
-def get_oauth_flow(request: Request) -> Flow:
+class CredentialCache:
+    """
+    Live Google credentials per user, shared across requests
+    Google's transports refresh an expired access token in place, so keeping
+    the object means one refresh per hour instead of one per request
+    """
+
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, user_key: str, refresh_token: str):
+        """Cached credentials for a user, or None (also after a new login)"""
+        with self._lock:
+            credentials = self._entries.get(user_key)
+        if credentials is None or credentials.refresh_token != refresh_token:
+            return None
+        return credentials
+
+    def set(self, user_key: str, credentials):
+        with self._lock:
+            self._entries[user_key] = credentials
+
+    def discard(self, user_key: str):
+        with self._lock:
+            self._entries.pop(user_key, None)
+
+
+credential_cache = CredentialCache()
+
+
+def credentials_to_session(credentials) -> dict:
+    """Serialize credentials for the session cookie"""
+    return {
+        "token": credentials.token,
+        "refresh_token": credentials.refresh_token,
+        "token_uri": credentials.token_uri,
+        "client_id": credentials.client_id,
+        "client_secret": credentials.client_secret,
+        "scopes": credentials.scopes,
+        "expiry": credentials.expiry.isoformat() if credentials.expiry else None
+    }
+
+
+def credentials_from_session(creds_data: dict):
+    """Rebuild credentials stored by credentials_to_session"""
+    from google.oauth2.credentials import Credentials
+    expiry = creds_data.get("expiry")
+    return Credentials(
+        token=creds_data["token"],
+        refresh_token=creds_data.get("refresh_token"),
+        token_uri=creds_data["token_uri"],
+        client_id=creds_data["client_id"],
+        client_secret=creds_data["client_secret"],
+        scopes=creds_data["scopes"],
+        expiry=datetime.fromisoformat(expiry) if expiry else None
+    )
+
+
+def load_credentials(path: str):
+    """Load credentials from an authorized-user OAuth file (client_id, client_secret, refresh_token)"""
+    from google.oauth2.credentials import Credentials
+    return Credentials.from_authorized_user_file(path, SCOPES)
+
+
+def get_oauth_flow(request: Request):
     """Create OAuth flow instance"""
+    from google_auth_oauthlib.flow import Flow
     client_config = {
         "web": {
             "client_id": os.getenv("GOOGLE_CLIENT_ID"),
@@ -74,6 +142,7 @@ async def oauth_callback(request: Request):
     credentials = flow.credentials
 
     # Get user info
+    from googleapiclient.discovery import build
     service = build('oauth2', 'v2', credentials=credentials)
     user_info = service.userinfo().get().execute()
 
@@ -86,14 +155,8 @@ async def oauth_callback(request: Request):
         )
 
     # Store credentials and user info in session
-    request.session["credentials"] = {
-        "token": credentials.token,
-        "refresh_token": credentials.refresh_token,
-        "token_uri": credentials.token_uri,
-        "client_id": credentials.client_id,
-        "client_secret": credentials.client_secret,
-        "scopes": credentials.scopes
-    }
+    request.session["credentials"] = credentials_to_session(credentials)
+    credential_cache.set(user_info.get("email"), credentials)
     request.session["user"] = {
         "email": user_info.get("email"),
         "name": user_info.get("name"),
@@ -105,6 +168,7 @@ async def oauth_callback(request: Request):
 
 async def logout(request: Request):
     """Logout user and clear session"""
+    credential_cache.discard((request.session.get("user") or {}).get("email"))
     request.session.clear()
     return RedirectResponse(url="/login")
 
@@ -114,17 +178,26 @@ async def get_current_user(request: Request):
     return request.session.get("user")
 
 
-def get_credentials(request: Request) -> Credentials:
-    """Get Google credentials from session"""
+def get_credentials(request: Request):
+    """Get the user's live Google credentials (cached server-side per user)"""
     creds_data = request.session.get("credentials")
     if not creds_data:
         raise HTTPException(status_code=401, detail="Not authenticated")
 
-    return Credentials(
-        token=creds_data["token"],
-        refresh_token=creds_data.get("refresh_token"),
-        token_uri=creds_data["token_uri"],
-        client_id=creds_data["client_id"],
-        client_secret=creds_data["client_secret"],
-        scopes=creds_data["scopes"]
-    )
+    user_key = (request.session.get("user") or {}).get("email")
+    credentials = credential_cache.get(user_key, creds_data.get("refresh_token"))
+    if credentials is None:
+        credentials = credentials_from_session(creds_data)
+        credential_cache.set(user_key, credentials)
+    elif creds_data.get("expiry") and (
+        credentials.expiry is None or datetime.fromisoformat(creds_data["expiry"]) > credentials.expiry
+    ):
+        # Another worker refreshed the token and stored it in the shared session
+        credentials.token = creds_data["token"]
+        credentials.expiry = datetime.fromisoformat(creds_data["expiry"])
+
+    # Write refreshed tokens back so other instances and restarts reuse them
+    if credentials.token != creds_data["token"]:
+        request.session["credentials"] = credentials_to_session(credentials)
+
+    return credentials
@@ -0,0 +1,176 @@
+import os
+import json
+import asyncio
+import sqlite3
+import logging
+import threading
+from datetime import datetime
+from app.jobs import JOBS_DB_PATH
+
+logger = logging.getLogger(__name__)
+
+# Seconds between checks on submitted batches (Anthropic batches finish within 24 hours)
+BATCH_POLL_INTERVAL = float(os.getenv("BATCH_POLL_INTERVAL", 60))
+
+# Result statuses, as reported per request by the Message Batches API
+SUCCEEDED = "succeeded"
+ERRORED = "errored"
+CANCELED = "canceled"
+EXPIRED = "expired"
+
+
+class AnthropicBatchClient:
+    """
+    Message Batches API client
+    Results are returned per custom_id as dicts with status, text, stop_reason
+    and usage (or error), so other clients (e.g. a local fake) can stand in
+    """
+
+    def __init__(self, client=None):
+        self._client = client
+
+    @property
+    def client(self):
+        if self._client is None:
+            from app.providers import get_anthropic_client
+            self._client = get_anthropic_client()
+        return self._client
+
+    async def create(self, requests: list) -> str:
+        """Submit [{"custom_id", "params"}] requests; returns the batch ID"""
+        batch = await self.client.beta.messages.batches.create(requests=requests)
+        return batch.id
+
+    async def ended(self, batch_id: str) -> bool:
+        batch = await self.client.beta.messages.batches.retrieve(batch_id)
+        return batch.processing_status == "ended"
+
+    async def results(self, batch_id: str) -> dict:
+        results = {}
+        async for entry in await self.client.beta.messages.batches.results(batch_id):
+            result = entry.result
+            if result.type == SUCCEEDED:
+                message = result.message
+                results[entry.custom_id] = {
+                    "status": SUCCEEDED,
+                    "text": "".join(block.text for block in message.content if block.type == "text"),
+                    "stop_reason": message.stop_reason,
+                    "usage": message.usage.model_dump()
+                }
+            elif result.type == ERRORED:
+                results[entry.custom_id] = {"status": ERRORED, "error": str(result.error.error.message)}
+            else:
+                results[entry.custom_id] = {"status": result.type, "error": f"Request {result.type}"}
+        return results
+
+
+class BatchStore:
+    """
+    Submitted batch requests, kept in SQLite so results are collected after a restart
+    Each row holds what is needed to finish its job: generation details and the
+    user's Google credentials for saving to Drive (removed once the job finishes)
+    """
+
+    def __init__(self, path: str = JOBS_DB_PATH):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS batch_requests (
+                    job_id TEXT PRIMARY KEY,
+                    batch_id TEXT NOT NULL,
+                    details TEXT NOT NULL,
+                    credentials TEXT NOT NULL,
+                    submitted_at TEXT NOT NULL
+                )
+            """)
+
+    def add(self, job_id: str, batch_id: str, details: dict, credentials: dict):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO batch_requests (job_id, batch_id, details, credentials, submitted_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (job_id, batch_id, json.dumps(details), json.dumps(credentials), datetime.utcnow().isoformat())
+            )
+
+    def pending(self) -> list:
+        """All submitted requests, oldest first"""
+        with self._lock:
+            rows = self._conn.execute("SELECT * FROM batch_requests ORDER BY submitted_at").fetchall()
+        return [
+            {**dict(row), "details": json.loads(row["details"]), "credentials": json.loads(row["credentials"])}
+            for row in rows
+        ]
+
+    def remove(self, job_id: str):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM batch_requests WHERE job_id = ?", (job_id,))
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class BatchPoller:
+    """
+    Submits deferred generations as Message Batches and collects their results
+    Every interval, each submitted batch is checked; once it has ended,
+    finisher(record, result) is awaited for each of its requests (result is
+    None if the batch returned nothing for it) and the record is removed
+    """
+
+    def __init__(self, store: BatchStore, finisher, client=None, interval: float = BATCH_POLL_INTERVAL):
+        self.store = store
+        self.client = client or AnthropicBatchClient()
+        self._finisher = finisher
+        self._interval = interval
+        self._task = None
+
+    def start(self):
+        pending = len(self.store.pending())
+        if pending:
+            logger.info(f"Resuming {pending} deferred generation(s)")
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+
+    async def submit(self, job_id: str, params: dict, details: dict, credentials: dict) -> str:
+        """Submit one generation request (Messages API params) as its own batch"""
+        batch_id = await self.client.create([{"custom_id": job_id, "params": params}])
+        self.store.add(job_id, batch_id, details, credentials)
+        logger.info(f"Submitted job {job_id} as batch {batch_id}")
+        return batch_id
+
+    async def poll(self):
+        """Check every submitted batch once, finishing the requests of ended batches"""
+        batches = {}
+        for record in self.store.pending():
+            batches.setdefault(record["batch_id"], []).append(record)
+
+        for batch_id, records in batches.items():
+            try:
+                if not await self.client.ended(batch_id):
+                    continue
+                results = await self.client.results(batch_id)
+            except Exception as e:
+                logger.warning(f"Could not check batch {batch_id}: {str(e)}")
+                continue
+
+            for record in records:
+                try:
+                    await self._finisher(record, results.get(record["job_id"]))
+                except Exception as e:
+                    logger.error(f"Finishing deferred job {record['job_id']} failed: {str(e)}", exc_info=True)
+                self.store.remove(record["job_id"])
+
+    async def _run(self):
+        while True:
+            await self.poll()
+            await asyncio.sleep(self._interval)
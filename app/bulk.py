@@ -0,0 +1,252 @@
+"""
+Generate study guides for many series from the command line
+
+    python -m app.bulk series.json --credentials token.json --concurrency 3
+
+The manifest is a JSON list of series, each with a title, audience, model and
+either a Drive folder ID (every .txt file in it, in name order) or a list of
+file IDs:
+
+    [
+      {"title": "Romans", "audience": "Mixed", "model": "claude-sonnet-4.5", "folder_id": "1AbC..."},
+      {"title": "Psalms", "audience": "New Christians", "model": "gpt-4o", "file_ids": ["1xY...", "1zW..."]}
+    ]
+
+Finished series are recorded in a checkpoint file, so an interrupted run picks
+up where it stopped. A series with sessions that failed to generate is recorded
+as failed and not saved to Drive, so the next run retries it (reusing the
+sessions that did generate). A per-series summary of timings and token usage is written
+at the end.
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import logging
+import argparse
+from datetime import datetime
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from app.auth import load_credentials
+from app.cache import atomic_write, content_hash
+from app.drive import (
+    build_drive_service, fetch_transcripts, check_transcript_lengths, list_folder_transcripts, save_to_drive
+)
+from app.generator import generate_study_guide, usage_cost, MODEL_CONFIG
+from app.providers import close_clients
+
+logger = logging.getLogger(__name__)
+
+# Sessions per series are limited by the web form; the CLI allows longer series
+MAX_SERIES_FILES = int(os.getenv("BULK_MAX_SERIES_FILES", 52))
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Generate study guides for many series")
+    parser.add_argument("manifest", help="JSON list of series (title, audience, model, folder_id or file_ids)")
+    parser.add_argument("--credentials", default=os.getenv("GOOGLE_CREDENTIALS_FILE", "token.json"),
+                        help="authorized-user OAuth JSON (client_id, client_secret, refresh_token)")
+    parser.add_argument("--concurrency", type=int, default=2, help="series generated at once")
+    parser.add_argument("--checkpoint", default=None, help="checkpoint file (default: <manifest>.checkpoint.json)")
+    parser.add_argument("--summary", default=None, help="summary file (default: <manifest>.summary.json)")
+    parser.add_argument("--output-folder", default=os.getenv("STUDY_GUIDE_OUTPUT_FOLDER_ID"),
+                        help="Drive folder for the guides (default: STUDY_GUIDE_OUTPUT_FOLDER_ID, else root)")
+    parser.add_argument("--force", action="store_true", help="regenerate series already in the checkpoint")
+    return parser.parse_args()
+
+
+def load_manifest(path: str) -> list:
+    """Read and validate the manifest"""
+    with open(path, "r", encoding="utf-8") as f:
+        series_list = json.load(f)
+    if not isinstance(series_list, list):
+        raise ValueError("Manifest must be a JSON list of series")
+
+    for index, series in enumerate(series_list):
+        missing = [field for field in ("title", "audience", "model") if not series.get(field)]
+        if missing:
+            raise ValueError(f"Series {index + 1} is missing {', '.join(missing)}")
+        if not series.get("folder_id") and not series.get("file_ids"):
+            raise ValueError(f"Series '{series['title']}' needs a folder_id or file_ids")
+        if series["model"] not in MODEL_CONFIG:
+            raise ValueError(f"Series '{series['title']}' has unknown model: {series['model']}")
+
+    return series_list
+
+
+def series_key(series: dict) -> str:
+    """Checkpoint key; editing a series' entry makes it run again"""
+    return content_hash("bulk", series)
+
+
+def save_credentials(credentials, path: str):
+    """Write back a refreshed access token so the next run can reuse it"""
+    write_json(path, json.loads(credentials.to_json()))
+
+
+def write_json(path: str, data):
+    """Atomically replace a JSON file"""
+    atomic_write(path, json.dumps(data, indent=2).encode("utf-8"))
+
+
+class Checkpoint:
+    """Results of finished series, saved after each one completes"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.entries = {}
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                self.entries = json.load(f)
+
+    def done(self, key: str) -> bool:
+        return self.entries.get(key, {}).get("status") == "completed"
+
+    def record(self, key: str, result: dict):
+        self.entries[key] = result
+        write_json(self.path, self.entries)
+
+
+async def run_series(drive_service, series: dict, output_folder: str) -> dict:
+    """Read, generate and save one series; returns its summary"""
+    timings = {}
+    usage = {}
+    start = time.monotonic()
+
+    if series.get("file_ids"):
+        file_ids = list(series["file_ids"])
+    else:
+        files = await asyncio.to_thread(list_folder_transcripts, drive_service, series["folder_id"])
+        file_ids = [file["id"] for file in files]
+    if not file_ids:
+        raise ValueError("No transcripts found")
+    if len(file_ids) > MAX_SERIES_FILES:
+        raise ValueError(f"{len(file_ids)} transcripts is more than the maximum of {MAX_SERIES_FILES}")
+
+    transcripts, timings["drive_read"] = await asyncio.to_thread(fetch_transcripts, drive_service, file_ids)
+    check_transcript_lengths(transcripts)
+    sermons = sorted(
+        ({"filename": transcript["filename"], "content": transcript["content"]} for transcript in transcripts),
+        key=lambda sermon: sermon["filename"]
+    )
+
+    generation_start = time.monotonic()
+    # A guide with failed sessions is not saved; the series stays pending for the next run
+    content = await generate_study_guide(
+        sermons, series["title"], series["audience"], series["model"], usage=usage, strict=True
+    )
+    timings["generation"] = time.monotonic() - generation_start
+
+    upload_start = time.monotonic()
+    filename = f"{series['title']}_Study_Guide.md"
+    file_url = await asyncio.to_thread(
+        save_to_drive,
+        drive_service=drive_service,
+        filename=filename,
+        content=content,
+        folder_id=series.get("output_folder_id") or output_folder
+    )
+    timings["upload"] = time.monotonic() - upload_start
+    timings["total"] = time.monotonic() - start
+
+    return {
+        "title": series["title"],
+        "status": "completed",
+        "sessions": len(sermons),
+        "file_url": file_url,
+        "filename": filename,
+        "timings": {stage: round(seconds, 3) for stage, seconds in timings.items()},
+        "usage": usage,
+        "cost_usd": round(sum(usage_cost(model, model_usage) for model, model_usage in usage.items()), 4),
+        "finished_at": datetime.utcnow().isoformat()
+    }
+
+
+async def run_all(series_list: list, drive_service, checkpoint: Checkpoint, args) -> list:
+    """Run pending series with bounded concurrency; provider rate limits are shared"""
+    semaphore = asyncio.Semaphore(max(1, args.concurrency))
+    pending = [
+        series for series in series_list
+        if args.force or not checkpoint.done(series_key(series))
+    ]
+    skipped = len(series_list) - len(pending)
+    if skipped:
+        logger.info(f"Skipping {skipped} series already completed (see {checkpoint.path})")
+
+    async def run_one(series: dict):
+        async with semaphore:
+            logger.info(f"Generating '{series['title']}'")
+            try:
+                result = await run_series(drive_service, series, args.output_folder)
+                logger.info(f"Finished '{series['title']}' in {result['timings']['total']:.1f}s: {result['file_url']}")
+            except Exception as e:
+                logger.error(f"Series '{series['title']}' failed: {str(e)}")
+                result = {
+                    "title": series["title"],
+                    "status": "failed",
+                    "error": str(e),
+                    "finished_at": datetime.utcnow().isoformat()
+                }
+            checkpoint.record(series_key(series), result)
+
+    try:
+        await asyncio.gather(*(run_one(series) for series in pending))
+    finally:
+        # Close the pooled provider connections before the event loop ends
+        await close_clients()
+    return [checkpoint.entries.get(series_key(series)) for series in series_list]
+
+
+def print_summary(results: list):
+    print(f"{'series':<32} {'status':<10} {'total s':>8} {'tokens in':>10} {'tokens out':>10} {'cost $':>8}")
+    for result in results:
+        if result is None:
+            continue
+        usage = result.get("usage") or {}
+        tokens_in = sum(
+            model_usage.get(field, 0) for model_usage in usage.values()
+            for field in ("input_tokens", "cache_creation_input_tokens", "cache_read_input_tokens")
+        )
+        tokens_out = sum(model_usage.get("output_tokens", 0) for model_usage in usage.values())
+        total = (result.get("timings") or {}).get("total", 0)
+        print(
+            f"{result['title'][:32]:<32} {result['status']:<10} {total:>8.1f} "
+            f"{tokens_in:>10} {tokens_out:>10} {result.get('cost_usd', 0):>8.4f}"
+        )
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    args = parse_args()
+    stem = os.path.splitext(args.manifest)[0]
+    checkpoint = Checkpoint(args.checkpoint or f"{stem}.checkpoint.json")
+    summary_path = args.summary or f"{stem}.summary.json"
+
+    try:
+        series_list = load_manifest(args.manifest)
+    except (OSError, ValueError) as e:
+        sys.exit(f"Invalid manifest: {e}")
+
+    credentials = load_credentials(args.credentials)
+    token = credentials.token
+    drive_service = build_drive_service(credentials)
+
+    try:
+        results = asyncio.run(run_all(series_list, drive_service, checkpoint, args))
+    finally:
+        if credentials.token != token:
+            save_credentials(credentials, args.credentials)
+
+    write_json(summary_path, {"manifest": args.manifest, "series": results})
+    print_summary(results)
+    print(f"Summary written to {summary_path}")
+
+    if any(result is None or result["status"] != "completed" for result in results):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+import os
+import json
+import hashlib
+import logging
+import tempfile
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Local state directory (Cloud Run's filesystem is writable but per-instance)
+DATA_DIR = os.getenv("DATA_DIR", "/tmp/bs-gen")
+
+
+def content_hash(*parts) -> str:
+    """Stable SHA-256 over strings, lists and dicts"""
+    digest = hashlib.sha256()
+    for part in parts:
+        if not isinstance(part, str):
+            part = json.dumps(part, sort_keys=True)
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def atomic_write(path: str, data: bytes):
+    """Replace a file in one step, so readers never see a partial write"""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+class DiskCache:
+    """
+    Size-bounded LRU cache of text values on local disk
+    Each entry is one file; access time is tracked with the file mtime
+    Blocking file I/O; call from a worker thread when on the event loop
+    """
+
+    def __init__(self, directory: str, max_bytes: int, suffix: str = ".txt"):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.suffix = suffix
+        self._lock = threading.Lock()
+        # Bytes on disk, counted on the first write and kept up to date after,
+        # so the directory is only scanned again when entries must be evicted
+        self._total = None
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key + self.suffix)
+
+    def get(self, key: str):
+        """Get a cached value (and mark it recently used), or None"""
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                value = f.read()
+            os.utime(path)
+            return value
+        except FileNotFoundError:
+            return None
+        except OSError as e:
+            logger.warning(f"Cache read failed for {key}: {str(e)}")
+            return None
+
+    def set(self, key: str, value: str):
+        """Store a value, then evict least recently used entries if over the size limit"""
+        path = self._path(key)
+        data = value.encode("utf-8")
+        try:
+            try:
+                previous = os.stat(path).st_size
+            except FileNotFoundError:
+                previous = 0
+            atomic_write(path, data)
+        except OSError as e:
+            logger.warning(f"Cache write failed for {key}: {str(e)}")
+            return
+
+        with self._lock:
+            if self._total is None:
+                self._total = sum(size for _, size, _ in self._entries())
+            else:
+                self._total += len(data) - previous
+            over = self._total > self.max_bytes
+        if over:
+            self._evict()
+
+    def delete(self, key: str):
+        path = self._path(key)
+        try:
+            size = os.stat(path).st_size
+            os.remove(path)
+        except FileNotFoundError:
+            return
+        with self._lock:
+            if self._total is not None:
+                self._total -= size
+
+    def _entries(self) -> list:
+        """(mtime, size, path) of every entry"""
+        entries = []
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if entry.is_file() and entry.name.endswith(self.suffix):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+        return entries
+
+    def _evict(self):
+        with self._lock:
+            entries = self._entries()
+            total = sum(size for _, size, _ in entries)
+
+            for mtime, size, path in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                total -= size
+
+            # Recounted from disk, so drift from concurrent writes is corrected here
+            self._total = total
@@ -1,32 +1,356 @@
 import io
+import os
+import json
+import time
+import asyncio
+import logging
+import threading
+import weakref
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from fastapi import Request
-from googleapiclient.discovery import build
-from googleapiclient.http import MediaFileUpload, MediaIoBaseUpload
 from googleapiclient.errors import HttpError
 from app.auth import get_credentials
+from app.cache import DiskCache, content_hash, DATA_DIR
+from app.metrics import DRIVE_SECONDS, TRANSCRIPT_READS
+
+# googleapiclient's discovery/http modules and httplib2 are imported on first use
+# to keep cold starts fast
+
+logger = logging.getLogger(__name__)
+
+# Concurrent media downloads per transcript fetch
+DRIVE_FETCH_WORKERS = int(os.getenv("DRIVE_FETCH_WORKERS", 8))
+
+# Drive accepts at most 100 calls per batch request
+DRIVE_BATCH_SIZE = 100
+
+# Page size for listing files, and how long resolved folder names are reused
+LIST_PAGE_SIZE = int(os.getenv("LIST_PAGE_SIZE", 1000))
+FOLDER_NAME_TTL = int(os.getenv("FOLDER_NAME_TTL", 600))
+
+# Shortest transcript that makes a quality study guide; files smaller than
+# MIN_TRANSCRIPT_BYTES cannot hold that many words, so they are not downloaded
+MIN_TRANSCRIPT_WORDS = 500
+MIN_TRANSCRIPT_BYTES = int(os.getenv("MIN_TRANSCRIPT_BYTES", 2000))
+
+# How long an upload folder's file names are trusted when picking a unique name
+# for a new guide (names of guides saved by this instance are added right away)
+FOLDER_INDEX_TTL = int(os.getenv("FOLDER_INDEX_TTL", 600))
+
+# Uploads up to this size are sent in one multipart request, larger ones resumably
+MULTIPART_UPLOAD_MAX_BYTES = int(os.getenv("MULTIPART_UPLOAD_MAX_BYTES", 5 * 1024 * 1024))
+
+# Open a resumable upload when generation starts, so only the content is left
+# to send when it ends
+DRIVE_EARLY_UPLOAD = os.getenv("DRIVE_EARLY_UPLOAD", "false").lower() == "true"
+
+# Downloaded transcripts, keyed by file ID and content checksum (or version),
+# so an unchanged file is not downloaded again
+TRANSCRIPT_CACHE_DIR = os.getenv("TRANSCRIPT_CACHE_DIR", os.path.join(DATA_DIR, "transcripts"))
+TRANSCRIPT_CACHE_MAX_BYTES = int(os.getenv("TRANSCRIPT_CACHE_MAX_MB", 100)) * 1024 * 1024
+transcript_cache = DiskCache(TRANSCRIPT_CACHE_DIR, TRANSCRIPT_CACHE_MAX_BYTES)
+
+# Metadata needed to validate a transcript and find it in the cache
+TRANSCRIPT_FIELDS = "id, name, size, md5Checksum, version"
+
+# Background prefetch of new or edited transcripts through the Drive Changes API:
+# comma-separated folder IDs to watch, an authorized-user OAuth file for the
+# account that owns them, and seconds between checks for changes
+TRANSCRIPT_SYNC_FOLDERS = [f.strip() for f in os.getenv("TRANSCRIPT_SYNC_FOLDERS", "").split(",") if f.strip()]
+TRANSCRIPT_SYNC_CREDENTIALS = os.getenv("TRANSCRIPT_SYNC_CREDENTIALS")
+TRANSCRIPT_SYNC_INTERVAL = float(os.getenv("TRANSCRIPT_SYNC_INTERVAL", 300))
+
+# Alternate Drive API root, e.g. a local stand-in for benchmarks (unset uses Google)
+DRIVE_ROOT_URL = os.getenv("DRIVE_ROOT_URL")
+DRIVE_UPLOAD_URL = (DRIVE_ROOT_URL or "https://www.googleapis.com/").rstrip('/') + "/upload/drive/v3/files"
 
 
 def get_drive_service(request: Request):
     """Get authenticated Google Drive service"""
-    credentials = get_credentials(request)
-    return build('drive', 'v3', credentials=credentials)
+    return build_drive_service(get_credentials(request))
 
 
-def read_file_from_drive(drive_service, file_id: str) -> str:
-    """Read text file content from Google Drive"""
-    try:
-        # Get file content
-        request = drive_service.files().get_media(fileId=file_id)
-        file_content = request.execute()
+class ThreadLocalHttp:
+    """
+    Authorized HTTP transport with one connection per thread, so a single
+    Drive service can be shared by concurrent requests (httplib2 is not thread-safe)
+    """
+
+    def __init__(self, credentials):
+        self.credentials = credentials
+        self._local = threading.local()
+
+    def _http(self):
+        http = getattr(self._local, "http", None)
+        if http is None:
+            import httplib2
+            import google_auth_httplib2
+            base = httplib2.Http()
+            # Drive answers chunks of resumable uploads with 308, which is not a redirect
+            base.redirect_codes = base.redirect_codes - {308}
+            http = google_auth_httplib2.AuthorizedHttp(self.credentials, http=base)
+            self._local.http = http
+        return http
+
+    def request(self, *args, **kwargs):
+        try:
+            return self._http().request(*args, **kwargs)
+        except (BrokenPipeError, ConnectionResetError):
+            # The server closed a kept-alive connection; retry once on a new one
+            self._local.http = None
+            return self._http().request(*args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self._http(), name)
+
+
+# Drive services per live credentials object (see app.auth.credential_cache),
+# so the discovery document is parsed once per user rather than per request
+_drive_services = weakref.WeakKeyDictionary()
+_drive_services_lock = threading.Lock()
+
+# The transport of each service, for requests the client library has no method for
+_drive_http = weakref.WeakKeyDictionary()
+
+
+def build_drive_service(credentials):
+    """Get a Google Drive service for credentials (e.g. for background jobs)"""
+    with _drive_services_lock:
+        service = _drive_services.get(credentials)
+        if service is None:
+            from googleapiclient.discovery import build, build_from_document
+            http = ThreadLocalHttp(credentials)
+            if DRIVE_ROOT_URL:
+                service = build_from_document(_drive_discovery_document(DRIVE_ROOT_URL), http=http)
+            else:
+                service = build('drive', 'v3', http=http)
+            _drive_services[credentials] = service
+            _drive_http[service] = http
+    return service
+
+
+def drive_http(drive_service) -> ThreadLocalHttp:
+    """Authorized HTTP transport of a service from build_drive_service"""
+    with _drive_services_lock:
+        return _drive_http[drive_service]
+
+
+def _drive_discovery_document(root_url: str) -> dict:
+    """Bundled Drive discovery document pointed at another API root"""
+    from googleapiclient.discovery_cache import get_static_doc
+    document = json.loads(get_static_doc('drive', 'v3'))
+    root_url = root_url.rstrip('/') + '/'
+    document['rootUrl'] = root_url
+    document['baseUrl'] = root_url + document['servicePath']
+    return document
+
+
+def transcript_cache_key(file: dict) -> str:
+    """Cache key for a file's current content, or None if Drive reports no checksum or version"""
+    revision = file.get('md5Checksum') or (f"v{file['version']}" if file.get('version') else None)
+    if revision is None:
+        return None
+    return content_hash("transcript", file['id'], revision)
+
 
-        # Decode bytes to string
-        return file_content.decode('utf-8')
+def download_transcript(drive_service, file: dict, prefetch: bool = False) -> str:
+    """
+    Content of a transcript (metadata with id and md5Checksum or version),
+    from the cache if this revision was downloaded before
+    prefetch=True counts a download as a background prefetch
+    """
+    key = transcript_cache_key(file)
+    if key is not None:
+        content = transcript_cache.get(key)
+        if content is not None:
+            if not prefetch:
+                TRANSCRIPT_READS.inc(result="hit")
+            return content
 
+    try:
+        content = drive_service.files().get_media(fileId=file['id']).execute().decode('utf-8')
     except HttpError as error:
         raise Exception(f"Error reading file from Drive: {error}")
+    TRANSCRIPT_READS.inc(result="prefetch" if prefetch else "download")
+
+    if key is not None:
+        transcript_cache.set(key, content)
+    return content
+
+
+def get_files_metadata(drive_service, file_ids: list, fields: str = "id, name, size", strict: bool = True) -> list:
+    """
+    Get metadata for many files using batch requests, in the order given
+    strict=False returns None for files that could not be read instead of raising
+    """
+    results = {}
+    errors = {}
+
+    def callback(request_id, response, exception):
+        if exception is not None:
+            errors[request_id] = exception
+        else:
+            results[request_id] = response
+
+    unique_ids = list(dict.fromkeys(file_ids))
+    for start in range(0, len(unique_ids), DRIVE_BATCH_SIZE):
+        batch = drive_service.new_batch_http_request(callback=callback)
+        for file_id in unique_ids[start:start + DRIVE_BATCH_SIZE]:
+            batch.add(drive_service.files().get(fileId=file_id, fields=fields), request_id=file_id)
+        batch.execute()
+
+    if errors and strict:
+        file_id, error = next(iter(errors.items()))
+        raise Exception(f"Error reading file metadata from Drive ({file_id}): {error}")
+
+    return [results.get(file_id) for file_id in file_ids]
+
+
+@DRIVE_SECONDS.time(operation="fetch_transcripts")
+def fetch_transcripts(drive_service, file_ids: list, min_bytes: int = MIN_TRANSCRIPT_BYTES) -> tuple:
+    """
+    Fetch many transcripts: one batched metadata request, then concurrent
+    downloads of those not already in the transcript cache
+    Raises ValueError for files too small to be a transcript (checked before downloading)
+    Returns (transcripts, seconds) where transcripts are dicts with id, filename, content
+    """
+    start = time.monotonic()
+
+    # Always checked, so a transcript edited moments ago is not served at its old checksum
+    metadata = get_files_metadata(drive_service, file_ids, fields=TRANSCRIPT_FIELDS)
+
+    for file in metadata:
+        if 'size' in file and int(file['size']) < min_bytes:
+            raise ValueError(
+                f"File '{file['name']}' is too short ({file['size']} bytes). "
+                f"Minimum 500 words required for quality study guides."
+            )
+
+    # The service's transport opens one connection per download thread
+    def download(file: dict) -> dict:
+        return {
+            "id": file['id'],
+            "filename": file['name'],
+            "content": download_transcript(drive_service, file)
+        }
+
+    with ThreadPoolExecutor(max_workers=max(1, min(DRIVE_FETCH_WORKERS, len(metadata)))) as pool:
+        transcripts = list(pool.map(download, metadata))
+
+    seconds = time.monotonic() - start
+    logger.info(f"Fetched {len(transcripts)} transcripts from Drive in {seconds:.2f}s")
+    return transcripts, seconds
+
+
+def check_transcript_lengths(transcripts: list):
+    """Raise ValueError for a transcript below the minimum word count"""
+    for transcript in transcripts:
+        word_count = len(transcript["content"].split())
+        if word_count < MIN_TRANSCRIPT_WORDS:
+            raise ValueError(
+                f"File '{transcript['filename']}' is too short ({word_count} words). "
+                f"Minimum {MIN_TRANSCRIPT_WORDS} words required for quality study guides."
+            )
+
+
+def list_folder_transcripts(drive_service, folder_id: str, fields: str = "id, name") -> list:
+    """All .txt files directly in a folder, sorted by name (id and name unless other fields are given)"""
+    try:
+        files = []
+        page_token = None
+        while True:
+            results = drive_service.files().list(
+                q=f"'{folder_id}' in parents and mimeType='text/plain' and trashed=false",
+                pageSize=LIST_PAGE_SIZE,
+                pageToken=page_token,
+                fields=f"nextPageToken, files({fields})",
+                orderBy="name"
+            ).execute()
+            files.extend(results.get('files', []))
+            page_token = results.get('nextPageToken')
+            if not page_token:
+                return files
+
+    except HttpError as error:
+        raise Exception(f"Error listing folder from Drive: {error}")
+
+
+class FolderIndex:
+    """
+    File names in upload folders per Drive service (one per user), with a TTL
+    Lets saves pick a unique name without an existence query each time;
+    claimed names are added right away so concurrent saves don't collide
+    """
+
+    def __init__(self, ttl: int = FOLDER_INDEX_TTL):
+        self.ttl = ttl
+        self._entries = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+
+    def _names(self, drive_service, folder_id: str) -> set:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(drive_service, {}).get(folder_id)
+        if entry and entry[1] > now:
+            return entry[0]
+
+        names = set()
+        page_token = None
+        while True:
+            results = drive_service.files().list(
+                q=f"'{folder_id}' in parents and trashed=false",
+                pageSize=LIST_PAGE_SIZE,
+                pageToken=page_token,
+                fields="nextPageToken, files(name)"
+            ).execute()
+            names.update(file['name'] for file in results.get('files', []))
+            page_token = results.get('nextPageToken')
+            if not page_token:
+                break
+
+        with self._lock:
+            folders = self._entries.setdefault(drive_service, {})
+            entry = folders.get(folder_id)
+            if entry and entry[1] > now:
+                # Listed concurrently; keep the set names may already be claimed in
+                return entry[0]
+            folders[folder_id] = (names, now + self.ttl)
+        return names
+
+    def claim(self, drive_service, filename: str, folder_id: str = None) -> str:
+        """filename, or with a timestamp added if the folder already has a file by that name"""
+        names = self._names(drive_service, folder_id or 'root')
+        with self._lock:
+            if filename in names:
+                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+                base_name = filename.rsplit('.', 1)[0]
+                extension = filename.rsplit('.', 1)[1] if '.' in filename else ''
+                candidate = f"{base_name}_{timestamp}.{extension}"
+                count = 1
+                while candidate in names:
+                    count += 1
+                    candidate = f"{base_name}_{timestamp}_{count}.{extension}"
+                filename = candidate
+            names.add(filename)
+        return filename
+
+    def release(self, drive_service, filename: str, folder_id: str = None):
+        """Forget a claimed name whose file was not created"""
+        with self._lock:
+            entry = self._entries.get(drive_service, {}).get(folder_id or 'root')
+            if entry:
+                entry[0].discard(filename)
+
+
+folder_index = FolderIndex()
 
 
+def file_url(file: dict) -> str:
+    return file.get('webViewLink', f"https://drive.google.com/file/d/{file.get('id')}/view")
+
+
+@DRIVE_SECONDS.time(operation="upload")
 def save_to_drive(drive_service, filename: str, content: str, folder_id: str = None) -> str:
     """
     Save markdown content to Google Drive
@@ -34,25 +358,8 @@ def save_to_drive(drive_service, filename: str, content: str, folder_id: str = N
     folder_id: ID of folder to save to, or None for root
     """
     try:
-        # Check if file already exists
-        if folder_id:
-            query = f"name='{filename}' and '{folder_id}' in parents and trashed=false"
-        else:
-            query = f"name='{filename}' and 'root' in parents and trashed=false"
-
-        results = drive_service.files().list(
-            q=query,
-            fields="files(id, name)"
-        ).execute()
-
-        existing_files = results.get('files', [])
-
-        # If file exists, rename with timestamp
-        if existing_files:
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            base_name = filename.rsplit('.', 1)[0]
-            extension = filename.rsplit('.', 1)[1] if '.' in filename else ''
-            filename = f"{base_name}_{timestamp}.{extension}"
+        # If the name is taken, add a timestamp (checked against the cached folder index)
+        filename = folder_index.claim(drive_service, filename, folder_id)
 
         # Create file metadata
         file_metadata = {
@@ -64,53 +371,285 @@ def save_to_drive(drive_service, filename: str, content: str, folder_id: str = N
         if folder_id:
             file_metadata['parents'] = [folder_id]
 
-        # Create media content
+        # Small documents go in a single multipart request
+        from googleapiclient.http import MediaIoBaseUpload
+        data = content.encode('utf-8')
         media = MediaIoBaseUpload(
-            io.BytesIO(content.encode('utf-8')),
+            io.BytesIO(data),
             mimetype='text/markdown',
-            resumable=True
+            resumable=len(data) > MULTIPART_UPLOAD_MAX_BYTES
         )
 
         # Upload file
-        file = drive_service.files().create(
-            body=file_metadata,
-            media_body=media,
-            fields='id, webViewLink'
-        ).execute()
+        try:
+            file = drive_service.files().create(
+                body=file_metadata,
+                media_body=media,
+                fields='id, webViewLink'
+            ).execute()
+        except Exception:
+            # Nothing was created, so the name is free for the next save
+            folder_index.release(drive_service, filename, folder_id)
+            raise
 
-        return file.get('webViewLink', f"https://drive.google.com/file/d/{file.get('id')}/view")
+        return file_url(file)
 
     except HttpError as error:
         raise Exception(f"Error saving file to Drive: {error}")
 
 
-def list_text_files(drive_service) -> list:
-    """List all .txt files from user's Google Drive with folder paths"""
+class ResumableUpload:
+    """
+    Drive upload opened before its content is known (see DRIVE_EARLY_UPLOAD)
+    open() starts the upload session and finish() sends the content; the file
+    only appears in Drive once finished, and an unfinished session simply expires
+    """
+
+    def __init__(self, drive_service, filename: str, folder_id: str = None, mimetype: str = 'text/markdown'):
+        self.drive_service = drive_service
+        self.http = drive_http(drive_service)
+        self.filename = filename
+        self.folder_id = folder_id
+        self.mimetype = mimetype
+        self._uri = None
+        self._claimed = False
+
+    def open(self) -> bool:
+        """Start the upload session; returns False (logging why) if that fails"""
+        try:
+            self.filename = folder_index.claim(self.drive_service, self.filename, self.folder_id)
+            self._claimed = True
+            metadata = {'name': self.filename, 'mimeType': self.mimetype}
+            if self.folder_id:
+                metadata['parents'] = [self.folder_id]
+
+            response, body = self.http.request(
+                f"{DRIVE_UPLOAD_URL}?uploadType=resumable&fields=id,webViewLink",
+                method="POST",
+                body=json.dumps(metadata),
+                headers={"Content-Type": "application/json; charset=UTF-8", "X-Upload-Content-Type": self.mimetype}
+            )
+            if response.status != 200 or 'location' not in response:
+                raise Exception(f"HTTP {response.status}: {body[:200]!r}")
+            self._uri = response['location']
+            return True
+        except Exception as e:
+            logger.warning(f"Could not open upload of '{self.filename}' to Drive: {str(e)}")
+            self.abandon()
+            return False
+
+    def abandon(self):
+        """Give up on the upload (e.g. to save another way); its session expires unused"""
+        if self._claimed:
+            folder_index.release(self.drive_service, self.filename, self.folder_id)
+            self._claimed = False
+        self._uri = None
+
+    @DRIVE_SECONDS.time(operation="upload_finish")
+    def finish(self, data: bytes) -> str:
+        """Send the content and return the file URL"""
+        if self._uri is None:
+            raise Exception("Error saving file to Drive: upload was not opened")
+
+        content_range = f"bytes 0-{len(data) - 1}/{len(data)}" if data else "bytes */0"
+        response, body = self.http.request(
+            self._uri, method="PUT", body=data,
+            headers={"Content-Length": str(len(data)), "Content-Range": content_range}
+        )
+        if response.status not in (200, 201):
+            raise Exception(f"Error saving file to Drive: HTTP {response.status}: {body[:200]!r}")
+
+        self._uri = None
+        self._claimed = False
+        return file_url(json.loads(body))
+
+
+class FolderNameCache:
+    """Per-user folder ID -> name cache with a TTL, shared between listing calls"""
+
+    def __init__(self, ttl: int = FOLDER_NAME_TTL):
+        self.ttl = ttl
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get_many(self, user_key: str, folder_ids: list) -> dict:
+        """Cached names for the given folders (expired or unknown ones are omitted)"""
+        now = time.monotonic()
+        found = {}
+        with self._lock:
+            entries = self._entries.get(user_key, {})
+            for folder_id in folder_ids:
+                entry = entries.get(folder_id)
+                if entry and entry[1] > now:
+                    found[folder_id] = entry[0]
+                elif entry:
+                    del entries[folder_id]
+        return found
+
+    def set_many(self, user_key: str, names: dict):
+        expires = time.monotonic() + self.ttl
+        with self._lock:
+            entries = self._entries.setdefault(user_key, {})
+            for folder_id, name in names.items():
+                entries[folder_id] = (name, expires)
+
+
+folder_name_cache = FolderNameCache()
+
+
+def resolve_folder_names(drive_service, folder_ids: list, user_key: str = None) -> dict:
+    """Resolve folder names with the cache, batching lookups for the rest"""
+    unique_ids = list(dict.fromkeys(folder_ids))
+    names = folder_name_cache.get_many(user_key, unique_ids) if user_key else {}
+
+    missing = [folder_id for folder_id in unique_ids if folder_id not in names]
+    if missing:
+        metadata = get_files_metadata(drive_service, missing, fields="id, name", strict=False)
+        resolved = {
+            folder_id: meta.get('name', 'Unknown')
+            for folder_id, meta in zip(missing, metadata) if meta
+        }
+        if user_key:
+            folder_name_cache.set_many(user_key, resolved)
+        names.update(resolved)
+
+    return names
+
+
+@DRIVE_SECONDS.time(operation="list_files")
+def list_text_files(drive_service, page_token: str = None, page_size: int = LIST_PAGE_SIZE,
+                    user_key: str = None) -> tuple:
+    """
+    List one page of .txt files from user's Google Drive with folder paths
+    Returns (files, next_page_token); next_page_token is None on the last page
+    user_key: identifies the user for the folder name cache
+    """
     try:
         query = "mimeType='text/plain' and trashed=false"
         results = drive_service.files().list(
             q=query,
-            pageSize=1000,  # Increased to show more files
-            fields="files(id, name, parents, modifiedTime)",
+            pageSize=page_size,
+            pageToken=page_token,
+            fields="nextPageToken, files(id, name, parents, modifiedTime)",
             orderBy="name"
         ).execute()
 
         files = results.get('files', [])
 
-        # Get folder names for each file
+        # Get folder names for all parents at once
+        parent_ids = [file['parents'][0] for file in files if file.get('parents')]
+        folder_names = resolve_folder_names(drive_service, parent_ids, user_key)
+
         for file in files:
-            if 'parents' in file and file['parents']:
-                try:
-                    # Get parent folder name
-                    parent_id = file['parents'][0]
-                    parent = drive_service.files().get(fileId=parent_id, fields="name").execute()
-                    file['folderName'] = parent.get('name', 'Unknown')
-                except:
-                    file['folderName'] = 'Unknown'
+            if file.get('parents'):
+                file['folderName'] = folder_names.get(file['parents'][0], 'Unknown')
             else:
                 file['folderName'] = 'My Drive (Root)'
 
-        return files
+        return files, results.get('nextPageToken')
 
     except HttpError as error:
         raise Exception(f"Error listing files from Drive: {error}")
+
+
+class TranscriptSync:
+    """
+    Prefetches new and edited transcripts in watched folders into the transcript cache
+    The first run lists the folders; later runs read the Drive Changes API from
+    the saved start page token, so only changed .txt files are fetched.
+    Generations still check each file's current checksum before using the cache
+    """
+
+    def __init__(self, folder_ids: list, credentials_file: str = None, drive_service=None,
+                 interval: float = TRANSCRIPT_SYNC_INTERVAL):
+        self.folder_ids = set(folder_ids)
+        self.interval = interval
+        self._credentials_file = credentials_file
+        self._drive_service = drive_service
+        self._page_token = None
+        self._task = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+
+    def sync(self) -> int:
+        """Check for changes once and prefetch changed transcripts (blocking); returns the number checked"""
+        if self._drive_service is None:
+            from app.auth import load_credentials
+            self._drive_service = build_drive_service(load_credentials(self._credentials_file))
+
+        if self._page_token is None:
+            # Take the token before listing, so changes made meanwhile are read next time
+            page_token = self._drive_service.changes().getStartPageToken().execute()['startPageToken']
+            files = {}
+            for folder_id in self.folder_ids:
+                for file in list_folder_transcripts(self._drive_service, folder_id, fields=TRANSCRIPT_FIELDS):
+                    files[file['id']] = file
+            changed = list(files.values())
+        else:
+            page_token, changed = self._read_changes()
+
+        def prefetch(file: dict):
+            try:
+                download_transcript(self._drive_service, file, prefetch=True)
+            except Exception as e:
+                logger.warning(f"Prefetching transcript '{file.get('name')}' failed: {str(e)}")
+
+        if changed:
+            with ThreadPoolExecutor(max_workers=max(1, min(DRIVE_FETCH_WORKERS, len(changed)))) as pool:
+                list(pool.map(prefetch, changed))
+
+        self._page_token = page_token
+        return len(changed)
+
+    def _read_changes(self) -> tuple:
+        """Apply changes since the saved page token; returns (next start page token, changed watched files)"""
+        changed = {}
+        page_token = self._page_token
+        while True:
+            results = self._drive_service.changes().list(
+                pageToken=page_token,
+                pageSize=LIST_PAGE_SIZE,
+                spaces="drive",
+                fields=f"nextPageToken, newStartPageToken, "
+                       f"changes(fileId, removed, file({TRANSCRIPT_FIELDS}, mimeType, parents, trashed))"
+            ).execute()
+
+            for change in results.get('changes', []):
+                file = change.get('file')
+                watched = (
+                    file and not change.get('removed') and not file.get('trashed')
+                    and file.get('mimeType') == 'text/plain'
+                    and self.folder_ids.intersection(file.get('parents', []))
+                )
+                if watched:
+                    changed[file['id']] = file
+                else:
+                    # Deleted, trashed or moved out of the watched folders
+                    changed.pop(change['fileId'], None)
+
+            if 'newStartPageToken' in results:
+                return results['newStartPageToken'], list(changed.values())
+            page_token = results['nextPageToken']
+
+    async def _run(self):
+        while True:
+            try:
+                checked = await asyncio.to_thread(self.sync)
+                if checked:
+                    logger.info(f"Transcript sync checked {checked} new or changed transcript(s)")
+            except Exception as e:
+                logger.warning(f"Transcript sync failed: {str(e)}")
+            await asyncio.sleep(self.interval)
+
+
+def create_transcript_sync():
+    """TranscriptSync for TRANSCRIPT_SYNC_FOLDERS, or None if prefetching is not configured"""
+    if not TRANSCRIPT_SYNC_FOLDERS or not TRANSCRIPT_SYNC_CREDENTIALS:
+        return None
+    return TranscriptSync(TRANSCRIPT_SYNC_FOLDERS, credentials_file=TRANSCRIPT_SYNC_CREDENTIALS)
@@ -1,8 +1,20 @@
 import os
+import re
+import json
+import time
+import asyncio
+import contextvars
+from collections import deque
 import logging
 from datetime import datetime
-from anthropic import Anthropic
-from openai import OpenAI
+from app.providers import get_anthropic_client, get_openai_client
+from app.cache import DiskCache, content_hash, DATA_DIR
+from app.scheduler import provider_scheduler, is_permanent_error
+from app.structure import check_session, splice_sections, split_sessions, is_truncated
+from app.transcripts import clean_sermons
+from app.metrics import (
+    metric_labels, current_labels, STAGE_SECONDS, FIRST_TOKEN_SECONDS, TOKENS, COST, REPAIRS, CLEANUP_SAVED
+)
 
 # Configure logging
 logger = logging.getLogger(__name__)
@@ -11,43 +23,94 @@ logging.basicConfig(
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
 )
 
+# Map model names to API calls
+MODEL_CONFIG = {
+    "claude-sonnet-4.5": ("anthropic", "claude-sonnet-4-5-20250929"),
+    "claude-3.5-haiku": ("anthropic", "claude-3-5-haiku-20241022"),
+    "gpt-4o": ("openai", "gpt-4o")
+}
 
-def build_generation_prompt(sermons: list, series_title: str, target_audience: str) -> str:
-    """Build the prompt for study guide generation"""
+# Cheap models used for the series-level context pass
+SERIES_CONTEXT_MODELS = {
+    "anthropic": "claude-3-5-haiku-20241022",
+    "openai": "gpt-4o-mini"
+}
 
-    # Build sermons context
-    sermons_text = "\n\n---\n\n".join([
-        f"SERMON {idx + 1}: {sermon['filename']}\n\n{sermon['content']}"
-        for idx, sermon in enumerate(sermons)
-    ])
+# Context window and maximum output tokens per API model
+MODEL_LIMITS = {
+    "claude-sonnet-4-5-20250929": (200000, 64000),
+    "claude-3-5-haiku-20241022": (200000, 8192),
+    "gpt-4o": (128000, 16384),
+    "gpt-4o-mini": (128000, 16384)
+}
+DEFAULT_MODEL_LIMITS = (128000, 16000)
 
-    # Audience-specific guidance
-    audience_guidance = {
-        "New Christians": "Use accessible language, explain theological concepts clearly, avoid jargon. Focus on foundational truths and practical application for those new to faith.",
-        "Mature Believers": "Use more theological depth, engage with complex concepts, assume biblical literacy. Challenge deeper reflection and integration of faith.",
-        "Mixed": "Balance accessibility with depth. Explain key concepts but also provide deeper reflection opportunities. Include questions that work for various maturity levels."
-    }
+# USD per million tokens: (input, output, cache write, cache read), for cost metrics
+MODEL_PRICING = {
+    "claude-sonnet-4-5-20250929": (3.00, 15.00, 3.75, 0.30),
+    "claude-3-5-haiku-20241022": (0.80, 4.00, 1.00, 0.08),
+    "gpt-4o": (2.50, 10.00, 2.50, 1.25),
+    "gpt-4o-mini": (0.15, 0.60, 0.15, 0.075)
+}
 
-    prompt = f"""You are creating a Bible study guide for a sermon series. Generate a complete study guide with one session per sermon.
+# Message Batches (deferred generation) are billed at half the interactive price
+BATCH_PRICE_FACTOR = 0.5
 
-SERMON SERIES: {series_title}
-TARGET AUDIENCE: {target_audience}
-NUMBER OF SESSIONS: {len(sermons)}
+# Token budgeting: transcripts over budget are condensed before generation
+TRANSCRIPT_TOKEN_BUDGET = int(os.getenv("TRANSCRIPT_TOKEN_BUDGET", 20000))
+CONDENSE_CHUNK_TOKENS = int(os.getenv("CONDENSE_CHUNK_TOKENS", 6000))
+CONDENSE_CONCURRENCY = int(os.getenv("CONDENSE_CONCURRENCY", 8))
+PROMPT_SAFETY_MARGIN = 1000
+MIN_OUTPUT_TOKENS = 2000
 
-TARGET AUDIENCE GUIDANCE:
-{audience_guidance.get(target_audience, audience_guidance["Mixed"])}
+# Rough token estimate for English prose
+CHARS_PER_TOKEN = 4
 
-SERMON TRANSCRIPTS:
-{sermons_text}
+# Hedged requests (opt-in): if the primary sends no first token within the given
+# percentile of recent time-to-first-token, race the secondary model and keep the
+# first to finish
+HEDGE_REQUESTS = os.getenv("HEDGE_REQUESTS", "false").lower() == "true"
+HEDGE_PERCENTILE = float(os.getenv("HEDGE_PERCENTILE", 95))
+HEDGE_DEFAULT_DELAY = float(os.getenv("HEDGE_DEFAULT_DELAY", 30))
+HEDGE_MIN_SAMPLES = 5
+HEDGE_SECONDARY = {
+    "anthropic": "gpt-4o",
+    "openai": "claude-sonnet-4.5"
+}
 
----
+# Generation mode: "fanout" (one call per session) or "single" (one call for the series)
+GENERATION_MODE = os.getenv("GENERATION_MODE", "fanout")
+SESSION_CONCURRENCY = int(os.getenv("SESSION_CONCURRENCY", 4))
+SESSION_MAX_TOKENS = int(os.getenv("SESSION_MAX_TOKENS", 8000))
 
-INSTRUCTIONS:
-Generate a complete Bible study guide with ONE session per sermon transcript (total {len(sermons)} sessions).
+# Output that is truncated or missing required sections is repaired with one
+# call asking for just the missing parts, allowed this many tokens per section
+REPAIR_TOKENS_PER_SECTION = int(os.getenv("REPAIR_TOKENS_PER_SECTION", 2000))
 
-Each session MUST include the following sections in this exact order:
+# Bump whenever prompt wording changes so cached guides are not reused
+PROMPT_VERSION = "3"
+
+# Finished guides, keyed by their inputs
+GUIDE_CACHE_DIR = os.getenv("GUIDE_CACHE_DIR", os.path.join(DATA_DIR, "guides"))
+GUIDE_CACHE_MAX_BYTES = int(os.getenv("GUIDE_CACHE_MAX_MB", 200)) * 1024 * 1024
+guide_cache = DiskCache(GUIDE_CACHE_DIR, GUIDE_CACHE_MAX_BYTES, suffix=".md")
+
+# Individual fan-out sessions (and series plans), keyed by sermon hash and options
+SESSION_CACHE_DIR = os.getenv("SESSION_CACHE_DIR", os.path.join(DATA_DIR, "sessions"))
+SESSION_CACHE_MAX_BYTES = int(os.getenv("SESSION_CACHE_MAX_MB", 200)) * 1024 * 1024
+session_cache = DiskCache(SESSION_CACHE_DIR, SESSION_CACHE_MAX_BYTES, suffix=".json")
 
-1. SESSION TITLE
+# Characters of each transcript sent to the series-level context pass
+SERIES_CONTEXT_EXCERPT_CHARS = 3000
+
+# Audience-specific guidance
+AUDIENCE_GUIDANCE = {
+    "New Christians": "Use accessible language, explain theological concepts clearly, avoid jargon. Focus on foundational truths and practical application for those new to faith.",
+    "Mature Believers": "Use more theological depth, engage with complex concepts, assume biblical literacy. Challenge deeper reflection and integration of faith.",
+    "Mixed": "Balance accessibility with depth. Explain key concepts but also provide deeper reflection opportunities. Include questions that work for various maturity levels."
+}
+
+SESSION_SECTIONS = """1. SESSION TITLE
    - Derive from the sermon's main theme
    - Make it compelling and clear
 
@@ -93,9 +156,9 @@ Each session MUST include the following sections in this exact order:
       - 3-5 books, articles, commentaries, or related scripture passages
       - Brief annotations explaining why each resource is valuable
 
-   Leader Notes should provide deeper theological insight and practical facilitation guidance.
+   Leader Notes should provide deeper theological insight and practical facilitation guidance."""
 
-FORMATTING REQUIREMENTS:
+FORMATTING_AND_TONE = """FORMATTING REQUIREMENTS:
 - Use clear markdown formatting
 - Use ## for session titles (e.g., ## Session 1: Walking in Faith)
 - Use ### for major section headings
@@ -108,32 +171,363 @@ TONE AND STYLE:
 - Accessible to target audience
 - Slightly more formal than a devotional, but not academic
 - Theologically sound and pastorally sensitive
-- Each session should stand alone but flow as part of the series
+- Each session should stand alone but flow as part of the series"""
+
+SYSTEM_PROMPT = "You are an expert Bible study curriculum designer with deep theological knowledge and pastoral sensitivity."
+
+# Instructions shared by every study guide request, sent first as the cacheable prompt prefix
+STATIC_INSTRUCTIONS = f"""{SYSTEM_PROMPT}
+
+You create Bible study guides from sermon transcripts, with one session per sermon.
+
+Each session MUST include the following sections in this exact order:
+
+{SESSION_SECTIONS}
+
+{FORMATTING_AND_TONE}"""
+
+
+class Prompt:
+    """
+    A prompt split for provider-side prompt caching
+    system: static instructions sent first (the cacheable prefix)
+    blocks: ordered (text, cacheable) user content blocks; cacheable blocks
+    are shared by several requests (e.g. series context used by every session)
+    """
+
+    def __init__(self, blocks: list, system: str = STATIC_INSTRUCTIONS):
+        self.system = system
+        self.blocks = blocks
+
+    @property
+    def text(self) -> str:
+        """User content as a single string"""
+        return "\n\n".join(text for text, _ in self.blocks)
+
+    def __len__(self):
+        return len(self.system) + len(self.text)
+
+
+def build_generation_prompt(sermons: list, series_title: str, target_audience: str) -> Prompt:
+    """Build the prompt for study guide generation"""
+
+    # Build sermons context
+    sermons_text = "\n\n---\n\n".join([
+        f"SERMON {idx + 1}: {sermon['filename']}\n\n{sermon['content']}"
+        for idx, sermon in enumerate(sermons)
+    ])
+
+    prompt = f"""You are creating a Bible study guide for a sermon series. Generate a complete study guide with one session per sermon.
+
+SERMON SERIES: {series_title}
+TARGET AUDIENCE: {target_audience}
+NUMBER OF SESSIONS: {len(sermons)}
+
+TARGET AUDIENCE GUIDANCE:
+{AUDIENCE_GUIDANCE.get(target_audience, AUDIENCE_GUIDANCE["Mixed"])}
+
+SERMON TRANSCRIPTS:
+{sermons_text}
+
+---
+
+INSTRUCTIONS:
+Generate a complete Bible study guide with ONE session per sermon transcript (total {len(sermons)} sessions).
+Follow the required session sections, formatting and tone exactly.
 
 Generate the complete study guide now, with all {len(sermons)} sessions."""
 
-    return prompt
+    return Prompt([(prompt, False)])
 
 
-async def generate_with_anthropic(prompt: str, model: str) -> str:
-    """Generate study guide using Anthropic Claude API"""
-    # Set longer timeout for large study guide generation (10 minutes)
-    client = Anthropic(
-        api_key=os.getenv("ANTHROPIC_API_KEY"),
-        timeout=600.0  # 10 minutes
+def build_series_context_prompt(sermons: list, series_title: str, target_audience: str) -> Prompt:
+    """Build the prompt for the cheap series-level pass that keeps sessions consistent"""
+
+    excerpts = "\n\n---\n\n".join([
+        f"SERMON {idx + 1}: {sermon['filename']}\n\n{sermon['content'][:SERIES_CONTEXT_EXCERPT_CHARS]}"
+        for idx, sermon in enumerate(sermons)
+    ])
+
+    prompt = f"""You are planning a Bible study guide for a sermon series. Below are the opening excerpts of each sermon.
+
+SERMON SERIES: {series_title}
+TARGET AUDIENCE: {target_audience}
+NUMBER OF SESSIONS: {len(sermons)}
+
+SERMON EXCERPTS:
+{excerpts}
+
+---
+
+Write a brief series plan (under 400 words) that individual session writers will share:
+- One paragraph describing the overall arc and theme of the series
+- One line per session: "Session N: <working title> - <main theme and how it builds on earlier sessions>"
+- Two or three sentences on the voice and tone every session should keep
+
+Return only the plan."""
+
+    return Prompt([(prompt, False)], system=SYSTEM_PROMPT)
+
+
+def build_series_block(total_sessions: int, series_title: str, target_audience: str, series_context: str = "") -> str:
+    """Series details shared by every session prompt (and section repairs) of a guide"""
+
+    context_block = ""
+    if series_context:
+        context_block = f"""
+
+SERIES PLAN (shared by all sessions - keep tone and flow consistent with it):
+{series_context}"""
+
+    return f"""You are creating one session of a Bible study guide for a sermon series.
+
+SERMON SERIES: {series_title}
+TARGET AUDIENCE: {target_audience}
+NUMBER OF SESSIONS: {total_sessions}
+
+TARGET AUDIENCE GUIDANCE:
+{AUDIENCE_GUIDANCE.get(target_audience, AUDIENCE_GUIDANCE["Mixed"])}{context_block}"""
+
+
+def build_session_prompt(
+    sermon: dict,
+    session_number: int,
+    total_sessions: int,
+    series_title: str,
+    target_audience: str,
+    series_context: str = ""
+) -> Prompt:
+    """
+    Build the prompt for a single session generated from its own sermon
+    The series block is identical for every session so it is marked cacheable
+    """
+    series_block = build_series_block(total_sessions, series_title, target_audience, series_context)
+
+    session_block = f"""THIS SESSION: Session {session_number} of {total_sessions}
+
+SERMON TRANSCRIPT: {sermon['filename']}
+
+{sermon['content']}
+
+---
+
+INSTRUCTIONS:
+Generate Session {session_number} of the study guide from this sermon transcript only.
+Follow the required session sections, formatting and tone exactly.
+
+Start your response with the session heading exactly as "## Session {session_number}: <Session Title>" and do not include a series title or any text before it.
+
+Generate Session {session_number} now."""
+
+    return Prompt([(series_block, True), (session_block, False)])
+
+
+def build_section_repair_prompt(
+    sermon: dict,
+    session_number: int,
+    total_sessions: int,
+    series_title: str,
+    target_audience: str,
+    draft: str,
+    missing: list,
+    series_context: str = ""
+) -> Prompt:
+    """
+    Build the prompt asking for only the missing sections of a session draft
+    Shares the cacheable series block with the session prompts
+    """
+    series_block = build_series_block(total_sessions, series_title, target_audience, series_context)
+
+    repair_block = f"""THIS SESSION: Session {session_number} of {total_sessions}
+
+SERMON TRANSCRIPT: {sermon['filename']}
+
+{sermon['content']}
+
+---
+
+DRAFT OF THIS SESSION (incomplete):
+
+{draft.strip()}
+
+---
+
+INSTRUCTIONS:
+The draft above is missing these required sections: {", ".join(missing)}.
+Write ONLY those sections, in the required order, each starting with its ### heading (e.g. "### {missing[0]}").
+Follow the required section content, formatting and tone exactly, and stay consistent with the draft.
+Do not repeat the session heading or any section already in the draft."""
+
+    return Prompt([(series_block, True), (repair_block, False)])
+
+
+def build_header(series_title: str, target_audience: str, session_count: int, note: str = None) -> str:
+    """Build the metadata header placed at the top of every study guide"""
+    note_line = f"*Note: {note}*\n" if note else ""
+    return f"""# {series_title}
+**Bible Study Guide**
+
+*Generated on {datetime.now().strftime("%B %d, %Y")}*
+*Target Audience: {target_audience}*
+*Number of Sessions: {session_count}*
+{note_line}
+---
+
+"""
+
+
+def build_error_content(series_title: str, attempts: int, error: Exception) -> str:
+    """Build the document saved when generation fails"""
+    return f"""# {series_title}
+**Bible Study Guide - PARTIAL/ERROR**
+
+*Generation failed after {attempts} attempts*
+*Error: {str(error)}*
+*Date: {datetime.now().strftime("%B %d, %Y")}*
+
+---
+
+**GENERATION INCOMPLETE**
+
+The study guide generation encountered an error. Please try again or contact support.
+
+Error details: {str(error)}
+"""
+
+
+def normalize_session_heading(content: str, session_number: int) -> str:
+    """Make sure a session starts with a '## Session N:' heading"""
+    content = content.strip()
+    match = re.search(r"^##\s+(?!#)(.*)$", content, re.MULTILINE)
+
+    if not match:
+        return f"## Session {session_number}\n\n{content}"
+
+    # Drop anything the model wrote before the first session heading
+    content = content[match.start():]
+    title = re.sub(r"^Session\s+\d+\s*[:.\-]?\s*", "", match.group(1).strip(), flags=re.IGNORECASE)
+    heading = f"## Session {session_number}: {title}" if title else f"## Session {session_number}"
+    return heading + content[match.end() - match.start():]
+
+
+def anthropic_messages(prompt: Prompt) -> dict:
+    """System and messages for the Anthropic API, with cache_control breakpoints"""
+    cache_control = {"type": "ephemeral"}
+    content = []
+    for text, cacheable in prompt.blocks:
+        block = {"type": "text", "text": text}
+        if cacheable:
+            block["cache_control"] = cache_control
+        content.append(block)
+
+    return {
+        "system": [{"type": "text", "text": prompt.system, "cache_control": cache_control}],
+        "messages": [{"role": "user", "content": content}]
+    }
+
+
+def openai_messages(prompt: Prompt) -> list:
+    """Messages for the OpenAI API (its prompt caching is automatic on shared prefixes)"""
+    return [
+        {"role": "system", "content": prompt.system},
+        {"role": "user", "content": prompt.text}
+    ]
+
+
+USAGE_FIELDS = ("input_tokens", "output_tokens", "cache_creation_input_tokens", "cache_read_input_tokens")
+
+# Token usage of the current generation, by API model
+current_usage = contextvars.ContextVar("current_usage", default=None)
+
+# Stop reason of the latest provider call in the current session task, so
+# callers can tell a complete response from one cut off at max_tokens
+current_completion = contextvars.ContextVar("current_completion", default=None)
+
+
+def record_stop_reason(model: str, stop_reason: str):
+    completion = current_completion.get()
+    if completion is not None:
+        completion["stop_reason"] = stop_reason
+    if is_truncated(stop_reason):
+        logger.warning(f"Output from {model} was cut off at its token limit")
+
+
+def record_usage(model: str, usage: dict, price_factor: float = 1.0):
+    """
+    Log token usage for one call and add it to the current generation's tally
+    price_factor scales the recorded cost (e.g. BATCH_PRICE_FACTOR)
+    """
+    usage = {field: usage.get(field) or 0 for field in USAGE_FIELDS}
+    logger.info(
+        f"Token usage ({model}): input={usage['input_tokens']} output={usage['output_tokens']} "
+        f"cache_write={usage['cache_creation_input_tokens']} cache_read={usage['cache_read_input_tokens']}"
     )
 
+    tally = current_usage.get()
+    if tally is not None:
+        totals = tally.setdefault(model, dict.fromkeys(USAGE_FIELDS, 0))
+        for field in USAGE_FIELDS:
+            totals[field] += usage[field]
+
+    # Metrics are labelled by the generation's form model, like the stage and
+    # generation metrics, including calls to helper models (series context, condensing)
+    labels = current_labels()
+    for field in USAGE_FIELDS:
+        if usage[field]:
+            TOKENS.inc(usage[field], type=field, **labels)
+    COST.inc(usage_cost(model, usage) * price_factor, **labels)
+
+
+def usage_cost(model: str, usage: dict) -> float:
+    """Estimated USD cost of one call's usage (0 for models without pricing)"""
+    prices = MODEL_PRICING.get(model)
+    if prices is None:
+        return 0.0
+    return sum(
+        usage.get(field, 0) * price for field, price in zip(USAGE_FIELDS, prices)
+    ) / 1_000_000
+
+
+def generation_labels(model: str, target_audience: str) -> dict:
+    """Metric labels for a generation (unknown form values are grouped as "other")"""
+    return {
+        "model": model if model in MODEL_CONFIG else "other",
+        "audience": target_audience if target_audience in AUDIENCE_GUIDANCE else "other"
+    }
+
+
+def openai_usage(usage) -> dict:
+    """Map OpenAI usage onto the Anthropic-style usage fields"""
+    if usage is None:
+        return {}
+    details = getattr(usage, "prompt_tokens_details", None)
+    cached = (getattr(details, "cached_tokens", None) or 0) if details else 0
+    return {
+        "input_tokens": usage.prompt_tokens - cached,
+        "output_tokens": usage.completion_tokens,
+        "cache_read_input_tokens": cached
+    }
+
+
+async def generate_with_anthropic(prompt: Prompt, model: str, max_tokens: int = 16000) -> str:
+    """Generate study guide using Anthropic Claude API"""
+    # Shared async client (pooled connections, 10 minute timeout)
+    client = get_anthropic_client()
+
     try:
-        # Simple user message approach - same as devotional generator that works
-        response = client.messages.create(
-            model=model,
-            max_tokens=16000,
-            temperature=1.0,
-            messages=[
-                {"role": "user", "content": prompt}
-            ]
+        # Static instructions go in a cached system block, variable content follows
+        response = await provider_scheduler.run(
+            "anthropic", model, estimate_prompt_tokens(prompt),
+            lambda: client.beta.prompt_caching.messages.create(
+                model=model,
+                max_tokens=max_tokens,
+                temperature=1.0,
+                **anthropic_messages(prompt)
+            )
         )
 
+        record_usage(model, response.usage.model_dump())
+        record_stop_reason(model, response.stop_reason)
         return response.content[0].text
 
     except Exception as e:
@@ -143,130 +537,976 @@ async def generate_with_anthropic(prompt: str, model: str) -> str:
         logger.error(f"  Model: {model}")
         logger.error(f"  Error: {error_msg}")
         logger.error(f"  Prompt length: {len(prompt)} characters")
-        raise Exception(f"Anthropic API error: {error_msg}")
+        raise Exception(f"Anthropic API error: {error_msg}") from e
 
 
-async def generate_with_openai(prompt: str, model: str) -> str:
+async def generate_with_openai(prompt: Prompt, model: str, max_tokens: int = 16000) -> str:
     """Generate study guide using OpenAI GPT API"""
-    # Set longer timeout for large study guide generation (10 minutes)
-    client = OpenAI(
-        api_key=os.getenv("OPENAI_API_KEY"),
-        timeout=600.0  # 10 minutes
-    )
+    # Shared async client (pooled connections, 10 minute timeout)
+    client = get_openai_client()
 
     try:
-        response = client.chat.completions.create(
-            model=model,
-            messages=[
-                {"role": "system", "content": "You are an expert Bible study curriculum designer with deep theological knowledge and pastoral sensitivity."},
-                {"role": "user", "content": prompt}
-            ],
-            max_tokens=16000,
-            temperature=1.0
+        response = await provider_scheduler.run(
+            "openai", model, estimate_prompt_tokens(prompt),
+            lambda: client.chat.completions.create(
+                model=model,
+                messages=openai_messages(prompt),
+                max_tokens=max_tokens,
+                temperature=1.0
+            )
         )
 
+        record_usage(model, openai_usage(response.usage))
+        record_stop_reason(model, response.choices[0].finish_reason)
         return response.choices[0].message.content
 
     except Exception as e:
-        raise Exception(f"OpenAI API error: {str(e)}")
+        raise Exception(f"OpenAI API error: {str(e)}") from e
 
 
-async def generate_study_guide(
+async def stream_with_anthropic(prompt: Prompt, model: str, max_tokens: int = 16000):
+    """Stream study guide text from Anthropic Claude API as it is generated"""
+    client = get_anthropic_client()
+
+    try:
+        # Only opening the stream is retried; a failure mid-stream surfaces to the caller
+        stream = await provider_scheduler.run(
+            "anthropic", model, estimate_prompt_tokens(prompt),
+            lambda: client.beta.prompt_caching.messages.stream(
+                model=model,
+                max_tokens=max_tokens,
+                temperature=1.0,
+                **anthropic_messages(prompt)
+            ).__aenter__()
+        )
+        try:
+            async for text in stream.text_stream:
+                yield text
+            final_message = await stream.get_final_message()
+        finally:
+            await stream.close()
+
+        record_usage(model, final_message.usage.model_dump())
+        record_stop_reason(model, final_message.stop_reason)
+
+    except Exception as e:
+        logger.error(f"Anthropic streaming error ({model}): {str(e)}")
+        raise Exception(f"Anthropic API error: {str(e)}") from e
+
+
+async def stream_with_openai(prompt: Prompt, model: str, max_tokens: int = 16000):
+    """Stream study guide text from OpenAI GPT API as it is generated"""
+    client = get_openai_client()
+
+    try:
+        stream = await provider_scheduler.run(
+            "openai", model, estimate_prompt_tokens(prompt),
+            lambda: client.chat.completions.create(
+                model=model,
+                messages=openai_messages(prompt),
+                max_tokens=max_tokens,
+                temperature=1.0,
+                stream=True,
+                stream_options={"include_usage": True}
+            )
+        )
+        async for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+            if chunk.choices and chunk.choices[0].finish_reason:
+                record_stop_reason(model, chunk.choices[0].finish_reason)
+            if chunk.usage:
+                record_usage(model, openai_usage(chunk.usage))
+
+    except Exception as e:
+        raise Exception(f"OpenAI API error: {str(e)}") from e
+
+
+async def call_provider(provider: str, prompt: Prompt, api_model: str, max_tokens: int = 16000) -> str:
+    """Dispatch a prompt to the given provider"""
+    if provider == "anthropic":
+        return await generate_with_anthropic(prompt, api_model, max_tokens)
+    elif provider == "openai":
+        return await generate_with_openai(prompt, api_model, max_tokens)
+    else:
+        raise ValueError(f"Unknown provider: {provider}")
+
+
+def stream_provider(provider: str, prompt: Prompt, api_model: str, max_tokens: int = 16000):
+    """Stream a prompt's output from the given provider"""
+    if provider == "anthropic":
+        return stream_with_anthropic(prompt, api_model, max_tokens)
+    elif provider == "openai":
+        return stream_with_openai(prompt, api_model, max_tokens)
+    else:
+        raise ValueError(f"Unknown provider: {provider}")
+
+
+async def generate_with_retry(
+    prompt: Prompt,
+    provider: str,
+    api_model: str,
+    max_tokens: int = 16000,
+    max_retries: int = 1,
+    label: str = ""
+) -> tuple:
+    """
+    Generate content with retry logic and GPT-4o fallback
+    Returns (content, note) where note is set when the fallback was used
+    Raises the last error once all attempts fail
+    """
+    attempt = 0
+    last_error = None
+
+    while attempt <= max_retries:
+        try:
+            content = await call_provider(provider, prompt, api_model, max_tokens)
+            return content, None
+
+        except Exception as e:
+            last_error = e
+            attempt += 1
+
+            # If Anthropic fails with content filtering, try GPT-4o as fallback
+            if provider == "anthropic" and "content filtering" in str(e).lower():
+                logger.warning(f"Anthropic content filtering detected, attempting GPT-4o fallback...")
+                try:
+                    content = await generate_with_openai(prompt, "gpt-4o", max_tokens)
+                    logger.info(f"GPT-4o fallback succeeded for: {label}")
+                    return content, "Generated with GPT-4o due to content filtering with Claude"
+                except Exception as fallback_error:
+                    logger.error(f"GPT-4o fallback also failed: {str(fallback_error)}")
+                    last_error = fallback_error
+
+            # Bad requests and auth errors fail the same way on every attempt
+            if is_permanent_error(last_error):
+                break
+
+    raise last_error
+
+
+async def generate_series_context(
     sermons: list,
     series_title: str,
     target_audience: str,
-    model: str
+    provider: str,
+    use_cache: bool = True
 ) -> str:
+    """Run the cheap series-level pass; returns an empty string if it fails"""
+    cache_key = content_hash(
+        PROMPT_VERSION, "series_context", provider, series_title, target_audience,
+        [sermon["content"] for sermon in sermons]
+    )
+    if use_cache:
+        cached = await asyncio.to_thread(session_cache.get, cache_key)
+        if cached is not None:
+            return json.loads(cached)["content"]
+
+    prompt = build_series_context_prompt(sermons, series_title, target_audience)
+    try:
+        series_context = await call_provider(provider, prompt, SERIES_CONTEXT_MODELS[provider], max_tokens=1500)
+    except Exception as e:
+        logger.warning(f"Series context pass failed, generating sessions without it: {str(e)}")
+        return ""
+
+    await asyncio.to_thread(session_cache.set, cache_key, json.dumps({"content": series_context}))
+    return series_context
+
+
+class LatencyTracker:
+    """Recent time-to-first-token samples per provider and model"""
+
+    def __init__(self, window: int = 50):
+        self.window = window
+        self._samples = {}
+
+    def record(self, provider: str, model: str, seconds: float):
+        self._samples.setdefault((provider, model), deque(maxlen=self.window)).append(seconds)
+
+    def percentile(self, provider: str, model: str, percentile: float):
+        """Latency at the given percentile, or None without enough samples"""
+        samples = sorted(self._samples.get((provider, model), ()))
+        if len(samples) < HEDGE_MIN_SAMPLES:
+            return None
+        index = min(len(samples) - 1, int(round(percentile / 100 * (len(samples) - 1))))
+        return samples[index]
+
+    def hedge_delay(self, provider: str, model: str) -> float:
+        delay = self.percentile(provider, model, HEDGE_PERCENTILE)
+        return HEDGE_DEFAULT_DELAY if delay is None else delay
+
+
+latency_tracker = LatencyTracker()
+
+
+async def timed_stream(provider: str, prompt: Prompt, api_model: str, max_tokens: int, on_first_token=None):
+    """Stream from a provider, recording time to first token"""
+    start = time.monotonic()
+    first = True
+    async for text in stream_provider(provider, prompt, api_model, max_tokens):
+        if first:
+            first = False
+            latency_tracker.record(provider, api_model, time.monotonic() - start)
+            FIRST_TOKEN_SECONDS.observe(time.monotonic() - start, **current_labels())
+            if on_first_token:
+                on_first_token()
+        yield text
+
+
+async def generate_hedged(
+    prompt: Prompt,
+    provider: str,
+    api_model: str,
+    max_tokens: int,
+    on_token,
+    label: str = ""
+) -> tuple:
     """
-    Generate complete Bible study guide
-    Supports multiple AI models with retry logic for partial failures
+    Stream from the primary; if no first token arrives within the hedge delay,
+    also start the secondary model and keep whichever finishes first
+    Tokens are forwarded only while the primary is running alone
+    Returns (content, note)
     """
+    secondary_model = HEDGE_SECONDARY[provider]
+    secondary_provider, secondary_api_model = MODEL_CONFIG[secondary_model]
+    delay = latency_tracker.hedge_delay(provider, api_model)
 
-    # Build the prompt
-    prompt = build_generation_prompt(sermons, series_title, target_audience)
+    hedged = False
+    first_token = asyncio.Event()
 
-    # Map model names to API calls
-    model_config = {
-        "claude-sonnet-4.5": ("anthropic", "claude-sonnet-4-5-20250929"),
-        "claude-3.5-haiku": ("anthropic", "claude-3-5-haiku-20241022"),
-        "gpt-4o": ("openai", "gpt-4o")
-    }
+    async def run(run_provider: str, run_model: str, run_max_tokens: int, forward: bool) -> str:
+        parts = []
+        on_first = first_token.set if forward else None
+        async for text in timed_stream(run_provider, prompt, run_model, run_max_tokens, on_first):
+            parts.append(text)
+            if forward and not hedged:
+                await on_token(text)
+        return "".join(parts)
 
-    if model not in model_config:
-        raise ValueError(f"Unknown model: {model}")
+    primary = asyncio.create_task(run(provider, api_model, max_tokens, True))
+    waiter = asyncio.create_task(first_token.wait())
+    done, _ = await asyncio.wait({primary, waiter}, timeout=delay, return_when=asyncio.FIRST_COMPLETED)
+    waiter.cancel()
 
-    provider, api_model = model_config[model]
+    if done:
+        # First token arrived (or the primary ended) in time: no hedge
+        return await primary, None
 
-    # Attempt generation with retry logic and fallback
-    max_retries = 1
-    attempt = 0
-    last_error = None
+    try:
+        secondary_max_tokens = output_allowance(prompt, secondary_api_model, max_tokens)
+    except ValueError:
+        return await primary, None
 
-    while attempt <= max_retries:
-        try:
-            if provider == "anthropic":
-                content = await generate_with_anthropic(prompt, api_model)
-            elif provider == "openai":
-                content = await generate_with_openai(prompt, api_model)
+    hedged = True
+    logger.warning(f"No first token from {api_model} after {delay:.1f}s for {label}, hedging with {secondary_api_model}")
+    secondary = asyncio.create_task(run(secondary_provider, secondary_api_model, secondary_max_tokens, False))
+
+    pending = {primary, secondary}
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    if task is primary:
+                        return task.result(), None
+                    logger.info(f"Hedged request won by {secondary_api_model} for {label}")
+                    return task.result(), f"Generated with {secondary_model} after a slow response from {api_model}"
+    finally:
+        for task in pending:
+            task.cancel()
+
+    raise primary.exception()
+
+
+async def generate_streamed(
+    prompt: Prompt,
+    provider: str,
+    api_model: str,
+    max_tokens: int,
+    on_token,
+    label: str = ""
+) -> tuple:
+    """
+    Stream content from the provider, passing each text delta to on_token
+    With HEDGE_REQUESTS, slow first tokens are hedged with the secondary model
+    If the stream fails, retries once without streaming (with GPT-4o fallback)
+    Returns (content, note)
+    """
+    parts = []
+    try:
+        if HEDGE_REQUESTS and provider in HEDGE_SECONDARY:
+            return await generate_hedged(prompt, provider, api_model, max_tokens, on_token, label)
+
+        async for text in timed_stream(provider, prompt, api_model, max_tokens):
+            parts.append(text)
+            await on_token(text)
+        return "".join(parts), None
+
+    except Exception as e:
+        logger.warning(f"Streaming failed for {label}, retrying without streaming: {str(e)}")
+        return await generate_with_retry(
+            prompt, provider, api_model, max_tokens, max_retries=0, label=label
+        )
+
+
+async def repair_session(
+    content: str,
+    sermon: dict,
+    session_number: int,
+    total_sessions: int,
+    series_title: str,
+    target_audience: str,
+    provider: str,
+    api_model: str,
+    truncated: bool = False,
+    series_context: str = "",
+    label: str = ""
+) -> tuple:
+    """
+    Check a session against the required sections; request only the missing
+    ones (including one cut off by truncation) and splice them into place
+    Returns (content, names of sections still missing)
+    """
+    kept, missing = check_session(content, truncated)
+    if not missing:
+        return content, []
+
+    labels = current_labels()
+    REPAIRS.inc(kind="section", **labels)
+    logger.warning(
+        f"{label} is missing {', '.join(missing)}{' (truncated)' if truncated else ''}; requesting only those sections"
+    )
+
+    prompt = build_section_repair_prompt(
+        sermon, session_number, total_sessions, series_title, target_audience, kept, missing, series_context
+    )
+    try:
+        with STAGE_SECONDS.time(stage="repair", **labels):
+            max_tokens = output_allowance(
+                prompt, api_model, min(SESSION_MAX_TOKENS, REPAIR_TOKENS_PER_SECTION * len(missing))
+            )
+            additions, _ = await generate_with_retry(
+                prompt, provider, api_model, max_tokens, max_retries=0, label=f"{label} repair"
+            )
+    except Exception as e:
+        logger.error(f"Section repair failed for {label}: {str(e)}")
+        return content, missing
+
+    return splice_sections(kept, additions, missing)
+
+
+async def repair_guide(
+    content: str,
+    sermons: list,
+    series_title: str,
+    target_audience: str,
+    provider: str,
+    api_model: str,
+    truncated: bool = False,
+    label: str = ""
+) -> tuple:
+    """
+    Check a single-prompt guide session by session: sessions it lacks (e.g. after
+    truncation) are generated on their own, and sessions missing sections are
+    repaired with repair_session
+    Returns (content, descriptions of anything that could not be repaired)
+    """
+    preamble, found = split_sessions(content)
+    sessions = {}
+    for session_number, text in found:
+        if 1 <= session_number <= len(sermons) and session_number not in sessions:
+            sessions[session_number] = text
+    last = found[-1][0] if found else None
+
+    def cut_off(session_number: int) -> bool:
+        return truncated and session_number == last
+
+    broken = [
+        session_number for session_number in range(1, len(sermons) + 1)
+        if session_number not in sessions or check_session(sessions[session_number], cut_off(session_number))[1]
+    ]
+    if not broken:
+        return content, []
+
+    problems = []
+    semaphore = asyncio.Semaphore(max(1, SESSION_CONCURRENCY))
+
+    async def fix(session_number: int):
+        sermon = sermons[session_number - 1]
+        session_label = f"{label} session {session_number}"
+        async with semaphore:
+            if session_number in sessions:
+                text, was_cut_off = sessions[session_number], cut_off(session_number)
             else:
-                raise ValueError(f"Unknown provider: {provider}")
+                REPAIRS.inc(kind="session", **current_labels())
+                logger.warning(f"{label} is missing session {session_number}; generating only that session")
+                completion = {}
+                current_completion.set(completion)
+                prompt = build_session_prompt(sermon, session_number, len(sermons), series_title, target_audience)
+                try:
+                    text, _ = await generate_with_retry(
+                        prompt, provider, api_model, output_allowance(prompt, api_model, SESSION_MAX_TOKENS),
+                        max_retries=0, label=session_label
+                    )
+                except Exception as e:
+                    logger.error(f"Generating missing {session_label} failed: {str(e)}")
+                    problems.append(f"session {session_number} is missing")
+                    return
+                text = normalize_session_heading(text, session_number)
+                was_cut_off = is_truncated(completion.get("stop_reason"))
 
-            # Add metadata header
-            header = f"""# {series_title}
-**Bible Study Guide**
+            text, missing = await repair_session(
+                text, sermon, session_number, len(sermons), series_title, target_audience,
+                provider, api_model, was_cut_off, label=session_label
+            )
+            sessions[session_number] = text
+            if missing:
+                problems.append(f"session {session_number} is missing {', '.join(missing)}")
 
-*Generated on {datetime.now().strftime("%B %d, %Y")}*
-*Target Audience: {target_audience}*
-*Number of Sessions: {len(sermons)}*
+    await asyncio.gather(*(fix(session_number) for session_number in broken))
+
+    # Sessions are rejoined with one separator each (the model's own trailing ones are dropped)
+    body = "\n\n---\n\n".join(
+        re.sub(r"\n+-{3,}\s*$", "", sessions[session_number].strip()) for session_number in sorted(sessions)
+    )
+    return (preamble.strip() + "\n\n" if preamble.strip() else "") + body, sorted(problems)
+
+
+def guide_cache_key(sermons: list, series_title: str, target_audience: str, api_model: str, mode: str) -> str:
+    """Cache key for a finished guide: ordered sermon contents plus every generation option"""
+    return content_hash(
+        PROMPT_VERSION,
+        mode,
+        api_model,
+        series_title,
+        target_audience,
+        [sermon["content"] for sermon in sermons]
+    )
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimate the token count of a text without calling a tokenizer"""
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def cleanup_report(sermons: list, sizes: list) -> list:
+    """Bytes and estimated tokens saved per sermon by transcript cleanup (logged and counted)"""
+    report = []
+    for sermon, (before, after) in zip(sermons, sizes):
+        saved = max(0, before - after)
+        report.append({
+            "filename": sermon["filename"],
+            "bytes_saved": saved,
+            "tokens_saved": saved // CHARS_PER_TOKEN
+        })
+        CLEANUP_SAVED.inc(saved, unit="bytes")
+        CLEANUP_SAVED.inc(saved // CHARS_PER_TOKEN, unit="tokens")
+
+    total = sum(item["bytes_saved"] for item in report)
+    if total:
+        logger.info(
+            f"Transcript cleanup removed {total} bytes (about {total // CHARS_PER_TOKEN} tokens) "
+            f"from {len(sermons)} sermon(s)"
+        )
+    return report
+
+
+def estimate_prompt_tokens(prompt: Prompt) -> int:
+    return estimate_tokens(prompt.system) + estimate_tokens(prompt.text)
+
+
+def output_allowance(prompt: Prompt, api_model: str, requested: int) -> int:
+    """Output tokens that fit in the model's context window after the prompt"""
+    context_window, max_output = MODEL_LIMITS.get(api_model, DEFAULT_MODEL_LIMITS)
+    remaining = context_window - estimate_prompt_tokens(prompt) - PROMPT_SAFETY_MARGIN
+    allowance = min(requested, max_output, remaining)
+    if allowance < MIN_OUTPUT_TOKENS:
+        raise ValueError(
+            f"Prompt is too large for {api_model} (about {estimate_prompt_tokens(prompt)} tokens)"
+        )
+    return allowance
+
+
+def transcript_budget(prompt_overhead: Prompt, api_model: str, output_tokens: int, transcripts_in_prompt: int) -> int:
+    """Token budget for each transcript so the prompt leaves room for the requested output"""
+    context_window, max_output = MODEL_LIMITS.get(api_model, DEFAULT_MODEL_LIMITS)
+    available = (
+        context_window
+        - min(output_tokens, max_output)
+        - estimate_prompt_tokens(prompt_overhead)
+        - PROMPT_SAFETY_MARGIN
+    )
+    return max(1000, min(TRANSCRIPT_TOKEN_BUDGET, available // max(1, transcripts_in_prompt)))
+
+
+def split_transcript(content: str, chunk_tokens: int) -> list:
+    """Split a transcript into chunks of about chunk_tokens, on line boundaries"""
+    max_chars = chunk_tokens * CHARS_PER_TOKEN
+    chunks = []
+    current = []
+    size = 0
+    for line in content.splitlines(keepends=True):
+        if current and size + len(line) > max_chars:
+            chunks.append("".join(current))
+            current = []
+            size = 0
+        # Very long lines (e.g. transcripts without line breaks) are hard-split
+        while len(line) > max_chars:
+            chunks.append(line[:max_chars])
+            line = line[max_chars:]
+        current.append(line)
+        size += len(line)
+    if current:
+        chunks.append("".join(current))
+    return chunks
+
+
+def build_condense_prompt(text: str, filename: str, part: int, parts: int, target_tokens: int) -> Prompt:
+    """Build the prompt that condenses one part of a long sermon transcript"""
+    target_words = max(100, int(target_tokens * 0.75))
+    part_label = f" (part {part} of {parts})" if parts > 1 else ""
+
+    prompt = f"""Condense this sermon transcript{part_label} into detailed notes of at most {target_words} words. The notes will be used to write a Bible study session.
+
+SERMON: {filename}
+
+{text}
 
 ---
 
-"""
-            return header + content
+Keep:
+- Every scripture reference, exactly as cited (book, chapter and verse)
+- The main points and the order of the argument
+- Key illustrations and stories, briefly
+- Practical applications and calls to action
+- Short memorable quotes
+
+Return only the notes."""
+
+    return Prompt([(prompt, False)], system=SYSTEM_PROMPT)
+
+
+async def condense_transcript(sermon: dict, budget_tokens: int, provider: str, semaphore: asyncio.Semaphore) -> dict:
+    """
+    Map-reduce a transcript down to its token budget with the cheap model
+    Map: condense each chunk in parallel; reduce: condense the joined notes if still too long
+    """
+    model = SERIES_CONTEXT_MODELS[provider]
+    chunks = split_transcript(sermon["content"], CONDENSE_CHUNK_TOKENS)
+    target = max(200, budget_tokens // len(chunks))
 
+    async def condense(text: str, part: int, parts: int, target_tokens: int) -> str:
+        prompt = build_condense_prompt(text, sermon["filename"], part, parts, target_tokens)
+        async with semaphore:
+            return await call_provider(provider, prompt, model, max_tokens=min(4096, int(target_tokens * 1.5)))
+
+    notes = await asyncio.gather(*[
+        condense(chunk, idx + 1, len(chunks), target) for idx, chunk in enumerate(chunks)
+    ])
+    condensed = "\n\n".join(notes)
+
+    if estimate_tokens(condensed) > budget_tokens:
+        condensed = await condense(condensed, 1, 1, budget_tokens)
+
+    logger.info(
+        f"Condensed '{sermon['filename']}' from about {estimate_tokens(sermon['content'])} "
+        f"to {estimate_tokens(condensed)} tokens"
+    )
+    return {
+        **sermon,
+        "content": f"[Condensed notes from the full sermon transcript]\n\n{condensed}",
+        "condensed": True
+    }
+
+
+async def fit_sermons_to_budget(sermons: list, indices: list, budget_tokens: int, provider: str) -> tuple:
+    """
+    Condense the sermons at the given indices that exceed budget_tokens, in parallel
+    Returns (sermons, condensed_indices); sermons is a new list
+    """
+    over_budget = [idx for idx in indices if estimate_tokens(sermons[idx]["content"]) > budget_tokens]
+    if not over_budget:
+        return sermons, []
+
+    semaphore = asyncio.Semaphore(max(1, CONDENSE_CONCURRENCY))
+    condensed = await asyncio.gather(*[
+        condense_transcript(sermons[idx], budget_tokens, provider, semaphore) for idx in over_budget
+    ])
+
+    fitted = list(sermons)
+    for idx, sermon in zip(over_budget, condensed):
+        fitted[idx] = sermon
+    return fitted, over_budget
+
+
+def session_cache_key(
+    sermon: dict,
+    session_number: int,
+    total_sessions: int,
+    series_title: str,
+    target_audience: str,
+    api_model: str
+) -> str:
+    """
+    Cache key for one fan-out session: its own sermon plus the options in its prompt
+    The series plan is deliberately left out so editing one sermon only invalidates its session
+    """
+    return content_hash(
+        PROMPT_VERSION,
+        "session",
+        api_model,
+        series_title,
+        target_audience,
+        session_number,
+        total_sessions,
+        sermon["content"]
+    )
+
+
+async def stream_study_guide(
+    sermons: list,
+    series_title: str,
+    target_audience: str,
+    model: str,
+    mode: str = None,
+    use_cache: bool = True,
+    force_sessions: set = None
+):
+    """
+    Generate a study guide, yielding (event, data) progress tuples as it goes
+    Events: generation_started, cleanup, series_context, session_started, token,
+    session_completed, session_failed and finally generation_completed
+    with the full markdown document in data["content"]
+    In single mode the whole guide is streamed as session 0
+    data["failed_sessions"] lists sessions that could not be generated (the
+    document then holds error placeholders for them, or is the error document)
+    In fan-out mode unchanged sessions are reused from the session cache,
+    so only sessions whose sermon or options changed are regenerated
+    use_cache=False skips all cache lookups (results are still stored)
+    force_sessions: session numbers to regenerate even if cached
+    """
+    force_sessions = set(force_sessions or ())
+
+    if model not in MODEL_CONFIG:
+        raise ValueError(f"Unknown model: {model}")
+
+    provider, api_model = MODEL_CONFIG[model]
+    mode = mode or GENERATION_MODE
+    fanout = mode == "fanout" and len(sermons) > 1
+
+    # Labels for metrics recorded by provider calls below
+    labels = generation_labels(model, target_audience)
+    metric_labels.set(labels)
+
+    # Strip caption debris, fillers and extra whitespace before anything is keyed or prompted
+    with STAGE_SECONDS.time(stage="cleanup", **labels):
+        sermons, sizes = await clean_sermons(sermons)
+    cleanup = cleanup_report(sermons, sizes)
+
+    cache_key = guide_cache_key(sermons, series_title, target_audience, api_model, "fanout" if fanout else "single")
+    if use_cache and not force_sessions:
+        cached = await asyncio.to_thread(guide_cache.get, cache_key)
+        if cached is not None:
+            logger.info(f"Using cached study guide for '{series_title}'")
+            yield "generation_started", {"mode": "fanout" if fanout else "single", "sessions": len(sermons), "cached": True}
+            yield "generation_completed", {"content": cached, "cached": True, "usage": {}, "failed_sessions": []}
+            return
+
+    yield "generation_started", {"mode": "fanout" if fanout else "single", "sessions": len(sermons), "cached": False}
+    yield "cleanup", {"sermons": cleanup}
+
+    # Provider calls below (including in session tasks) add their token usage here
+    usage = {}
+    current_usage.set(usage)
+
+    results = {}
+    session_keys = {}
+
+    if fanout:
+        session_keys = {
+            idx + 1: session_cache_key(sermon, idx + 1, len(sermons), series_title, target_audience, api_model)
+            for idx, sermon in enumerate(sermons)
+        }
+
+        # Reuse sessions whose sermon and options are unchanged
+        if use_cache:
+            for session_number, key in session_keys.items():
+                if session_number in force_sessions:
+                    continue
+                cached = await asyncio.to_thread(session_cache.get, key)
+                if cached is not None:
+                    entry = json.loads(cached)
+                    results[session_number] = (entry["content"], entry.get("note"))
+                    yield "session_completed", {"session": session_number, "content": entry["content"], "cached": True}
+
+        pending = [session_number for session_number in session_keys if session_number not in results]
+        if pending:
+            logger.info(f"Generating sessions {pending} for '{series_title}' ({len(results)} reused from cache)")
+
+            # Condense transcripts too long for their session's token budget
+            budget = transcript_budget(
+                build_session_prompt({"filename": "", "content": ""}, 1, len(sermons), series_title, target_audience),
+                api_model, SESSION_MAX_TOKENS, 1
+            )
+            yield "budget", {
+                "transcript_tokens": [estimate_tokens(sermon["content"]) for sermon in sermons],
+                "budget_tokens": budget
+            }
+            with STAGE_SECONDS.time(stage="condense", **labels):
+                fitted, condensed = await fit_sermons_to_budget(
+                    sermons, [n - 1 for n in pending], budget, provider
+                )
+            if condensed:
+                yield "condensed", {"sessions": [idx + 1 for idx in condensed]}
+
+            yield "series_context", {"status": "started"}
+            with STAGE_SECONDS.time(stage="series_context", **labels):
+                series_context = await generate_series_context(
+                    sermons, series_title, target_audience, provider, use_cache
+                )
+            yield "series_context", {"status": "completed" if series_context else "skipped"}
+        else:
+            fitted = sermons
+            series_context = ""
+
+        prompt_start = time.monotonic()
+        prompts = [
+            (session_number, build_session_prompt(
+                fitted[session_number - 1], session_number, len(sermons),
+                series_title, target_audience, series_context
+            ), SESSION_MAX_TOKENS)
+            for session_number in pending
+        ]
+    else:
+        # Condense transcripts so the combined prompt leaves room for the full guide
+        budget = transcript_budget(
+            build_generation_prompt([], series_title, target_audience), api_model, 16000, len(sermons)
+        )
+        yield "budget", {
+            "transcript_tokens": [estimate_tokens(sermon["content"]) for sermon in sermons],
+            "budget_tokens": budget
+        }
+        with STAGE_SECONDS.time(stage="condense", **labels):
+            fitted, condensed = await fit_sermons_to_budget(sermons, list(range(len(sermons))), budget, provider)
+        if condensed:
+            yield "condensed", {"sessions": [idx + 1 for idx in condensed]}
+
+        prompt_start = time.monotonic()
+        series_context = ""
+        prompts = [(0, build_generation_prompt(fitted, series_title, target_audience), 16000)]
+
+    # Size each output allowance to what is left of the context window
+    jobs = [
+        (session_number, prompt, output_allowance(prompt, api_model, requested))
+        for session_number, prompt, requested in prompts
+    ]
+    STAGE_SECONDS.observe(time.monotonic() - prompt_start, stage="prompt_build", **labels)
+
+    queue = asyncio.Queue()
+    semaphore = asyncio.Semaphore(max(1, SESSION_CONCURRENCY))
+    incomplete = []
+
+    async def run_job(session_number: int, prompt: Prompt, max_tokens: int):
+        label = f"{series_title} session {session_number}" if session_number else series_title
+
+        async def on_token(text: str):
+            await queue.put(("token", {"session": session_number, "text": text}))
+
+        # Provider calls in this task report their stop reason here
+        completion = {}
+        current_completion.set(completion)
+
+        try:
+            async with semaphore:
+                await queue.put(("session_started", {"session": session_number}))
+                with STAGE_SECONDS.time(stage="session", **labels):
+                    content, note = await generate_streamed(
+                        prompt, provider, api_model, max_tokens, on_token, label
+                    )
+                truncated = is_truncated(completion.get("stop_reason"))
+
+                # Ask only for missing or cut-off parts instead of regenerating
+                if session_number:
+                    content = normalize_session_heading(content, session_number)
+                    content, missing = await repair_session(
+                        content, fitted[session_number - 1], session_number, len(sermons),
+                        series_title, target_audience, provider, api_model, truncated, series_context, label
+                    )
+                    problems = [f"session {session_number} is missing {', '.join(missing)}"] if missing else []
+                else:
+                    content, problems = await repair_guide(
+                        content, fitted, series_title, target_audience, provider, api_model, truncated, label
+                    )
+
+            if problems:
+                incomplete.extend(problems)
+                note = "; ".join(([note] if note else []) + [f"INCOMPLETE - {problem}" for problem in problems])
+            elif session_number:
+                await asyncio.to_thread(
+                    session_cache.set, session_keys[session_number], json.dumps({"content": content, "note": note})
+                )
+            results[session_number] = (content, note)
+            await queue.put(("session_completed", {"session": session_number, "content": content}))
         except Exception as e:
-            last_error = e
-            attempt += 1
+            logger.error(f"Generation failed for {label}: {str(e)}")
+            results[session_number] = e
+            await queue.put(("session_failed", {"session": session_number, "error": str(e)}))
+        finally:
+            await queue.put(None)
 
-            # If Anthropic fails with content filtering, try GPT-4o as fallback
-            if provider == "anthropic" and "content filtering" in str(e).lower():
-                logger.warning(f"Anthropic content filtering detected, attempting GPT-4o fallback...")
-                try:
-                    content = await generate_with_openai(prompt, "gpt-4o")
-                    logger.info(f"GPT-4o fallback succeeded for series: {series_title}")
-                    header = f"""# {series_title}
-**Bible Study Guide**
+    tasks = [asyncio.create_task(run_job(*job)) for job in jobs]
+    try:
+        remaining = len(tasks)
+        while remaining:
+            item = await queue.get()
+            if item is None:
+                remaining -= 1
+                continue
+            yield item
+    finally:
+        # Stop outstanding work if the consumer goes away
+        for task in tasks:
+            if not task.done():
+                task.cancel()
 
-*Generated on {datetime.now().strftime("%B %d, %Y")}*
-*Target Audience: {target_audience}*
-*Number of Sessions: {len(sermons)}*
-*Note: Generated with GPT-4o due to content filtering with Claude*
+    content = assemble_study_guide(results, sermons, series_title, target_audience)
+    failed_sessions = sorted(
+        session_number for session_number, result in results.items() if isinstance(result, Exception)
+    )
 
----
+    # Only complete guides are cached
+    if results and not incomplete and not failed_sessions:
+        await asyncio.to_thread(guide_cache.set, cache_key, content)
 
-"""
-                    return header + content
-                except Exception as fallback_error:
-                    logger.error(f"GPT-4o fallback also failed: {str(fallback_error)}")
-                    last_error = fallback_error
+    yield "generation_completed", {
+        "content": content, "cached": False, "usage": usage, "failed_sessions": failed_sessions
+    }
 
-            if attempt > max_retries:
-                # Save partial results if any progress was made
-                error_content = f"""# {series_title}
-**Bible Study Guide - PARTIAL/ERROR**
 
-*Generation failed after {max_retries + 1} attempts*
-*Error: {str(last_error)}*
-*Date: {datetime.now().strftime("%B %d, %Y")}*
+def assemble_study_guide(results: dict, sermons: list, series_title: str, target_audience: str) -> str:
+    """Merge per-session results (or the single-prompt result at key 0) into one document"""
 
----
+    if 0 in results:
+        result = results[0]
+        if isinstance(result, Exception):
+            # Save partial results if any progress was made
+            return build_error_content(series_title, 2, result)
+        content, note = result
+        return build_header(series_title, target_audience, len(sermons), note) + content
 
-**GENERATION INCOMPLETE**
+    sessions = []
+    notes = set()
+    failed = []
+    for idx, sermon in enumerate(sermons):
+        session_number = idx + 1
+        result = results.get(session_number)
+        if isinstance(result, Exception) or result is None:
+            failed.append(session_number)
+            sessions.append(
+                f"## Session {session_number}: GENERATION INCOMPLETE\n\n"
+                f"This session could not be generated from {sermon['filename']}.\n\n"
+                f"Error details: {str(result)}"
+            )
+        else:
+            content, note = result
+            sessions.append(content)
+            if note:
+                notes.add(note)
 
-The study guide generation encountered an error. Please try again or contact support.
+    if len(failed) == len(sermons):
+        return build_error_content(series_title, 2, Exception("All sessions failed to generate"))
+
+    note_parts = sorted(notes)
+    if failed:
+        note_parts.append(f"PARTIAL - sessions {', '.join(map(str, failed))} failed to generate")
+    note = "; ".join(note_parts) if note_parts else None
+
+    return build_header(series_title, target_audience, len(sermons), note) + "\n\n---\n\n".join(sessions)
+
+
+async def generate_study_guide(
+    sermons: list,
+    series_title: str,
+    target_audience: str,
+    model: str,
+    mode: str = None,
+    use_cache: bool = True,
+    force_sessions: set = None,
+    usage: dict = None,
+    strict: bool = False
+) -> str:
+    """
+    Generate complete Bible study guide
+    Supports multiple AI models with retry logic for partial failures
+    mode: "fanout" generates each session concurrently, "single" uses one prompt
+    use_cache: return a cached guide for identical inputs without calling the provider
+    force_sessions: session numbers to regenerate even if cached
+    usage: if given, filled with token usage per API model
+    strict: raise if any session failed instead of returning a partial or error document
+    """
+    content = ""
+    failed_sessions = []
+    async for event, data in stream_study_guide(
+        sermons, series_title, target_audience, model, mode, use_cache, force_sessions
+    ):
+        if event == "generation_completed":
+            content = data["content"]
+            failed_sessions = data["failed_sessions"]
+            if usage is not None:
+                usage.update(data["usage"])
+
+    if strict and failed_sessions:
+        if failed_sessions == [0]:
+            raise Exception(f"Study guide generation failed for '{series_title}'")
+        raise Exception(f"Sessions {', '.join(map(str, failed_sessions))} of '{series_title}' failed to generate")
+    return content
+
+
+async def prepare_batch_sermons(sermons: list, series_title: str, target_audience: str, model: str) -> tuple:
+    """
+    Clean sermons for a deferred guide
+    Returns (cleaned sermons, guide cache key); check the cache before
+    build_batch_request, which may pay for condensing long transcripts
+    """
+    if model not in MODEL_CONFIG:
+        raise ValueError(f"Unknown model: {model}")
+
+    provider, api_model = MODEL_CONFIG[model]
+    if provider != "anthropic":
+        raise ValueError("Deferred generation is only available for Claude models")
+
+    sermons, sizes = await clean_sermons(sermons)
+    cleanup_report(sermons, sizes)
+    return sermons, guide_cache_key(sermons, series_title, target_audience, api_model, "single")
+
+
+async def build_batch_request(sermons: list, series_title: str, target_audience: str, model: str) -> dict:
+    """
+    Messages API params for generating a guide through the Message Batches API
+    from sermons cleaned by prepare_batch_sermons
+    Uses the single prompt (long transcripts are condensed first, interactively)
+    """
+    provider, api_model = MODEL_CONFIG[model]
+
+    budget = transcript_budget(
+        build_generation_prompt([], series_title, target_audience), api_model, 16000, len(sermons)
+    )
+    fitted, condensed = await fit_sermons_to_budget(sermons, list(range(len(sermons))), budget, provider)
+    if condensed:
+        logger.info(f"Condensed sessions {[idx + 1 for idx in condensed]} of '{series_title}' for batch submission")
+
+    prompt = build_generation_prompt(fitted, series_title, target_audience)
+    return {
+        "model": api_model,
+        "max_tokens": output_allowance(prompt, api_model, 16000),
+        "temperature": 1.0,
+        **anthropic_messages(prompt)
+    }
 
-Error details: {str(last_error)}
-"""
-                return error_content
 
-    return ""
+def assemble_batch_guide(result: dict, series_title: str, target_audience: str, session_count: int) -> str:
+    """Study guide document from a succeeded batch result (see batches.AnthropicBatchClient)"""
+    note = None
+    if result.get("stop_reason") == "max_tokens":
+        note = "PARTIAL - the guide reached the output token limit"
+    return build_header(series_title, target_audience, session_count, note) + result["text"]
@@ -0,0 +1,267 @@
+import os
+import json
+import uuid
+import asyncio
+import sqlite3
+import logging
+import threading
+from datetime import datetime
+from app.cache import DATA_DIR
+
+logger = logging.getLogger(__name__)
+
+# Job database, in the local state directory
+JOBS_DB_PATH = os.getenv("JOBS_DB_PATH", os.path.join(DATA_DIR, "jobs.db"))
+
+# Concurrency caps for background generation
+JOB_MAX_WORKERS = int(os.getenv("JOB_MAX_WORKERS", 4))
+JOB_PER_USER_LIMIT = int(os.getenv("JOB_PER_USER_LIMIT", 2))
+
+# Job statuses
+QUEUED = "queued"
+RUNNING = "running"
+DEFERRED = "deferred"
+COMPLETED = "completed"
+FAILED = "failed"
+
+
+class JobStore:
+    """SQLite-backed job state so status and results survive reconnects"""
+
+    def __init__(self, path: str = JOBS_DB_PATH):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    user_email TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    params TEXT NOT NULL,
+                    progress TEXT,
+                    result TEXT,
+                    error TEXT,
+                    created_at TEXT NOT NULL,
+                    started_at TEXT,
+                    finished_at TEXT
+                )
+            """)
+
+    def create(self, user_email: str, params: dict) -> str:
+        """Insert a new queued job and return its ID"""
+        job_id = uuid.uuid4().hex
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO jobs (id, user_email, status, params, created_at) VALUES (?, ?, ?, ?, ?)",
+                (job_id, user_email, QUEUED, json.dumps(params), datetime.utcnow().isoformat())
+            )
+        return job_id
+
+    def get(self, job_id: str) -> dict:
+        """Get a job as a dict, or None if it does not exist"""
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+
+        job = dict(row)
+        for field in ("params", "progress", "result"):
+            job[field] = json.loads(job[field]) if job[field] else None
+        return job
+
+    def list_for_user(self, user_email: str, limit: int = 20) -> list:
+        """A user's most recent jobs, newest first"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id FROM jobs WHERE user_email = ? ORDER BY created_at DESC LIMIT ?",
+                (user_email, limit)
+            ).fetchall()
+        return [self.get(row["id"]) for row in rows]
+
+    def update(self, job_id: str, **fields):
+        """Update columns of a job (dict values are stored as JSON)"""
+        if not fields:
+            return
+        values = [json.dumps(v) if isinstance(v, dict) else v for v in fields.values()]
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        with self._lock, self._conn:
+            self._conn.execute(f"UPDATE jobs SET {assignments} WHERE id = ?", (*values, job_id))
+
+    def mark_interrupted(self) -> int:
+        """Fail jobs left queued or running by a previous process"""
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET status = ?, error = ?, finished_at = ? WHERE status IN (?, ?)",
+                (FAILED, "Interrupted by a server restart. Please generate again.",
+                 datetime.utcnow().isoformat(), QUEUED, RUNNING)
+            )
+        return cursor.rowcount
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class JobQueue:
+    """
+    Bounded worker pool for background jobs
+    Runs at most max_workers jobs at once and at most per_user_limit per user,
+    starting queued jobs in FIFO order as capacity frees up
+    A runner returning None has handed its job off (e.g. to the batch poller,
+    as a deferred job); whoever took it over sets the final status
+    Jobs submitted with a dedup key are single-flight: while one is queued,
+    running or handed off, identical submissions attach to it instead of
+    starting another (whoever took a job over calls release_dedup when it ends)
+    """
+
+    def __init__(self, store: JobStore, runner, max_workers: int = JOB_MAX_WORKERS,
+                 per_user_limit: int = JOB_PER_USER_LIMIT):
+        self.store = store
+        self._runner = runner
+        self._max_workers = max(1, max_workers)
+        self._per_user_limit = max(1, per_user_limit)
+        self._pending = []
+        self._running = {}
+        self._active = 0
+        self._payloads = {}
+        self._subscribers = {}
+        self._inflight = {}
+        self._dedup_keys = {}
+        self._tasks = set()
+        self._cond = asyncio.Condition()
+        self._dispatcher = None
+
+    def start(self):
+        interrupted = self.store.mark_interrupted()
+        if interrupted:
+            logger.warning(f"Marked {interrupted} interrupted job(s) as failed")
+        self._dispatcher = asyncio.create_task(self._dispatch())
+
+    async def stop(self):
+        tasks = list(self._tasks)
+        if self._dispatcher:
+            tasks.append(self._dispatcher)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def inflight(self, dedup_key: str) -> str:
+        """ID of the queued, running or handed-off job submitted with dedup_key, or None"""
+        return self._inflight.get(dedup_key)
+
+    async def submit(self, user_email: str, params: dict, payload: dict = None, dedup_key: str = None) -> str:
+        """
+        Queue a job and return its ID
+        params are persisted; payload holds in-memory extras (e.g. credentials)
+        If an identical job (same dedup_key) is in flight, its ID is returned instead
+        """
+        if dedup_key is not None:
+            existing = self._inflight.get(dedup_key)
+            if existing is not None:
+                return existing
+
+        job_id = self.store.create(user_email, params)
+        self._payloads[job_id] = payload or {}
+        if dedup_key is not None:
+            self._inflight[dedup_key] = job_id
+            self._dedup_keys[job_id] = dedup_key
+        async with self._cond:
+            self._pending.append((job_id, user_email))
+            self._cond.notify_all()
+        return job_id
+
+    def release_dedup(self, job_id: str):
+        """Let identical submissions start a new job again (the job has ended)"""
+        dedup_key = self._dedup_keys.pop(job_id, None)
+        if self._inflight.get(dedup_key) == job_id:
+            del self._inflight[dedup_key]
+
+    def subscribe(self, job_id: str) -> asyncio.Queue:
+        """Receive (event, data) tuples published by a running job"""
+        queue = asyncio.Queue()
+        self._subscribers.setdefault(job_id, set()).add(queue)
+        return queue
+
+    def unsubscribe(self, job_id: str, queue: asyncio.Queue):
+        subscribers = self._subscribers.get(job_id)
+        if subscribers:
+            subscribers.discard(queue)
+            if not subscribers:
+                del self._subscribers[job_id]
+
+    def publish(self, job_id: str, event: str, data: dict):
+        for queue in self._subscribers.get(job_id, ()):
+            queue.put_nowait((event, data))
+
+    def _next_runnable(self):
+        if self._active >= self._max_workers:
+            return None
+        for index, (job_id, user_email) in enumerate(self._pending):
+            if self._running.get(user_email, 0) < self._per_user_limit:
+                return index
+        return None
+
+    async def _dispatch(self):
+        while True:
+            async with self._cond:
+                await self._cond.wait_for(lambda: self._next_runnable() is not None)
+                job_id, user_email = self._pending.pop(self._next_runnable())
+                self._active += 1
+                self._running[user_email] = self._running.get(user_email, 0) + 1
+
+            task = asyncio.create_task(self._run(job_id, user_email))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, job_id: str, user_email: str):
+        handed_off = False
+        try:
+            self.store.update(job_id, status=RUNNING, started_at=datetime.utcnow().isoformat())
+            job = self.store.get(job_id)
+            result = await self._runner(job_id, job["params"], self._payloads.get(job_id, {}))
+            if result is None:
+                handed_off = True
+                return
+            self.store.update(
+                job_id, status=COMPLETED, result=result, finished_at=datetime.utcnow().isoformat()
+            )
+            self.publish(job_id, "complete", {"success": True, **result})
+        except asyncio.CancelledError:
+            self.store.update(job_id, status=FAILED, error="Cancelled", finished_at=datetime.utcnow().isoformat())
+            raise
+        except Exception as e:
+            logger.error(f"Job {job_id} failed: {str(e)}", exc_info=True)
+            detail = getattr(e, "detail", None) or str(e)
+            self.store.update(job_id, status=FAILED, error=detail, finished_at=datetime.utcnow().isoformat())
+            self.publish(job_id, "error", {"detail": detail})
+        finally:
+            self._payloads.pop(job_id, None)
+            if not handed_off:
+                self.release_dedup(job_id)
+            async with self._cond:
+                self._active -= 1
+                self._running[user_email] -= 1
+                if not self._running[user_email]:
+                    del self._running[user_email]
+                self._cond.notify_all()
+
+
+def job_status(job: dict) -> dict:
+    """Public view of a job (without the generated content)"""
+    return {
+        "job_id": job["id"],
+        "status": job["status"],
+        "series_title": job["params"].get("series_title"),
+        "deferred": bool(job["params"].get("deferred")),
+        "progress": job["progress"],
+        "error": job["error"],
+        "file_url": (job["result"] or {}).get("file_url"),
+        "filename": (job["result"] or {}).get("filename"),
+        "created_at": job["created_at"],
+        "started_at": job["started_at"],
+        "finished_at": job["finished_at"]
+    }
@@ -1,20 +1,44 @@
 import os
+import json
+import time
+import asyncio
 import logging
-from fastapi import FastAPI, Request, Form, HTTPException, Depends
-from fastapi.responses import HTMLResponse, RedirectResponse, JSONResponse
-from fastapi.staticfiles import StaticFiles
+from datetime import datetime
+from fastapi import FastAPI, Request, Form, HTTPException, Depends, Query
+from fastapi.responses import HTMLResponse, RedirectResponse, JSONResponse, StreamingResponse, Response
 from fastapi.templating import Jinja2Templates
-from starlette.middleware.sessions import SessionMiddleware
 from dotenv import load_dotenv
 import secrets
+from contextlib import asynccontextmanager
 
-from app.auth import get_current_user, oauth_login, oauth_callback, logout
-from app.drive import get_drive_service, read_file_from_drive, save_to_drive
-from app.generator import generate_study_guide
-
-# Load environment variables
+# Load environment variables (before the app modules read their settings)
 load_dotenv()
 
+from app import startup
+
+# Record per-module import times for the startup report (later imports are cached)
+startup.timed_imports("app.auth", "app.drive", "app.generator", "app.jobs", "app.batches", "app.sessions")
+
+from app.auth import (
+    get_current_user, get_credentials, oauth_login, oauth_callback, logout,
+    credentials_to_session, credentials_from_session
+)
+from app.drive import (
+    get_drive_service, build_drive_service, fetch_transcripts, check_transcript_lengths, save_to_drive,
+    list_text_files, create_transcript_sync, ResumableUpload, LIST_PAGE_SIZE, DRIVE_EARLY_UPLOAD
+)
+from app.generator import (
+    stream_study_guide, generation_labels, prepare_batch_sermons, build_batch_request, assemble_batch_guide,
+    record_usage, guide_cache, metric_labels, MODEL_CONFIG, BATCH_PRICE_FACTOR
+)
+from app.providers import start_clients, close_clients
+from app.cache import content_hash
+from app.metrics import registry, STAGE_SECONDS, GENERATIONS, CONTENT_TYPE
+from app.sessions import ServerSessionMiddleware, create_session_store, SESSION_MAX_AGE
+from app.jobs import JobQueue, JobStore, job_status, DEFERRED, COMPLETED, FAILED
+from app.batches import BatchPoller, BatchStore, SUCCEEDED
+from app.assets import build_assets, StaticAssets, CompressionMiddleware, STATIC_BUILD_DIR
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -22,15 +46,52 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-app = FastAPI(title="Bible Study Generator")
 
-# Add session middleware
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Start the job workers, then warm up the heavy SDKs and provider connection
+    pools in the background so the server starts listening right away
+    """
+    job_queue.start()
+    batch_poller.start()
+    if transcript_sync:
+        transcript_sync.start()
+    startup.mark("app_ready")
+    warmup = asyncio.create_task(startup.warm_up(start_clients))
+    yield
+    warmup.cancel()
+    if transcript_sync:
+        await transcript_sync.stop()
+    await batch_poller.stop()
+    await job_queue.stop()
+    await close_clients()
+
+
+app = FastAPI(title="Bible Study Generator", lifespan=lifespan)
+
+# Add session middleware (session data stays server-side; the cookie holds a signed ID)
 SESSION_SECRET = os.getenv("SESSION_SECRET_KEY", secrets.token_urlsafe(32))
-app.add_middleware(SessionMiddleware, secret_key=SESSION_SECRET, max_age=604800)  # 7 days
+session_store = create_session_store()
+app.add_middleware(
+    ServerSessionMiddleware,
+    store=session_store,
+    secret_key=SESSION_SECRET,
+    max_age=SESSION_MAX_AGE
+)
+
+# Gzip JSON and HTML responses (static files are precompressed, streams pass through)
+app.add_middleware(CompressionMiddleware)
 
-# Mount static files and templates
-app.mount("/static", StaticFiles(directory="static"), name="static")
+# Record time to first request (added last, so it runs first)
+app.add_middleware(startup.FirstRequestTimer)
+
+# Mount static files (fingerprinted, precompressed copies) and templates;
+# templates link assets with static_url so each deploy's files get new URLs
+static_manifest = build_assets()
+app.mount("/static", StaticAssets(STATIC_BUILD_DIR, static_manifest), name="static")
 templates = Jinja2Templates(directory="app/templates")
+templates.env.globals["static_url"] = lambda path: f"/static/{static_manifest.get(path, path)}"
 
 
 @app.get("/", response_class=HTMLResponse)
@@ -95,19 +156,29 @@ async def get_access_token(request: Request, user: dict = Depends(get_current_us
 
 
 @app.get("/api/list-files")
-async def list_files(request: Request, user: dict = Depends(get_current_user)):
-    """List all .txt files from user's Google Drive"""
+async def list_files(
+    request: Request,
+    page_token: str = None,
+    page_size: int = Query(LIST_PAGE_SIZE, ge=1, le=1000),
+    user: dict = Depends(get_current_user)
+):
+    """
+    List .txt files from user's Google Drive, one page at a time
+    Pass next_page_token back as page_token to get the following page
+    """
     if not user:
         raise HTTPException(status_code=401, detail="Not authenticated")
 
     try:
-        from app.drive import list_text_files
         drive_service = get_drive_service(request)
-        files = list_text_files(drive_service)
+        files, next_page_token = await asyncio.to_thread(
+            list_text_files, drive_service, page_token, page_size, user.get("email")
+        )
 
         return JSONResponse({
             "success": True,
-            "files": files
+            "files": files,
+            "next_page_token": next_page_token
         })
 
     except Exception as e:
@@ -115,94 +186,531 @@ async def list_files(request: Request, user: dict = Depends(get_current_user)):
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@app.post("/api/generate")
-async def generate_guide(
-    request: Request,
-    series_title: str = Form(...),
-    target_audience: str = Form(...),
-    model: str = Form(...),
-    file_ids: str = Form(...),
-    user: dict = Depends(get_current_user)
-):
-    """Generate Bible study guide from selected Drive files"""
-    if not user:
-        raise HTTPException(status_code=401, detail="Not authenticated")
+def parse_file_ids(file_ids: str) -> list:
+    """Parse and validate comma-separated Drive file IDs"""
+    file_id_list = [fid.strip() for fid in file_ids.split(",") if fid.strip()]
+
+    if not file_id_list:
+        raise HTTPException(status_code=400, detail="No files selected")
+
+    if len(file_id_list) > 8:
+        raise HTTPException(status_code=400, detail="Maximum 8 sermon files allowed")
+
+    return file_id_list
 
+
+async def read_sermons(drive_service, file_id_list: list) -> tuple:
+    """
+    Read sermon transcripts from Drive concurrently and validate their length
+    Returns (sermons, seconds)
+    """
     try:
-        # Parse file IDs (comma-separated)
-        file_id_list = [fid.strip() for fid in file_ids.split(",") if fid.strip()]
+        transcripts, seconds = await asyncio.to_thread(fetch_transcripts, drive_service, file_id_list)
+        # Validate minimum word count (500 words minimum for quality content)
+        check_transcript_lengths(transcripts)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
-        if not file_id_list:
-            raise HTTPException(status_code=400, detail="No files selected")
+    sermons = [
+        {"filename": transcript["filename"], "content": transcript["content"]}
+        for transcript in transcripts
+    ]
 
-        if len(file_id_list) > 8:
-            raise HTTPException(status_code=400, detail="Maximum 8 sermon files allowed")
+    return sermons, seconds
 
-        # Get Drive service
-        drive_service = get_drive_service(request)
 
-        # Read sermon files from Drive (sorted alphabetically by filename)
-        sermons = []
-        for file_id in file_id_list:
-            file_metadata = drive_service.files().get(fileId=file_id, fields="name").execute()
-            file_content = read_file_from_drive(drive_service, file_id)
-
-            # Validate minimum word count (500 words minimum for quality content)
-            word_count = len(file_content.split())
-            if word_count < 500:
-                raise HTTPException(
-                    status_code=400,
-                    detail=f"File '{file_metadata['name']}' is too short ({word_count} words). Minimum 500 words required for quality study guides."
-                )
+def get_output_folder_id():
+    """Folder where study guides are saved, or None for the root of Drive"""
+    folder_id = os.getenv("STUDY_GUIDE_OUTPUT_FOLDER_ID")
+
+    # If folder_id not set, save to root of Drive
+    if not folder_id or folder_id == "None":
+        return None  # None means root folder in Drive API
+
+    return folder_id
+
+
+def sse_event(event: str, data: dict) -> str:
+    """Format a Server-Sent Event"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
 
-            sermons.append({
-                "filename": file_metadata["name"],
-                "content": file_content
-            })
+
+async def generation_events(
+    drive_service,
+    file_id_list: list,
+    series_title: str,
+    target_audience: str,
+    model: str,
+    use_cache: bool = True,
+    force_sessions: list = None
+):
+    """
+    Full generation pipeline: read sermons, generate, save to Drive
+    Yields (event, data) tuples for each stage, ending with a complete event
+    use_cache=False forces a fresh generation even if an identical guide is cached
+    force_sessions: session numbers to regenerate even if their inputs are unchanged
+    """
+    labels = generation_labels(model, target_audience)
+    pipeline_start = time.monotonic()
+    status = "completed"
+    filename = f"{series_title}_Study_Guide.md"
+    upload = None
+    opening = None
+
+    try:
+        # Read sermon files from Drive
+        yield "stage", {"stage": "drive_read", "status": "started", "files": len(file_id_list)}
+        sermons, seconds = await read_sermons(drive_service, file_id_list)
+        yield "stage", {"stage": "drive_read", "status": "completed", "files": len(sermons), "seconds": round(seconds, 3)}
+        STAGE_SECONDS.observe(seconds, stage="drive_read", **labels)
 
         # Sort alphabetically by filename (handles "## 01, 02..." pattern)
         sermons.sort(key=lambda x: x["filename"])
 
         logger.info(f"Starting study guide generation for '{series_title}' with {len(sermons)} sermons using {model}")
 
-        # Generate study guide
-        study_guide_content = await generate_study_guide(
-            sermons=sermons,
-            series_title=series_title,
-            target_audience=target_audience,
-            model=model
-        )
+        # Open the Drive upload now, so only the content is left to send at the end
+        if DRIVE_EARLY_UPLOAD:
+            upload = ResumableUpload(drive_service, filename, get_output_folder_id())
+            opening = asyncio.create_task(asyncio.to_thread(upload.open))
+
+        # Generate study guide, forwarding provider token streams
+        yield "stage", {"stage": "generation", "status": "started"}
+        generation_start = time.monotonic()
+        study_guide_content = ""
+        usage = {}
+        async for event, data in stream_study_guide(
+            sermons, series_title, target_audience, model,
+            use_cache=use_cache, force_sessions=force_sessions
+        ):
+            if event == "generation_completed":
+                study_guide_content = data["content"]
+                usage = data["usage"]
+                if data["cached"]:
+                    status = "cached"
+            else:
+                yield event, data
+        STAGE_SECONDS.observe(time.monotonic() - generation_start, stage="generation", **labels)
+        yield "stage", {"stage": "generation", "status": "completed"}
 
         logger.info(f"Study guide generation completed for '{series_title}'")
 
         # Save to Google Drive
-        filename = f"{series_title}_Study_Guide.md"
-        folder_id = os.getenv("STUDY_GUIDE_OUTPUT_FOLDER_ID")
-
-        # If folder_id not set, save to root of Drive
-        if not folder_id or folder_id == "None":
-            folder_id = None  # None means root folder in Drive API
-
-        file_url = save_to_drive(
-            drive_service=drive_service,
-            filename=filename,
-            content=study_guide_content,
-            folder_id=folder_id
-        )
+        yield "stage", {"stage": "upload", "status": "started"}
+        with STAGE_SECONDS.time(stage="upload", **labels):
+            file_url = None
+            if opening is not None and await opening:
+                try:
+                    file_url = await asyncio.to_thread(upload.finish, study_guide_content.encode("utf-8"))
+                except Exception as e:
+                    logger.warning(f"Early upload of '{filename}' failed, uploading again: {str(e)}")
+                    upload.abandon()
+            if file_url is None:
+                file_url = await asyncio.to_thread(
+                    save_to_drive,
+                    drive_service=drive_service,
+                    filename=filename,
+                    content=study_guide_content,
+                    folder_id=get_output_folder_id()
+                )
+        yield "stage", {"stage": "upload", "status": "completed"}
 
         logger.info(f"Study guide saved to Drive: {filename}")
 
-        return JSONResponse({
+        STAGE_SECONDS.observe(time.monotonic() - pipeline_start, stage="total", **labels)
+        GENERATIONS.inc(status=status, **labels)
+
+        yield "complete", {
             "success": True,
             "message": "Study guide generated successfully!",
             "file_url": file_url,
-            "filename": filename
-        })
+            "filename": filename,
+            "content": study_guide_content,
+            "usage": usage
+        }
+    except Exception:
+        GENERATIONS.inc(status="failed", **labels)
+        raise
+    finally:
+        # An upload session left unfinished expires without creating a file.
+        # Cancelling would not stop the thread claiming its name, so let the
+        # open finish, then release the name (a no-op once the upload finished)
+        if opening is not None:
+            await asyncio.gather(opening, return_exceptions=True)
+            upload.abandon()
+
+
+async def run_generation_job(job_id: str, params: dict, payload: dict) -> dict:
+    """Background job runner: runs the pipeline and records progress"""
+    if params.get("deferred"):
+        return await submit_deferred_job(job_id, params, payload)
+
+    drive_service = build_drive_service(payload["credentials"])
+    progress = {"stage": "queued", "sessions": len(params["file_ids"]), "sessions_completed": 0}
+
+    async for event, data in generation_events(
+        drive_service,
+        params["file_ids"],
+        params["series_title"],
+        params["target_audience"],
+        params["model"],
+        params.get("use_cache", True),
+        params.get("force_sessions")
+    ):
+        if event == "complete":
+            return {
+                "file_url": data["file_url"],
+                "filename": data["filename"],
+                "content": data["content"],
+                "usage": data["usage"]
+            }
+
+        job_queue.publish(job_id, event, data)
+
+        # Persist coarse progress (token deltas are only forwarded live)
+        if event == "stage" and data["status"] == "started":
+            progress["stage"] = data["stage"]
+        elif event == "session_completed" and data["session"]:
+            progress["sessions_completed"] += 1
+        else:
+            continue
+        job_queue.store.update(job_id, progress=progress)
+
+    raise Exception("Generation finished without a result")
+
+
+async def submit_deferred_job(job_id: str, params: dict, payload: dict):
+    """
+    Read the sermons and submit the guide's prompt as a Message Batch
+    Returns None (the job is handed off to the batch poller), or the result
+    right away if an identical guide is already cached
+    """
+    drive_service = build_drive_service(payload["credentials"])
+    series_title = params["series_title"]
+    target_audience = params["target_audience"]
+    filename = f"{series_title}_Study_Guide.md"
+
+    job_queue.store.update(job_id, progress={"stage": "drive_read", "sessions": len(params["file_ids"])})
+    job_queue.publish(job_id, "stage", {"stage": "drive_read", "status": "started", "files": len(params["file_ids"])})
+    sermons, _ = await read_sermons(drive_service, params["file_ids"])
+    sermons.sort(key=lambda x: x["filename"])
+
+    metric_labels.set(generation_labels(params["model"], target_audience))
+    sermons, cache_key = await prepare_batch_sermons(sermons, series_title, target_audience, params["model"])
+
+    cached = None
+    if params.get("use_cache", True):
+        cached = await asyncio.to_thread(guide_cache.get, cache_key)
+    if cached is not None:
+        logger.info(f"Using cached study guide for deferred job {job_id}")
+        file_url = await asyncio.to_thread(
+            save_to_drive, drive_service=drive_service, filename=filename,
+            content=cached, folder_id=get_output_folder_id()
+        )
+        return {"file_url": file_url, "filename": filename, "content": cached, "usage": {}}
+
+    batch_params = await build_batch_request(sermons, series_title, target_audience, params["model"])
+
+    # Mark the job deferred before submitting, so a fast batch can't be finished first
+    progress = {"stage": "batch", "sessions": len(sermons)}
+    job_queue.store.update(job_id, status=DEFERRED, progress=progress)
+    batch_id = await batch_poller.submit(
+        job_id,
+        batch_params,
+        details={
+            "series_title": series_title,
+            "target_audience": target_audience,
+            "model": params["model"],
+            "sessions": len(sermons),
+            "filename": filename,
+            "folder_id": get_output_folder_id(),
+            "cache_key": cache_key
+        },
+        credentials=credentials_to_session(payload["credentials"])
+    )
+    job_queue.store.update(job_id, progress={**progress, "batch_id": batch_id})
+    job_queue.publish(job_id, "status", job_status(job_queue.store.get(job_id)))
+    return None
+
 
+async def finish_deferred_job(record: dict, result: dict):
+    """Batch poller callback: save a finished batch result to Drive and complete its job"""
+    job_id = record["job_id"]
+    try:
+        await save_deferred_result(record, result)
+    finally:
+        # The job is no longer in flight; identical submissions start a new one
+        job_queue.release_dedup(job_id)
+
+
+async def save_deferred_result(record: dict, result: dict):
+    """Save a finished batch result to Drive and set its job's final status"""
+    job_id = record["job_id"]
+    details = record["details"]
+    labels = generation_labels(details["model"], details["target_audience"])
+
+    try:
+        if result is None or result["status"] != SUCCEEDED:
+            raise Exception((result or {}).get("error") or "Batch returned no result")
+
+        metric_labels.set(labels)
+        api_model = MODEL_CONFIG[details["model"]][1]
+        record_usage(api_model, result["usage"], price_factor=BATCH_PRICE_FACTOR)
+        content = assemble_batch_guide(
+            result, details["series_title"], details["target_audience"], details["sessions"]
+        )
+        if result.get("stop_reason") != "max_tokens":
+            await asyncio.to_thread(guide_cache.set, details["cache_key"], content)
+
+        drive_service = build_drive_service(credentials_from_session(record["credentials"]))
+        with STAGE_SECONDS.time(stage="upload", **labels):
+            file_url = await asyncio.to_thread(
+                save_to_drive, drive_service=drive_service, filename=details["filename"],
+                content=content, folder_id=details["folder_id"]
+            )
     except Exception as e:
-        # Log error for debugging
-        logger.error(f"Error generating study guide: {str(e)}", exc_info=True)
-        raise HTTPException(status_code=500, detail=str(e))
+        logger.error(f"Deferred job {job_id} failed: {str(e)}")
+        GENERATIONS.inc(status="failed", **labels)
+        job_queue.store.update(job_id, status=FAILED, error=str(e), finished_at=datetime.utcnow().isoformat())
+        job_queue.publish(job_id, "error", {"detail": str(e)})
+        return
+
+    GENERATIONS.inc(status="completed", **labels)
+    job_result = {
+        "file_url": file_url,
+        "filename": details["filename"],
+        "content": content,
+        "usage": {api_model: result["usage"]}
+    }
+    job_queue.store.update(job_id, status=COMPLETED, result=job_result, finished_at=datetime.utcnow().isoformat())
+    job_queue.publish(job_id, "complete", {"success": True, **job_result})
+    logger.info(f"Deferred study guide saved to Drive: {details['filename']}")
+
+
+job_queue = JobQueue(JobStore(), run_generation_job)
+batch_poller = BatchPoller(BatchStore(), finish_deferred_job)
+transcript_sync = create_transcript_sync()
+
+
+async def submit_generation(request: Request, user: dict, params: dict) -> tuple:
+    """
+    Queue a generation job, or attach to an identical one already in flight
+    (same user, files, options and model) so a double submit is not paid twice
+    Returns (job_id, deduplicated)
+    """
+    dedup_key = content_hash("generation", user.get("email"), params)
+    job_id = job_queue.inflight(dedup_key)
+    if job_id is not None:
+        return job_id, True
+
+    payload = {"credentials": get_credentials(request)}
+    job_id = await job_queue.submit(user.get("email"), params, payload=payload, dedup_key=dedup_key)
+    return job_id, False
+
+
+def job_accepted(job_id: str, deduplicated: bool) -> JSONResponse:
+    """202 response pointing at a queued (or already running) job"""
+    return JSONResponse({
+        "success": True,
+        "job_id": job_id,
+        "status": job_queue.store.get(job_id)["status"],
+        "deduplicated": deduplicated,
+        "status_url": f"/api/jobs/{job_id}",
+        "events_url": f"/api/jobs/{job_id}/events"
+    }, status_code=202)
+
+
+def get_user_job(job_id: str, user: dict) -> dict:
+    """Load a job owned by the current user"""
+    if not user:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+
+    job = job_queue.store.get(job_id)
+    if not job or job["user_email"] != user.get("email"):
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    return job
+
+
+@app.post("/api/generate")
+async def generate_guide(
+    request: Request,
+    series_title: str = Form(...),
+    target_audience: str = Form(...),
+    model: str = Form(...),
+    file_ids: str = Form(...),
+    force_regenerate: bool = Form(False),
+    deferred: bool = Form(False),
+    user: dict = Depends(get_current_user)
+):
+    """
+    Queue Bible study guide generation from selected Drive files; returns a job ID
+    deferred=true submits the guide through the Message Batches API (half price,
+    finished within 24 hours) and saves it to Drive when the batch ends
+    """
+    if not user:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+
+    # Parse file IDs (comma-separated)
+    file_id_list = parse_file_ids(file_ids)
+
+    params = {
+        "series_title": series_title,
+        "target_audience": target_audience,
+        "model": model,
+        "file_ids": file_id_list,
+        "use_cache": not force_regenerate
+    }
+    if deferred:
+        if MODEL_CONFIG.get(model, ("",))[0] != "anthropic":
+            raise HTTPException(status_code=400, detail="Deferred generation is only available for Claude models")
+        params["deferred"] = True
+    job_id, deduplicated = await submit_generation(request, user, params)
+
+    if deduplicated:
+        logger.info(f"Attached duplicate request for '{series_title}' to in-flight job {job_id}")
+    else:
+        logger.info(f"Queued study guide job {job_id} for '{series_title}'")
+
+    return job_accepted(job_id, deduplicated)
+
+
+@app.post("/api/jobs/{job_id}/regenerate")
+async def regenerate_job_sessions(
+    request: Request,
+    job_id: str,
+    sessions: str = Form(""),
+    user: dict = Depends(get_current_user)
+):
+    """
+    Rebuild a job's guide as a new job, re-reading its sermons from Drive
+    Sessions whose sermon or options are unchanged are reused from the cache;
+    sessions (comma-separated numbers) are regenerated regardless
+    """
+    job = get_user_job(job_id, user)
+
+    try:
+        force_sessions = sorted({int(n) for n in sessions.split(",") if n.strip()})
+    except ValueError:
+        raise HTTPException(status_code=400, detail="sessions must be comma-separated session numbers")
+
+    session_count = len(job["params"]["file_ids"])
+    if any(n < 1 or n > session_count for n in force_sessions):
+        raise HTTPException(status_code=400, detail=f"Session numbers must be between 1 and {session_count}")
+
+    # Session-level regeneration always runs interactively
+    params = {**job["params"], "use_cache": True, "force_sessions": force_sessions}
+    params.pop("deferred", None)
+    new_job_id, deduplicated = await submit_generation(request, user, params)
+
+    logger.info(
+        f"{'Attached to' if deduplicated else 'Queued'} regeneration job {new_job_id} "
+        f"of {job_id} (sessions {force_sessions or 'changed only'})"
+    )
+
+    return job_accepted(new_job_id, deduplicated)
+
+
+@app.get("/api/jobs")
+async def list_jobs(user: dict = Depends(get_current_user)):
+    """The current user's recent generation jobs, newest first"""
+    if not user:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+
+    return JSONResponse({"jobs": [job_status(job) for job in job_queue.store.list_for_user(user.get("email"))]})
+
+
+@app.get("/api/jobs/{job_id}")
+async def get_job(job_id: str, user: dict = Depends(get_current_user)):
+    """Status of a background generation job"""
+    return JSONResponse(job_status(get_user_job(job_id, user)))
+
+
+@app.get("/api/jobs/{job_id}/result")
+async def get_job_result(job_id: str, user: dict = Depends(get_current_user)):
+    """Generated study guide for a completed job"""
+    job = get_user_job(job_id, user)
+
+    if job["status"] == FAILED:
+        raise HTTPException(status_code=500, detail=job["error"])
+    if job["status"] != COMPLETED:
+        raise HTTPException(status_code=409, detail=f"Job is {job['status']}")
+
+    return JSONResponse({"success": True, "job_id": job_id, **job["result"]})
+
+
+def job_events_response(job_id: str) -> StreamingResponse:
+    """Stream a job's progress as Server-Sent Events until it completes or fails"""
+
+    async def event_stream():
+        queue = job_queue.subscribe(job_id)
+        try:
+            # Subscribe before reading state so no terminal event is missed
+            job = job_queue.store.get(job_id)
+            yield sse_event("status", job_status(job))
+
+            if job["status"] == COMPLETED:
+                yield sse_event("complete", {"success": True, **job["result"]})
+                return
+            if job["status"] == FAILED:
+                yield sse_event("error", {"detail": job["error"]})
+                return
+
+            while True:
+                try:
+                    event, data = await asyncio.wait_for(queue.get(), timeout=15)
+                except asyncio.TimeoutError:
+                    # Keep proxies from closing an idle connection
+                    yield ": keepalive\n\n"
+                    continue
+                yield sse_event(event, data)
+                if event in ("complete", "error"):
+                    return
+        finally:
+            job_queue.unsubscribe(job_id, queue)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@app.get("/api/jobs/{job_id}/events")
+async def get_job_events(job_id: str, user: dict = Depends(get_current_user)):
+    """Live progress of a job as Server-Sent Events (safe to reconnect)"""
+    get_user_job(job_id, user)
+    return job_events_response(job_id)
+
+
+@app.post("/api/generate/stream")
+async def generate_guide_stream(
+    request: Request,
+    series_title: str = Form(...),
+    target_audience: str = Form(...),
+    model: str = Form(...),
+    file_ids: str = Form(...),
+    force_regenerate: bool = Form(False),
+    user: dict = Depends(get_current_user)
+):
+    """
+    Queue Bible study guide generation and stream the job's events
+    (same as POST /api/generate followed by GET /api/jobs/{id}/events)
+    """
+    if not user:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+
+    params = {
+        "series_title": series_title,
+        "target_audience": target_audience,
+        "model": model,
+        "file_ids": parse_file_ids(file_ids),
+        "use_cache": not force_regenerate
+    }
+    job_id, deduplicated = await submit_generation(request, user, params)
+    logger.info(f"{'Attached to' if deduplicated else 'Queued'} study guide job {job_id} for '{series_title}' (streamed)")
+
+    return job_events_response(job_id)
 
 
 @app.get("/health")
@@ -211,6 +719,18 @@ async def health_check():
     return {"status": "healthy"}
 
 
+@app.get("/metrics")
+async def metrics():
+    """Prometheus metrics: stage latencies, time to first token, tokens and cost"""
+    return Response(registry.render(), media_type=CONTENT_TYPE)
+
+
+@app.get("/health/startup")
+async def startup_timing():
+    """Cold-start timing: import time per module, time to ready, warmup and first request"""
+    return startup.startup_report()
+
+
 if __name__ == "__main__":
     import uvicorn
     port = int(os.getenv("PORT", 8080))
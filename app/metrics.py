@@ -0,0 +1,168 @@
+import time
+import threading
+import contextvars
+from contextlib import contextmanager
+
+# Latency buckets (seconds) from sub-second Drive calls up to 10 minute generations
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+# Labels (model, audience) for metrics recorded deep inside a generation,
+# set once per generation like generator.current_usage
+metric_labels = contextvars.ContextVar("metric_labels", default=None)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _format_labels(names: tuple, values: tuple, extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Counter:
+    """Monotonic counter with labels, rendered in Prometheus text format"""
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._values = {}
+        self._lock = threading.Lock()
+        registry.register(self)
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = tuple(labels.get(name, "") for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_number(value)}")
+        return lines
+
+
+class Histogram:
+    """Cumulative-bucket histogram with labels, rendered in Prometheus text format"""
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        self._values = {}
+        self._lock = threading.Lock()
+        registry.register(self)
+
+    def observe(self, value: float, **labels):
+        key = tuple(labels.get(name, "") for name in self.labelnames)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * len(self.buckets), 0.0))
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[index] += 1
+            self._values[key] = (counts, total + value)
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the duration of a with block (also when it raises)"""
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.observe(time.monotonic() - start, **labels)
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, (counts, total) in sorted(self._values.items()):
+                for bound, count in zip(self.buckets, counts):
+                    labels = _format_labels(self.labelnames, key, f'le="{_format_number(bound)}"')
+                    lines.append(f"{self.name}_bucket{labels} {count}")
+                labels = _format_labels(self.labelnames, key)
+                lines.append(f"{self.name}_sum{labels} {_format_number(total)}")
+                lines.append(f"{self.name}_count{labels} {counts[-1]}")
+        return lines
+
+
+class Registry:
+    """All metrics of the process, rendered together for /metrics"""
+
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+# Content type of the Prometheus text exposition format
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+STAGE_SECONDS = Histogram(
+    "bsgen_stage_duration_seconds",
+    "Duration of generation pipeline stages",
+    ("stage", "model", "audience")
+)
+FIRST_TOKEN_SECONDS = Histogram(
+    "bsgen_time_to_first_token_seconds",
+    "Time from sending a streamed provider request to its first token",
+    ("model", "audience")
+)
+DRIVE_SECONDS = Histogram(
+    "bsgen_drive_request_duration_seconds",
+    "Duration of Google Drive operations",
+    ("operation",)
+)
+TRANSCRIPT_READS = Counter(
+    "bsgen_transcript_reads_total",
+    "Transcript reads by source (cache hit, Drive download, background prefetch)",
+    ("result",)
+)
+CLEANUP_SAVED = Counter(
+    "bsgen_transcript_cleanup_saved_total",
+    "Transcript bytes and estimated tokens removed by cleanup before prompting",
+    ("unit",)
+)
+GENERATIONS = Counter(
+    "bsgen_generations_total",
+    "Study guide generations by outcome",
+    ("model", "audience", "status")
+)
+TOKENS = Counter(
+    "bsgen_tokens_total",
+    "Provider tokens by generation model and usage type",
+    ("model", "audience", "type")
+)
+REPAIRS = Counter(
+    "bsgen_repairs_total",
+    "Targeted repairs of incomplete output (missing sections or sessions)",
+    ("model", "audience", "kind")
+)
+COST = Counter(
+    "bsgen_cost_usd_total",
+    "Estimated provider spend in US dollars",
+    ("model", "audience")
+)
+
+
+def current_labels() -> dict:
+    """model and audience labels of the generation in progress"""
+    return metric_labels.get() or {"model": "unknown", "audience": "unknown"}
@@ -0,0 +1,97 @@
+import os
+import json
+import logging
+from app.scheduler import provider_scheduler
+
+# The SDKs (and httpx) are imported on first use to keep cold starts fast
+
+logger = logging.getLogger(__name__)
+
+# Long generations can take up to 10 minutes
+PROVIDER_TIMEOUT = 600.0
+PROVIDER_CONNECT_TIMEOUT = 10.0
+
+# Process-wide clients, created at app startup and closed on shutdown
+_anthropic_client = None
+_openai_client = None
+
+
+def _rate_limit_hook(provider: str):
+    """httpx response hook feeding rate-limit headers to the provider scheduler"""
+    async def on_response(response):
+        try:
+            model = json.loads(response.request.content or b"{}").get("model")
+        except (ValueError, AttributeError):
+            model = None
+        provider_scheduler.observe_headers(provider, model, response.headers)
+    return on_response
+
+
+def _timeout():
+    import httpx
+    return httpx.Timeout(PROVIDER_TIMEOUT, connect=PROVIDER_CONNECT_TIMEOUT)
+
+
+def _build_http_client(provider: str):
+    """Create a pooled async HTTP client for a provider SDK"""
+    import httpx
+    max_connections = int(os.getenv("LLM_MAX_CONNECTIONS", 50))
+    limits = httpx.Limits(
+        max_connections=max_connections,
+        max_keepalive_connections=max_connections,
+        keepalive_expiry=60.0
+    )
+    return httpx.AsyncClient(
+        limits=limits,
+        timeout=_timeout(),
+        event_hooks={"response": [_rate_limit_hook(provider)]}
+    )
+
+
+def get_anthropic_client():
+    """Get the shared async Anthropic client, creating it on first use"""
+    global _anthropic_client
+    if _anthropic_client is None:
+        from anthropic import AsyncAnthropic
+        _anthropic_client = AsyncAnthropic(
+            api_key=os.getenv("ANTHROPIC_API_KEY"),
+            timeout=_timeout(),
+            max_retries=0,  # retries are handled by the provider scheduler
+            http_client=_build_http_client("anthropic")
+        )
+    return _anthropic_client
+
+
+def get_openai_client():
+    """Get the shared async OpenAI client, creating it on first use"""
+    global _openai_client
+    if _openai_client is None:
+        from openai import AsyncOpenAI
+        _openai_client = AsyncOpenAI(
+            api_key=os.getenv("OPENAI_API_KEY"),
+            timeout=_timeout(),
+            max_retries=0,  # retries are handled by the provider scheduler
+            http_client=_build_http_client("openai")
+        )
+    return _openai_client
+
+
+async def start_clients():
+    """Open provider connection pools (called at app startup)"""
+    if os.getenv("ANTHROPIC_API_KEY"):
+        get_anthropic_client()
+    if os.getenv("OPENAI_API_KEY"):
+        get_openai_client()
+    logger.info("LLM provider clients initialized")
+
+
+async def close_clients():
+    """Close provider connection pools (called at app shutdown)"""
+    global _anthropic_client, _openai_client
+    if _anthropic_client is not None:
+        await _anthropic_client.close()
+        _anthropic_client = None
+    if _openai_client is not None:
+        await _openai_client.close()
+        _openai_client = None
+    logger.info("LLM provider clients closed")
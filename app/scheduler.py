@@ -0,0 +1,245 @@
+import os
+import re
+import time
+import random
+import asyncio
+import logging
+from datetime import datetime
+from email.utils import parsedate_to_datetime
+
+logger = logging.getLogger(__name__)
+
+# Default account limits per provider (requests and tokens per minute),
+# replaced by the limits providers report in their rate-limit headers
+DEFAULT_LIMITS = {
+    "anthropic": (int(os.getenv("ANTHROPIC_RPM", 50)), int(os.getenv("ANTHROPIC_TPM", 40000))),
+    "openai": (int(os.getenv("OPENAI_RPM", 500)), int(os.getenv("OPENAI_TPM", 30000)))
+}
+
+# Retries of transient errors (429, overloaded, 5xx, connection errors)
+SCHEDULER_MAX_RETRIES = int(os.getenv("SCHEDULER_MAX_RETRIES", 5))
+BACKOFF_BASE = 1.0
+BACKOFF_MAX = 60.0
+
+# Durations in OpenAI reset headers, e.g. "1m30s" or "250ms"
+DURATION_PART = re.compile(r"([\d.]+)(ms|h|m|s)")
+DURATION_UNITS = {"ms": 0.001, "h": 3600, "m": 60, "s": 1}
+
+# Rate-limit response headers: provider -> (requests limit, requests remaining, requests reset,
+# tokens limit, tokens remaining, tokens reset)
+RATE_LIMIT_HEADERS = {
+    "anthropic": (
+        "anthropic-ratelimit-requests-limit",
+        "anthropic-ratelimit-requests-remaining",
+        "anthropic-ratelimit-requests-reset",
+        "anthropic-ratelimit-input-tokens-limit",
+        "anthropic-ratelimit-input-tokens-remaining",
+        "anthropic-ratelimit-input-tokens-reset"
+    ),
+    "openai": (
+        "x-ratelimit-limit-requests",
+        "x-ratelimit-remaining-requests",
+        "x-ratelimit-reset-requests",
+        "x-ratelimit-limit-tokens",
+        "x-ratelimit-remaining-tokens",
+        "x-ratelimit-reset-tokens"
+    )
+}
+
+
+def parse_reset(value: str):
+    """
+    Seconds until a rate-limit reset, from either an RFC 3339 timestamp
+    (Anthropic) or a duration such as "1m30s" / "250ms" (OpenAI)
+    """
+    if not value:
+        return None
+    try:
+        if "T" in value:
+            reset = datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp()
+            return max(0.0, reset - time.time())
+        parts = DURATION_PART.findall(value)
+        if not parts:
+            return None
+        return sum(float(number) * DURATION_UNITS[unit] for number, unit in parts)
+    except ValueError:
+        return None
+
+
+def retry_after_seconds(headers):
+    """Seconds from a Retry-After header (delta-seconds or HTTP date)"""
+    if headers is None:
+        return None
+    value = headers.get("retry-after-ms")
+    if value:
+        try:
+            return float(value) / 1000
+        except ValueError:
+            pass
+    value = headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        try:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
+
+
+def is_transient_error(error: Exception) -> bool:
+    """Rate limits, overload, server and connection errors are worth retrying"""
+    status = getattr(error, "status_code", None)
+    if status is not None:
+        return status in (408, 409, 429) or status >= 500
+    return type(error).__name__ in ("APIConnectionError", "APITimeoutError")
+
+
+def is_permanent_error(error: Exception) -> bool:
+    """Client errors (bad request, auth, not found) fail the same way on retry"""
+    error = error.__cause__ or error
+    status = getattr(error, "status_code", None)
+    return status is not None and not is_transient_error(error)
+
+
+class TokenBucket:
+    """Continuously refilling bucket sized to a per-minute limit"""
+
+    def __init__(self, per_minute: int):
+        self.capacity = float(per_minute)
+        self.tokens = float(per_minute)
+        self.updated = time.monotonic()
+
+    def set_limit(self, per_minute: int):
+        self._refill()
+        self.capacity = float(per_minute)
+        self.tokens = min(self.tokens, self.capacity)
+
+    def set_remaining(self, remaining: int):
+        self._refill()
+        self.tokens = min(self.tokens, float(remaining))
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.capacity / 60)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """Seconds until amount is available (amounts over capacity wait for a full bucket)"""
+        self._refill()
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) * 60 / self.capacity
+
+    def take(self, amount: float):
+        self._refill()
+        self.tokens -= min(amount, self.capacity)
+
+
+class ModelLimiter:
+    """Request and token buckets for one provider and model, admitted in FIFO order"""
+
+    def __init__(self, rpm: int, tpm: int):
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    async def admit(self, amount: int):
+        async with self._lock:
+            while True:
+                wait = max(
+                    self.paused_until - time.monotonic(),
+                    self.requests.wait_time(1),
+                    self.tokens.wait_time(amount)
+                )
+                if wait <= 0:
+                    self.requests.take(1)
+                    self.tokens.take(amount)
+                    return
+                await asyncio.sleep(wait)
+
+    def pause(self, seconds: float):
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+
+class ProviderScheduler:
+    """
+    Admits provider calls through per-model token buckets, learns limits
+    from rate-limit headers and retries transient errors with jittered
+    exponential backoff
+    """
+
+    def __init__(self, max_retries: int = SCHEDULER_MAX_RETRIES):
+        self.max_retries = max_retries
+        self._limiters = {}
+
+    def limiter(self, provider: str, model: str) -> ModelLimiter:
+        key = (provider, model)
+        if key not in self._limiters:
+            rpm, tpm = DEFAULT_LIMITS.get(provider, (60, 100000))
+            self._limiters[key] = ModelLimiter(rpm, tpm)
+        return self._limiters[key]
+
+    def observe_headers(self, provider: str, model: str, headers):
+        """Update a model's buckets from provider rate-limit response headers"""
+        names = RATE_LIMIT_HEADERS.get(provider)
+        if not names or not model:
+            return
+        req_limit, req_remaining, req_reset, tok_limit, tok_remaining, tok_reset = (
+            headers.get(name) for name in names
+        )
+        limiter = self.limiter(provider, model)
+        try:
+            if req_limit:
+                limiter.requests.set_limit(int(req_limit))
+            if req_remaining:
+                limiter.requests.set_remaining(int(req_remaining))
+                if int(req_remaining) == 0:
+                    limiter.pause(parse_reset(req_reset) or 1.0)
+            if tok_limit:
+                limiter.tokens.set_limit(int(tok_limit))
+            if tok_remaining:
+                limiter.tokens.set_remaining(int(tok_remaining))
+                if int(tok_remaining) == 0:
+                    limiter.pause(parse_reset(tok_reset) or 1.0)
+        except ValueError:
+            logger.debug(f"Ignoring malformed rate-limit headers from {provider}")
+
+    def backoff(self, attempt: int, retry_after: float = None) -> float:
+        """Full-jitter exponential backoff, never shorter than Retry-After"""
+        delay = random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        return delay
+
+    async def run(self, provider: str, model: str, tokens: int, call):
+        """
+        Run call() (a coroutine factory) once admitted, retrying transient errors
+        A rate-limit response pauses admission for every caller of that model
+        """
+        limiter = self.limiter(provider, model)
+        attempt = 0
+        while True:
+            await limiter.admit(tokens)
+            try:
+                return await call()
+            except Exception as e:
+                if not is_transient_error(e) or attempt >= self.max_retries:
+                    raise
+                response = getattr(e, "response", None)
+                retry_after = retry_after_seconds(response.headers if response is not None else None)
+                delay = self.backoff(attempt, retry_after)
+                if getattr(e, "status_code", None) == 429:
+                    limiter.pause(delay)
+                attempt += 1
+                logger.warning(
+                    f"Transient {provider} error for {model} ({type(e).__name__}), "
+                    f"retry {attempt}/{self.max_retries} in {delay:.1f}s"
+                )
+                await asyncio.sleep(delay)
+
+
+provider_scheduler = ProviderScheduler()
@@ -0,0 +1,186 @@
+import os
+import json
+import time
+import secrets
+import sqlite3
+import logging
+import threading
+from itsdangerous import Signer, BadSignature
+from starlette.datastructures import MutableHeaders
+from starlette.requests import HTTPConnection
+from app.cache import DATA_DIR
+
+logger = logging.getLogger(__name__)
+
+# Session backend: "memory" (single worker) or "sqlite" (shared by workers on one host)
+# Neither is shared between hosts, so several instances need session affinity
+SESSION_STORE = os.getenv("SESSION_STORE", "memory")
+SESSIONS_DB_PATH = os.getenv("SESSIONS_DB_PATH", os.path.join(DATA_DIR, "sessions.db"))
+
+# Sessions expire after a week without use
+SESSION_MAX_AGE = int(os.getenv("SESSION_MAX_AGE", 604800))
+
+# How often expired sessions are swept from the store
+SESSION_SWEEP_INTERVAL = 600
+
+
+class MemorySessionStore:
+    """In-process session store with TTL eviction"""
+
+    def __init__(self, ttl: int = SESSION_MAX_AGE):
+        self.ttl = ttl
+        self._entries = {}
+        self._lock = threading.Lock()
+        self._last_sweep = time.time()
+
+    def load(self, session_id: str):
+        """Session data and expiry time, or None if missing or expired"""
+        with self._lock:
+            entry = self._entries.get(session_id)
+            if entry is None:
+                return None
+            if entry[1] <= time.time():
+                del self._entries[session_id]
+                return None
+            return json.loads(entry[0]), entry[1]
+
+    def save(self, session_id: str, data: dict):
+        now = time.time()
+        with self._lock:
+            self._entries[session_id] = (json.dumps(data), now + self.ttl)
+            if now - self._last_sweep > SESSION_SWEEP_INTERVAL:
+                self._last_sweep = now
+                expired = [key for key, (_, expires) in self._entries.items() if expires <= now]
+                for key in expired:
+                    del self._entries[key]
+
+    def delete(self, session_id: str):
+        with self._lock:
+            self._entries.pop(session_id, None)
+
+
+class SQLiteSessionStore:
+    """SQLite session store, so workers on one host share sessions (and refreshed tokens)"""
+
+    def __init__(self, path: str = SESSIONS_DB_PATH, ttl: int = SESSION_MAX_AGE):
+        self.ttl = ttl
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=10)
+        self._lock = threading.Lock()
+        self._last_sweep = time.time()
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS sessions (
+                    id TEXT PRIMARY KEY,
+                    data TEXT NOT NULL,
+                    expires_at REAL NOT NULL
+                )
+            """)
+
+    def load(self, session_id: str):
+        """Session data and expiry time, or None if missing or expired"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT data, expires_at FROM sessions WHERE id = ? AND expires_at > ?",
+                (session_id, time.time())
+            ).fetchone()
+        if row is None:
+            return None
+        return json.loads(row[0]), row[1]
+
+    def save(self, session_id: str, data: dict):
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO sessions (id, data, expires_at) VALUES (?, ?, ?)",
+                (session_id, json.dumps(data), now + self.ttl)
+            )
+            if now - self._last_sweep > SESSION_SWEEP_INTERVAL:
+                self._last_sweep = now
+                self._conn.execute("DELETE FROM sessions WHERE expires_at <= ?", (now,))
+
+    def delete(self, session_id: str):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+
+
+def create_session_store(backend: str = SESSION_STORE):
+    """Session store for the configured backend"""
+    if backend == "memory":
+        return MemorySessionStore()
+    if backend == "sqlite":
+        return SQLiteSessionStore()
+    raise ValueError(f"Unknown session store: {backend}")
+
+
+class ServerSessionMiddleware:
+    """
+    Session middleware keeping session data server-side
+    The cookie only carries a signed, random session ID; request.session works
+    as with Starlette's SessionMiddleware. Data is written back only when it
+    changes (or when the session is past half its lifetime, to keep it alive).
+    """
+
+    def __init__(self, app, store, secret_key: str, session_cookie: str = "session",
+                 max_age: int = SESSION_MAX_AGE, https_only: bool = False,
+                 exclude_paths: tuple = ("/static/",)):
+        self.app = app
+        self.store = store
+        self.signer = Signer(secret_key)
+        self.session_cookie = session_cookie
+        self.max_age = max_age
+        self.exclude_paths = exclude_paths
+        self.security_flags = "httponly; samesite=lax" + ("; secure" if https_only else "")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] not in ("http", "websocket") or scope["path"].startswith(self.exclude_paths):
+            await self.app(scope, receive, send)
+            return
+
+        session_id = None
+        data = {}
+        expires_at = 0.0
+        cookie = HTTPConnection(scope).cookies.get(self.session_cookie)
+        if cookie:
+            try:
+                session_id = self.signer.unsign(cookie).decode("utf-8")
+            except BadSignature:
+                session_id = None
+            loaded = self.store.load(session_id) if session_id else None
+            if loaded is None:
+                session_id = None
+            else:
+                data, expires_at = loaded
+
+        scope["session"] = data
+        original = json.dumps(data, sort_keys=True)
+
+        async def send_wrapper(message):
+            nonlocal session_id
+            if message["type"] == "http.response.start":
+                session = scope["session"]
+                changed = json.dumps(session, sort_keys=True) != original
+                headers = MutableHeaders(scope=message)
+
+                if session and (changed or expires_at - time.time() < self.max_age / 2):
+                    if session_id is None:
+                        session_id = secrets.token_urlsafe(32)
+                    self.store.save(session_id, session)
+                    value = self.signer.sign(session_id).decode("utf-8")
+                    headers.append(
+                        "Set-Cookie",
+                        f"{self.session_cookie}={value}; path=/; Max-Age={self.max_age}; {self.security_flags}"
+                    )
+                elif not session and session_id is not None:
+                    self.store.delete(session_id)
+                    headers.append(
+                        "Set-Cookie",
+                        f"{self.session_cookie}=null; path=/; expires=Thu, 01 Jan 1970 00:00:00 GMT; "
+                        f"{self.security_flags}"
+                    )
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
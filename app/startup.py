@@ -0,0 +1,83 @@
+import time
+import asyncio
+import logging
+import importlib
+from app import STARTED
+
+logger = logging.getLogger(__name__)
+
+# Heavy SDKs, imported on first use or by the background warmup
+HEAVY_MODULES = (
+    "httpx",
+    "anthropic",
+    "openai",
+    "httplib2",
+    "google_auth_httplib2",
+    "google.oauth2.credentials",
+    "google_auth_oauthlib.flow",
+    "googleapiclient.discovery",
+    "googleapiclient.http"
+)
+
+_report = {
+    "imports": {},
+    "warmup": {},
+    "app_ready": None,
+    "warmup_done": None,
+    "first_request": None
+}
+
+
+def since_start() -> float:
+    return round(time.monotonic() - STARTED, 3)
+
+
+def timed_imports(*names, section: str = "imports"):
+    """Import modules in order, recording each one's (incremental) import time"""
+    for name in names:
+        start = time.monotonic()
+        importlib.import_module(name)
+        _report[section][name] = round(time.monotonic() - start, 3)
+
+
+def mark(event: str):
+    """Record when a startup milestone was reached, relative to STARTED"""
+    if _report[event] is None:
+        _report[event] = since_start()
+
+
+async def warm_up(*steps):
+    """
+    Import the heavy SDKs in a worker thread once the server is listening,
+    then run the given coroutine functions (e.g. creating provider clients)
+    Requests arriving first import what they need themselves
+    """
+    try:
+        await asyncio.to_thread(timed_imports, *HEAVY_MODULES, section="warmup")
+        for step in steps:
+            await step()
+    except Exception as e:
+        logger.warning(f"Background warmup failed: {str(e)}")
+        return
+    mark("warmup_done")
+    logger.info(f"Startup: {startup_report()}")
+
+
+def startup_report() -> dict:
+    """Import times per module and time to app ready, warmup and first request (seconds)"""
+    return {key: dict(value) if isinstance(value, dict) else value for key, value in _report.items()}
+
+
+class FirstRequestTimer:
+    """ASGI middleware recording when the first HTTP request arrives"""
+
+    def __init__(self, app):
+        self.app = app
+        self.seen = False
+
+    async def __call__(self, scope, receive, send):
+        if not self.seen and scope["type"] == "http":
+            self.seen = True
+            mark("first_request")
+            logger.info(f"First request {since_start():.3f}s after startup ({scope['path']})")
+        await self.app(scope, receive, send)
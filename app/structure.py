@@ -0,0 +1,159 @@
+import re
+
+# Required ### sections of every session, in order, with the heading pattern
+# that identifies each (see SESSION_SECTIONS in app.generator)
+# (patterns are tried in this order, so "Reflection Questions" is a reflection)
+REQUIRED_SECTIONS = (
+    ("Key Scripture Passage", re.compile(r"scripture|passage|key\s+verses?|bible\s+reading", re.IGNORECASE)),
+    ("Summary/Overview", re.compile(r"summary|overview|introduction|big\s+idea|main\s+idea", re.IGNORECASE)),
+    ("Discussion Questions", re.compile(
+        r"discuss|^(?:###\s*)?(?:group\s+|study\s+)?questions\b", re.IGNORECASE
+    )),
+    ("Personal Reflection", re.compile(r"reflect|journal|meditat", re.IGNORECASE)),
+    ("Application Challenges", re.compile(
+        r"application|challenge|apply|action\s+steps|living\s+it\s+out", re.IGNORECASE
+    )),
+    ("Leader Notes", re.compile(r"leader|facilitator", re.IGNORECASE))
+)
+SECTION_NAMES = tuple(name for name, _ in REQUIRED_SECTIONS)
+
+# A section with less body text than this (e.g. a bare heading) counts as missing
+MIN_SECTION_CHARS = 20
+
+# ## (session) and ### (section) headings; #### subsections belong to their section
+HEADING_RE = re.compile(r"^(#{2,3})(?!#)[ \t]*(.*?)[ \t]*$", re.MULTILINE)
+SESSION_NUMBER_RE = re.compile(r"session\s+(\d+)", re.IGNORECASE)
+
+# Stop reasons meaning the output hit its token limit (Anthropic, OpenAI)
+TRUNCATED_STOP_REASONS = ("max_tokens", "length")
+
+
+def section_name(heading: str) -> str:
+    """Required section a ### heading stands for, or None"""
+    for name, pattern in REQUIRED_SECTIONS:
+        if pattern.search(heading):
+            return name
+    return None
+
+
+def split_sessions(markdown: str) -> tuple:
+    """
+    Split a whole guide into sessions at its "## Session N" headings
+    Returns (preamble, [(session number, text)]); other ## blocks (e.g. a
+    closing section) stay with the session before them. If no heading is
+    numbered, every ## heading starts a session, numbered in order
+    """
+    starts = [match for match in HEADING_RE.finditer(markdown) if match.group(1) == "##"]
+    numbers = [SESSION_NUMBER_RE.search(match.group(2)) for match in starts]
+    if any(numbers):
+        starts = [match for match, number in zip(starts, numbers) if number]
+        numbers = [int(number.group(1)) for number in numbers if number]
+    else:
+        numbers = list(range(1, len(starts) + 1))
+    if not starts:
+        return markdown, []
+
+    sessions = []
+    for index, (match, number) in enumerate(zip(starts, numbers)):
+        end = starts[index + 1].start() if index + 1 < len(starts) else len(markdown)
+        sessions.append((number, markdown[match.start():end]))
+    return markdown[:starts[0].start()], sessions
+
+
+def split_sections(session: str) -> tuple:
+    """
+    Split one session on its ### headings
+    Returns (intro, [(required section name or None, text)]); a repeated
+    required section is kept under None so only its first occurrence counts
+    """
+    starts = [match for match in HEADING_RE.finditer(session) if match.group(1) == "###"]
+    if not starts:
+        return session, []
+
+    sections = []
+    seen = set()
+    for index, match in enumerate(starts):
+        end = starts[index + 1].start() if index + 1 < len(starts) else len(session)
+        name = section_name(match.group(2))
+        if name in seen:
+            name = None
+        seen.add(name)
+        sections.append((name, session[match.start():end]))
+    return session[:starts[0].start()], sections
+
+
+def section_body_length(text: str) -> int:
+    """Non-whitespace characters after a section's heading line"""
+    body = text.split("\n", 1)[1] if "\n" in text else ""
+    return len("".join(body.split()))
+
+
+def check_session(session: str, truncated: bool = False) -> tuple:
+    """
+    Check a session against the required sections
+    If the output was truncated, its last section is cut off and is dropped
+    Returns (session text to keep, missing section names in order)
+    """
+    intro, sections = split_sections(session)
+    if truncated:
+        if sections:
+            sections = sections[:-1]
+        else:
+            intro = intro.rstrip() + "\n\n"
+
+    kept = intro + "".join(text for _, text in sections)
+    present = {name for name, text in sections if name and section_body_length(text) >= MIN_SECTION_CHARS}
+    missing = [name for name in SECTION_NAMES if name not in present]
+
+    # An unrecognised section where a missing one belongs (between the required
+    # sections around it) is taken to be that section rather than paying for a repair
+    order = {name: index for index, name in enumerate(SECTION_NAMES)}
+    position = -1
+    for index, (name, text) in enumerate(sections):
+        if name is not None:
+            position = order[name]
+            continue
+        if section_name(text.split("\n", 1)[0]) or section_body_length(text) < MIN_SECTION_CHARS:
+            # A repeated required section, or a bare heading
+            continue
+        following = next((order[other] for other, _ in sections[index + 1:] if other), len(SECTION_NAMES))
+        gap = [missing_name for missing_name in missing if position < order[missing_name] < following]
+        if gap:
+            missing.remove(gap[0])
+            position = order[gap[0]]
+    return kept, missing
+
+
+def splice_sections(session: str, additions: str, wanted: list) -> tuple:
+    """
+    Insert the wanted sections found in `additions` into a session, each at its
+    required position; empty or bare-heading copies in the session are replaced
+    Returns (spliced session, names still missing)
+    """
+    _, new_sections = split_sections(additions)
+    found = {}
+    for name, text in new_sections:
+        if name in wanted and name not in found and section_body_length(text) >= MIN_SECTION_CHARS:
+            found[name] = text.rstrip() + "\n\n"
+
+    intro, sections = split_sections(session)
+    order = {name: index for index, name in enumerate(SECTION_NAMES)}
+
+    # Unrecognised sections stay after the required section they follow
+    placed = []
+    position = -1
+    for name, text in sections:
+        if name in found:
+            continue
+        if name is not None:
+            position = order[name]
+        placed.append((position, text))
+    placed.extend((order[name], text) for name, text in found.items())
+    placed.sort(key=lambda item: item[0])
+
+    body = "".join(text if text.endswith("\n") else text + "\n\n" for _, text in placed)
+    return intro + body, [name for name in wanted if name not in found]
+
+
+def is_truncated(stop_reason: str) -> bool:
+    return stop_reason in TRUNCATED_STOP_REASONS
@@ -0,0 +1,217 @@
+import io
+import os
+import re
+import json
+import asyncio
+import logging
+import threading
+from collections import OrderedDict
+from app.cache import content_hash
+
+logger = logging.getLogger(__name__)
+
+# Cleanup rules applied to every transcript before prompt building, in order
+# (comma-separated names of the rules below; empty disables cleanup)
+TRANSCRIPT_CLEANUP_RULES = os.getenv(
+    "TRANSCRIPT_CLEANUP_RULES", "caption_cues,timestamps,speaker_labels,fillers,repeated_lines,whitespace"
+)
+
+# Optional JSON file of extra rules, applied after the built-in substitutions:
+# [{"name": "...", "pattern": "<regex>", "replacement": "", "ignore_case": false}]
+TRANSCRIPT_CLEANUP_RULES_FILE = os.getenv("TRANSCRIPT_CLEANUP_RULES_FILE")
+
+# Cleanup runs in the default thread pool; set above 0 to use that many worker
+# processes instead (regex matching holds the GIL, processes run in parallel)
+TRANSCRIPT_CLEANUP_PROCESSES = int(os.getenv("TRANSCRIPT_CLEANUP_PROCESSES", 0))
+
+# Cleaned transcripts kept in memory, by content hash
+TRANSCRIPT_CLEANUP_MEMO_SIZE = int(os.getenv("TRANSCRIPT_CLEANUP_MEMO_SIZE", 256))
+
+# Built-in substitutions, applied per line: (name, pattern, replacement)
+# A line emptied by a substitution is dropped. Timestamps need brackets or
+# three parts so scripture references (John 3:16) are left alone; speaker
+# labels may follow a >> turn marker, and a few all-caps words that open
+# ordinary sentences (NOTE:, PS:) are not labels; fillers
+# like "you know" are only removed where commas set them off
+SUBSTITUTIONS = {
+    "timestamps": [
+        (r"[\[(]\s*\d{1,2}:\d{2}(?::\d{2})?(?:[.,]\d{1,3})?\s*[\])]", "", 0),
+        (r"\b\d{1,2}:\d{2}:\d{2}(?:[.,]\d{1,3})?\b", "", 0)
+    ],
+    "speaker_labels": [
+        (
+            r"^\s*(?:>>+\s*)?(?:\[?(?:SPEAKER|Speaker)[ _]?\d*\]?:\s*"
+            r"|(?!(?:NOTE|NB|PS|WARNING|IMPORTANT):)[A-Z][A-Z.' -]{1,30}:\s+)|^\s*>>+\s*",
+            "", 0
+        )
+    ],
+    "fillers": [
+        (r"\b(?:um+|uh+|erm+|hmm+|mm+)\b,?\s*", "", re.IGNORECASE),
+        (r",\s*(?:you know|I mean)\s*,", ",", re.IGNORECASE),
+        (r"(^|[.!?]\s+)(?:you know|I mean),\s*", r"\1", re.IGNORECASE)
+    ]
+}
+
+# Built-in steps that look beyond one line rather than substituting
+LINE_STEPS = ("caption_cues", "repeated_lines", "whitespace")
+
+# Caption files (WebVTT or SubRip) have a WEBVTT header or cue timing lines;
+# only in those are headers, NOTE blocks, cue numbers and timings dropped
+CAPTION_FILE_RE = re.compile(r"\A\ufeff?\s*WEBVTT|^\s*\d{1,2}:\d{2}(?::\d{2})?[.,]\d{3}\s*-->", re.MULTILINE)
+CAPTION_CUE_RE = re.compile(r"^\s*(?:WEBVTT.*|NOTE\b.*|\d+|\d{1,2}:\d{2}(?::\d{2})?[.,]\d{3}\s*-->.*)\s*$")
+
+SPACES_RE = re.compile(r"[ \t]{2,}")
+SPACE_BEFORE_PUNCTUATION_RE = re.compile(r"[ \t]+([,.;:!?])")
+DOUBLE_COMMA_RE = re.compile(r",\s*,")
+
+
+class CleanupRules:
+    """Compiled cleanup rules; signature identifies them in memo keys"""
+
+    def __init__(self, names: list, extra: list = None):
+        unknown = [name for name in names if name not in SUBSTITUTIONS and name not in LINE_STEPS]
+        if unknown:
+            raise ValueError(f"Unknown transcript cleanup rule(s): {', '.join(unknown)}")
+
+        specs = [spec for name in names for spec in SUBSTITUTIONS.get(name, ())]
+        for rule in extra or ():
+            flags = re.IGNORECASE if rule.get("ignore_case") else 0
+            specs.append((rule["pattern"], rule.get("replacement", ""), flags))
+
+        self.names = list(names) + [rule.get("name", "custom") for rule in extra or ()]
+        self.substitutions = [(re.compile(pattern, flags), replacement) for pattern, replacement, flags in specs]
+        self.caption_cues = "caption_cues" in names
+        self.repeated_lines = "repeated_lines" in names
+        self.whitespace = "whitespace" in names
+        self.signature = content_hash("cleanup", names, [list(spec) for spec in specs])
+
+    def __bool__(self):
+        return bool(self.substitutions or self.caption_cues or self.repeated_lines or self.whitespace)
+
+
+def load_rules() -> CleanupRules:
+    """Rules configured by TRANSCRIPT_CLEANUP_RULES and TRANSCRIPT_CLEANUP_RULES_FILE"""
+    names = [name.strip() for name in TRANSCRIPT_CLEANUP_RULES.split(",") if name.strip()]
+    extra = []
+    if TRANSCRIPT_CLEANUP_RULES_FILE:
+        with open(TRANSCRIPT_CLEANUP_RULES_FILE, "r", encoding="utf-8") as f:
+            extra = json.load(f)
+    return CleanupRules(names, extra)
+
+
+rules = load_rules()
+
+
+def clean_lines(lines, cleanup_rules: CleanupRules, captions: bool = False):
+    """
+    Clean an iterable of lines, yielding cleaned lines (without newlines)
+    captions: the lines are a caption file, so caption cue lines are dropped
+    """
+    drop_cues = captions and cleanup_rules.caption_cues
+    previous = None
+    pending_blank = False
+    for raw in lines:
+        line = raw.rstrip("\r\n")
+        if not line.strip():
+            # Blank lines separate paragraphs; with whitespace cleanup, runs become one
+            if not cleanup_rules.whitespace:
+                yield ""
+            elif previous is not None:
+                pending_blank = True
+            continue
+        if drop_cues and CAPTION_CUE_RE.match(line):
+            continue
+
+        for pattern, replacement in cleanup_rules.substitutions:
+            line = pattern.sub(replacement, line)
+            if not line.strip():
+                break
+        if cleanup_rules.whitespace:
+            line = SPACES_RE.sub(" ", line)
+            line = SPACE_BEFORE_PUNCTUATION_RE.sub(r"\1", line)
+            line = DOUBLE_COMMA_RE.sub(",", line).strip()
+        if not line.strip():
+            continue
+
+        # Auto-captions often repeat a line; compare ignoring case and spacing
+        normalized = " ".join(line.lower().split())
+        if cleanup_rules.repeated_lines and normalized == previous:
+            continue
+        previous = normalized
+
+        if pending_blank:
+            yield ""
+            pending_blank = False
+        yield line
+
+
+def clean_transcript(text: str, cleanup_rules: CleanupRules = None) -> str:
+    """Clean one transcript, streaming it line by line"""
+    cleanup_rules = cleanup_rules or rules
+    if not cleanup_rules:
+        return text
+    captions = bool(CAPTION_FILE_RE.search(text))
+    return "\n".join(clean_lines(io.StringIO(text), cleanup_rules, captions))
+
+
+class CleanupMemo:
+    """Cleaned transcripts by content hash (of the rules and the raw text), least recently used dropped"""
+
+    def __init__(self, max_entries: int = TRANSCRIPT_CLEANUP_MEMO_SIZE):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: str):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+cleanup_memo = CleanupMemo()
+_process_pool = None
+
+
+def _executor():
+    """Process pool when TRANSCRIPT_CLEANUP_PROCESSES is set, else None (the default thread pool)"""
+    global _process_pool
+    if TRANSCRIPT_CLEANUP_PROCESSES > 0 and _process_pool is None:
+        from concurrent.futures import ProcessPoolExecutor
+        _process_pool = ProcessPoolExecutor(max_workers=TRANSCRIPT_CLEANUP_PROCESSES)
+    return _process_pool
+
+
+async def clean_sermons(sermons: list) -> tuple:
+    """
+    Clean sermon transcripts off the event loop, reusing memoized results
+    Returns (sermons with cleaned content, [(bytes before, bytes after)] per sermon)
+    """
+    if not rules:
+        sizes = [len(sermon["content"].encode("utf-8")) for sermon in sermons]
+        return list(sermons), [(size, size) for size in sizes]
+
+    loop = asyncio.get_running_loop()
+
+    async def clean(content: str) -> str:
+        key = content_hash(rules.signature, content)
+        cleaned = cleanup_memo.get(key)
+        if cleaned is None:
+            cleaned = await loop.run_in_executor(_executor(), clean_transcript, content)
+            cleanup_memo.set(key, cleaned)
+        return cleaned
+
+    cleaned = await asyncio.gather(*[clean(sermon["content"]) for sermon in sermons])
+    sizes = [
+        (len(sermon["content"].encode("utf-8")), len(content.encode("utf-8")))
+        for sermon, content in zip(sermons, cleaned)
+    ]
+    return [{**sermon, "content": content} for sermon, content in zip(sermons, cleaned)], sizes
@@ -0,0 +1,401 @@
+import re
+import json
+import hashlib
+import time
+import uuid
+import random
+import asyncio
+import threading
+from email.parser import Parser
+from urllib.parse import urlsplit, parse_qs
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from app.structure import SECTION_NAMES
+
+# Words used to fill fake transcripts and generated text
+WORDS = (
+    "grace faith hope love mercy covenant promise kingdom spirit truth light "
+    "shepherd servant prayer psalm gospel church disciple wisdom peace joy"
+).split()
+
+
+class FakeConfig:
+    """Behaviour of the fake provider and Drive servers"""
+
+    def __init__(self, first_token_latency: float = 0.5, tokens_per_second: float = 200.0,
+                 output_tokens: int = 400, error_rate: float = 0.0, rate_limit_rate: float = 0.0,
+                 truncate_rate: float = 0.0, drive_latency: float = 0.05, drive_files: int = 200,
+                 transcript_words: int = 1500, seed: int = 1):
+        self.first_token_latency = first_token_latency
+        self.tokens_per_second = tokens_per_second
+        self.output_tokens = output_tokens
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.truncate_rate = truncate_rate
+        self.drive_latency = drive_latency
+        self.drive_files = drive_files
+        self.transcript_words = transcript_words
+        self.random = random.Random(seed)
+
+    def failure(self):
+        """"rate_limit", "error" or None for the next provider request"""
+        roll = self.random.random()
+        if roll < self.rate_limit_rate:
+            return "rate_limit"
+        if roll < self.rate_limit_rate + self.error_rate:
+            return "error"
+        return None
+
+    def text_chunks(self, body: dict) -> tuple:
+        """
+        Output for a request split into streaming chunks (about one token each)
+        and whether it was cut off at the token limit; study guide requests get
+        the required session structure (see response_outline)
+        """
+        chunks = []
+        headings = response_outline(json.dumps(body))
+        per_heading = max(1, self.output_tokens // max(1, len(headings)))
+        for heading in headings:
+            if heading:
+                chunks.append(f"{heading}\n\n")
+            chunks.extend(self.random.choice(WORDS) + " " for _ in range(per_heading))
+            chunks.append("\n\n")
+
+        truncated = self.random.random() < self.truncate_rate
+        if truncated:
+            chunks = chunks[:int(len(chunks) * 0.6)]
+        return chunks, truncated
+
+
+def response_outline(request_text: str) -> list:
+    """Headings of the fake response: whole guides, single sessions or only the sections a repair asks for"""
+    repair = re.search(r"missing these required sections: ([^.]*)\.", request_text)
+    if repair:
+        return [f"### {name}" for name in repair.group(1).split(", ")]
+
+    def session(number: int) -> list:
+        return [f"## Session {number}: Fake Session"] + [f"### {name}" for name in SECTION_NAMES]
+
+    single = re.search(r"Generate Session (\d+) now", request_text)
+    if single:
+        return session(int(single.group(1)))
+    guide = re.search(r"Generate the complete study guide now, with all (\d+) sessions", request_text)
+    if guide:
+        return [heading for number in range(1, int(guide.group(1)) + 1) for heading in session(number)]
+    return [""]
+
+
+def transcript(file_id: str, words: int) -> str:
+    rng = random.Random(file_id)
+    return " ".join(rng.choice(WORDS) for _ in range(words))
+
+
+def estimate_input_tokens(body: dict) -> int:
+    return len(json.dumps(body)) // 4
+
+
+def create_anthropic_app(config: FakeConfig) -> FastAPI:
+    """Stand-in for the Anthropic Messages API (streaming and non-streaming)"""
+    app = FastAPI()
+
+    def headers():
+        return {
+            "anthropic-ratelimit-requests-limit": "1000",
+            "anthropic-ratelimit-requests-remaining": "999",
+            "anthropic-ratelimit-input-tokens-limit": "10000000",
+            "anthropic-ratelimit-input-tokens-remaining": "9999999"
+        }
+
+    @app.post("/v1/messages")
+    async def messages(request: Request):
+        body = await request.json()
+        failure = config.failure()
+        if failure == "rate_limit":
+            return JSONResponse(
+                {"type": "error", "error": {"type": "rate_limit_error", "message": "Rate limited (fake)"}},
+                status_code=429, headers={"retry-after": "1"}
+            )
+        if failure == "error":
+            return JSONResponse(
+                {"type": "error", "error": {"type": "overloaded_error", "message": "Overloaded (fake)"}},
+                status_code=529
+            )
+
+        chunks, truncated = config.text_chunks(body)
+        stop_reason = "max_tokens" if truncated else "end_turn"
+        usage = {"input_tokens": estimate_input_tokens(body), "output_tokens": len(chunks)}
+
+        if not body.get("stream"):
+            await asyncio.sleep(config.first_token_latency + len(chunks) / config.tokens_per_second)
+            return JSONResponse({
+                "id": f"msg_{uuid.uuid4().hex}", "type": "message", "role": "assistant",
+                "model": body["model"], "content": [{"type": "text", "text": "".join(chunks)}],
+                "stop_reason": stop_reason, "stop_sequence": None, "usage": usage
+            }, headers=headers())
+
+        async def events():
+            def event(name, data):
+                return f"event: {name}\ndata: {json.dumps(data)}\n\n"
+
+            await asyncio.sleep(config.first_token_latency)
+            yield event("message_start", {"type": "message_start", "message": {
+                "id": f"msg_{uuid.uuid4().hex}", "type": "message", "role": "assistant", "model": body["model"],
+                "content": [], "stop_reason": None, "stop_sequence": None,
+                "usage": {"input_tokens": usage["input_tokens"], "output_tokens": 1}
+            }})
+            yield event("content_block_start", {
+                "type": "content_block_start", "index": 0, "content_block": {"type": "text", "text": ""}
+            })
+            for chunk in chunks:
+                yield event("content_block_delta", {
+                    "type": "content_block_delta", "index": 0, "delta": {"type": "text_delta", "text": chunk}
+                })
+                await asyncio.sleep(1 / config.tokens_per_second)
+            yield event("content_block_stop", {"type": "content_block_stop", "index": 0})
+            yield event("message_delta", {
+                "type": "message_delta", "delta": {"stop_reason": stop_reason, "stop_sequence": None},
+                "usage": {"output_tokens": usage["output_tokens"]}
+            })
+            yield event("message_stop", {"type": "message_stop"})
+
+        return StreamingResponse(events(), media_type="text/event-stream", headers=headers())
+
+    return app
+
+
+def create_openai_app(config: FakeConfig) -> FastAPI:
+    """Stand-in for the OpenAI Chat Completions API (streaming and non-streaming)"""
+    app = FastAPI()
+
+    def headers():
+        return {
+            "x-ratelimit-limit-requests": "10000",
+            "x-ratelimit-remaining-requests": "9999",
+            "x-ratelimit-limit-tokens": "10000000",
+            "x-ratelimit-remaining-tokens": "9999999"
+        }
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        failure = config.failure()
+        if failure == "rate_limit":
+            return JSONResponse(
+                {"error": {"type": "requests", "code": "rate_limit_exceeded", "message": "Rate limited (fake)"}},
+                status_code=429, headers={"retry-after": "1"}
+            )
+        if failure == "error":
+            return JSONResponse(
+                {"error": {"type": "server_error", "message": "Server error (fake)"}}, status_code=500
+            )
+
+        chunks, truncated = config.text_chunks(body)
+        finish_reason = "length" if truncated else "stop"
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+        usage = {
+            "prompt_tokens": estimate_input_tokens(body),
+            "completion_tokens": len(chunks),
+            "total_tokens": estimate_input_tokens(body) + len(chunks)
+        }
+
+        if not body.get("stream"):
+            await asyncio.sleep(config.first_token_latency + len(chunks) / config.tokens_per_second)
+            return JSONResponse({
+                "id": completion_id, "object": "chat.completion", "created": 0, "model": body["model"],
+                "choices": [{
+                    "index": 0, "finish_reason": finish_reason,
+                    "message": {"role": "assistant", "content": "".join(chunks)}
+                }],
+                "usage": usage
+            }, headers=headers())
+
+        async def events():
+            def chunk_event(delta, finish_reason=None, chunk_usage=None):
+                data = {
+                    "id": completion_id, "object": "chat.completion.chunk", "created": 0, "model": body["model"],
+                    "choices": [] if chunk_usage else [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+                    "usage": chunk_usage
+                }
+                return f"data: {json.dumps(data)}\n\n"
+
+            await asyncio.sleep(config.first_token_latency)
+            for chunk in chunks:
+                yield chunk_event({"content": chunk})
+                await asyncio.sleep(1 / config.tokens_per_second)
+            yield chunk_event({}, finish_reason)
+            if (body.get("stream_options") or {}).get("include_usage"):
+                yield chunk_event({}, chunk_usage=usage)
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream", headers=headers())
+
+    return app
+
+
+def create_drive_app(config: FakeConfig) -> FastAPI:
+    """
+    Stand-in for the Drive v3 endpoints the app uses: files.list, files.get
+    (metadata and media), batch requests, multipart and resumable (chunked)
+    uploads, and changes (the change feed is always empty)
+    """
+    app = FastAPI()
+    folders = [f"folder{n}" for n in range(max(1, config.drive_files // 20))]
+    files = [
+        {
+            "id": f"file{n:05d}",
+            "name": f"Sermon {n:05d}.txt",
+            "mimeType": "text/plain",
+            "parents": [folders[n % len(folders)]],
+            "modifiedTime": "2024-01-01T00:00:00.000Z"
+        }
+        for n in range(config.drive_files)
+    ]
+    uploads = {}
+
+    def content_fields(file_id: str) -> dict:
+        content = transcript(file_id, config.transcript_words).encode("utf-8")
+        return {"size": str(len(content)), "md5Checksum": hashlib.md5(content).hexdigest(), "version": "1"}
+
+    def metadata(file_id: str):
+        if file_id.startswith("folder"):
+            return {"id": file_id, "name": f"Series {file_id[6:]}"}
+        return {"id": file_id, "name": f"{file_id}.txt", **content_fields(file_id)}
+
+    for file in files:
+        file.update(content_fields(file["id"]))
+
+    @app.get("/drive/v3/files")
+    async def list_files(request: Request):
+        await asyncio.sleep(config.drive_latency)
+        query = request.query_params
+        page_size = int(query.get("pageSize", 100))
+        start = int(query.get("pageToken") or 0)
+        page = {"files": files[start:start + page_size]}
+        if start + page_size < len(files):
+            page["nextPageToken"] = str(start + page_size)
+        return page
+
+    @app.get("/drive/v3/files/{file_id}")
+    async def get_file(file_id: str, request: Request):
+        await asyncio.sleep(config.drive_latency)
+        if request.query_params.get("alt") == "media":
+            return Response(transcript(file_id, config.transcript_words), media_type="text/plain")
+        return metadata(file_id)
+
+    @app.get("/drive/v3/changes/startPageToken")
+    async def start_page_token():
+        return {"startPageToken": "1"}
+
+    @app.get("/drive/v3/changes")
+    async def changes(request: Request):
+        await asyncio.sleep(config.drive_latency)
+        return {"changes": [], "newStartPageToken": request.query_params.get("pageToken", "1")}
+
+    @app.post("/batch/drive/v3")
+    async def batch(request: Request):
+        await asyncio.sleep(config.drive_latency)
+        body = (await request.body()).decode("utf-8")
+        message = Parser().parsestr(f"Content-Type: {request.headers['content-type']}\r\n\r\n{body}")
+        boundary = f"batch_{uuid.uuid4().hex}"
+        parts = []
+        for part in message.get_payload():
+            request_line = part.get_payload().split("\n", 1)[0]
+            path = urlsplit(request_line.split(" ")[1]).path
+            content_id = part["Content-ID"].replace("<", "<response-", 1)
+            parts.append(
+                f"--{boundary}\r\nContent-Type: application/http\r\nContent-ID: {content_id}\r\n\r\n"
+                f"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n\r\n"
+                f"{json.dumps(metadata(path.rsplit('/', 1)[1]))}\r\n"
+            )
+        content = "".join(parts) + f"--{boundary}--\r\n"
+        return Response(content, media_type=f"multipart/mixed; boundary={boundary}")
+
+    @app.post("/upload/drive/v3/files")
+    async def start_upload(request: Request):
+        await asyncio.sleep(config.drive_latency)
+        await request.body()
+        upload_id = uuid.uuid4().hex
+        if request.query_params.get("uploadType") == "multipart":
+            # Metadata and content in one request
+            file_id = f"upload{upload_id[:12]}"
+            return {"id": file_id, "webViewLink": f"https://drive.example/{file_id}"}
+        uploads[upload_id] = 0
+        location = f"{request.base_url}upload/drive/v3/files?uploadType=resumable&upload_id={upload_id}"
+        return Response(status_code=200, headers={"Location": location})
+
+    @app.put("/upload/drive/v3/files")
+    async def finish_upload(request: Request):
+        await asyncio.sleep(config.drive_latency)
+        received = len(await request.body())
+        upload_id = parse_qs(urlsplit(str(request.url)).query).get("upload_id", [""])[0]
+        uploads[upload_id] = uploads.get(upload_id, 0) + received
+        if request.headers.get("content-range", "").endswith("/*"):
+            # Chunk of an unfinished upload
+            return Response(status_code=308, headers={"Range": f"bytes=0-{uploads[upload_id] - 1}"})
+        uploads.pop(upload_id, None)
+        file_id = f"upload{upload_id[:12]}"
+        return {"id": file_id, "webViewLink": f"https://drive.example/{file_id}"}
+
+    return app
+
+
+class FakeBatchClient:
+    """
+    In-process stand-in for the Message Batches API, pluggable as the batch
+    poller's client (see app.batches.AnthropicBatchClient): batches end `delay`
+    seconds after submission and requests fail at the config's error rate
+    """
+
+    def __init__(self, config: FakeConfig, delay: float = 1.0):
+        self.config = config
+        self.delay = delay
+        self.batches = {}
+
+    async def create(self, requests: list) -> str:
+        batch_id = f"msgbatch_{uuid.uuid4().hex}"
+        self.batches[batch_id] = (time.monotonic() + self.delay, requests)
+        return batch_id
+
+    async def ended(self, batch_id: str) -> bool:
+        return time.monotonic() >= self.batches[batch_id][0]
+
+    async def results(self, batch_id: str) -> dict:
+        _, requests = self.batches.pop(batch_id)
+        results = {}
+        for request in requests:
+            if self.config.failure() == "error":
+                results[request["custom_id"]] = {"status": "errored", "error": "Overloaded (fake)"}
+                continue
+            chunks, truncated = self.config.text_chunks(request["params"])
+            results[request["custom_id"]] = {
+                "status": "succeeded",
+                "text": "".join(chunks),
+                "stop_reason": "max_tokens" if truncated else "end_turn",
+                "usage": {"input_tokens": estimate_input_tokens(request["params"]), "output_tokens": len(chunks)}
+            }
+        return results
+
+
+class BackgroundServer:
+    """Run an ASGI app with uvicorn on a free local port in its own thread and event loop"""
+
+    def __init__(self, app, port: int = 0):
+        self.config = uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning", lifespan="off")
+        self.server = uvicorn.Server(self.config)
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+
+    @property
+    def url(self) -> str:
+        port = self.server.servers[0].sockets[0].getsockname()[1]
+        return f"http://127.0.0.1:{port}"
+
+    def start(self) -> str:
+        self.thread.start()
+        while not self.server.started:
+            threading.Event().wait(0.01)
+        return self.url
+
+    def stop(self):
+        self.server.should_exit = True
+        self.thread.join(timeout=5)
@@ -0,0 +1,356 @@
+"""
+Offline load test: runs the app against local stand-ins for Anthropic, OpenAI
+and Google Drive, drives /api/generate and /api/list-files at the given
+concurrency levels and writes latency, throughput and event-loop blocking
+statistics to a JSON file
+
+    python -m bench.run --concurrency 1,4,16 --requests 32 --output bench/results/baseline.json
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import secrets
+import argparse
+import tempfile
+import threading
+import subprocess
+from datetime import datetime, timedelta
+import httpx
+from bench.fakes import (
+    FakeConfig, BackgroundServer, FakeBatchClient, create_anthropic_app, create_openai_app, create_drive_app
+)
+
+SCENARIOS = ("generate", "deferred", "list-files")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark bs-gen against fake providers and Drive")
+    parser.add_argument("--scenario", default="generate,list-files", help="comma-separated: generate, deferred, list-files")
+    parser.add_argument("--concurrency", default="1,4,16", help="comma-separated concurrency levels")
+    parser.add_argument("--requests", type=int, default=32, help="requests per scenario and concurrency level")
+    parser.add_argument("--users", type=int, default=0, help="distinct users (default: one per concurrent client)")
+    parser.add_argument("--model", default="claude-sonnet-4.5")
+    parser.add_argument("--sessions", type=int, default=4, help="transcripts per study guide")
+    parser.add_argument("--first-token-latency", type=float, default=0.5, help="seconds before the first token")
+    parser.add_argument("--tokens-per-second", type=float, default=200.0, help="streaming rate per response")
+    parser.add_argument("--output-tokens", type=int, default=400, help="tokens per generated response")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of provider calls failing with 5xx")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="fraction of provider calls getting 429")
+    parser.add_argument("--truncate-rate", type=float, default=0.0,
+                        help="fraction of provider responses cut off at the token limit")
+    parser.add_argument("--batch-delay", type=float, default=1.0, help="seconds until a fake message batch ends")
+    parser.add_argument("--drive-latency", type=float, default=0.05, help="seconds per Drive request")
+    parser.add_argument("--drive-files", type=int, default=200, help="text files in the fake Drive")
+    parser.add_argument("--job-workers", type=int, default=16, help="JOB_MAX_WORKERS for the app")
+    parser.add_argument("--output", default=None, help="JSON results path (default: bench/results/<timestamp>.json)")
+    parser.add_argument("--baseline", default=None, help="previous results JSON to compare against")
+    return parser.parse_args()
+
+
+def percentile(values: list, pct: float):
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return round(ordered[index], 4)
+
+
+def latency_summary(values: list) -> dict:
+    return {
+        "count": len(values),
+        "mean": round(sum(values) / len(values), 4) if values else None,
+        "min": round(min(values), 4) if values else None,
+        "p50": percentile(values, 50),
+        "p95": percentile(values, 95),
+        "p99": percentile(values, 99),
+        "max": round(max(values), 4) if values else None
+    }
+
+
+class LoopMonitor:
+    """Measures how long the app's event loop is blocked, by timing short sleeps on it"""
+
+    def __init__(self, interval: float = 0.01, threshold: float = 0.005):
+        self.interval = interval
+        self.threshold = threshold
+        self.reset()
+
+    def reset(self):
+        self.lags = []
+
+    async def run(self):
+        while True:
+            start = time.monotonic()
+            await asyncio.sleep(self.interval)
+            lag = time.monotonic() - start - self.interval
+            self.lags.append(max(0.0, lag))
+
+    def summary(self) -> dict:
+        blocked = [lag for lag in self.lags if lag > self.threshold]
+        return {
+            "samples": len(self.lags),
+            "blocked_seconds": round(sum(blocked), 4),
+            "blocked_events": len(blocked),
+            "max_lag": round(max(self.lags), 4) if self.lags else None,
+            "p99_lag": percentile(self.lags, 99)
+        }
+
+
+class AppServer(BackgroundServer):
+    """The app under test in its own thread, with the loop monitor on its event loop"""
+
+    def __init__(self, app, monitor: LoopMonitor):
+        super().__init__(app)
+        self.config.lifespan = "on"
+        self.monitor = monitor
+        self.thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        monitor = self.loop.create_task(self.monitor.run())
+        self.loop.run_until_complete(self.server.serve())
+        monitor.cancel()
+        self.loop.run_until_complete(asyncio.gather(monitor, return_exceptions=True))
+
+
+def configure_environment(args, anthropic_url: str, openai_url: str, drive_url: str):
+    """Point the app at the fakes; must run before app modules are imported"""
+    os.environ.update({
+        "ANTHROPIC_API_KEY": "fake-anthropic-key",
+        "ANTHROPIC_BASE_URL": anthropic_url,
+        "OPENAI_API_KEY": "fake-openai-key",
+        "OPENAI_BASE_URL": f"{openai_url}/v1",
+        "DRIVE_ROOT_URL": drive_url,
+        "DATA_DIR": tempfile.mkdtemp(prefix="bs-gen-bench-"),
+        "SESSION_SECRET_KEY": secrets.token_urlsafe(32),
+        "SESSION_STORE": "memory",
+        "JOB_MAX_WORKERS": str(args.job_workers),
+        "BATCH_POLL_INTERVAL": "0.2",
+        # Limits come from the fakes' rate-limit headers; don't throttle the first calls
+        "ANTHROPIC_RPM": "100000",
+        "ANTHROPIC_TPM": "100000000",
+        "OPENAI_RPM": "100000",
+        "OPENAI_TPM": "100000000"
+    })
+
+
+def login_cookies(main, users: int, drive_url: str) -> list:
+    """Create a server-side session per fake user and return their session cookies"""
+    from itsdangerous import Signer
+    signer = Signer(main.SESSION_SECRET)
+    expiry = (datetime.utcnow() + timedelta(days=1)).isoformat()
+    cookies = []
+    for n in range(users):
+        session_id = secrets.token_urlsafe(32)
+        main.session_store.save(session_id, {
+            "user": {"email": f"bench{n}@example.com", "name": f"Bench {n}", "picture": ""},
+            "credentials": {
+                "token": f"fake-token-{n}",
+                "refresh_token": f"fake-refresh-{n}",
+                "token_uri": f"{drive_url}/token",
+                "client_id": "fake-client",
+                "client_secret": "fake-secret",
+                "scopes": ["https://www.googleapis.com/auth/drive"],
+                "expiry": expiry
+            }
+        })
+        cookies.append({"session": signer.sign(session_id).decode("utf-8")})
+    return cookies
+
+
+async def follow_job(client: httpx.AsyncClient, events_url: str) -> tuple:
+    """Read a job's event stream until it ends; returns (success, seconds to first token or None)"""
+    start = time.monotonic()
+    first_token = None
+    event = None
+    async with client.stream("GET", events_url) as response:
+        async for line in response.aiter_lines():
+            if line.startswith("event: "):
+                event = line[7:]
+                if event == "token" and first_token is None:
+                    first_token = time.monotonic() - start
+            elif line.startswith("data: ") and event in ("complete", "error"):
+                return event == "complete", first_token
+    return False, first_token
+
+
+async def generate_once(client: httpx.AsyncClient, args, index: int, file_ids: list, deferred: bool = False) -> dict:
+    start = time.monotonic()
+    response = await client.post("/api/generate", data={
+        "series_title": f"Bench Series {index} {secrets.token_hex(4)}",
+        "target_audience": "Mixed",
+        "model": args.model,
+        "file_ids": ",".join(file_ids),
+        "deferred": "true" if deferred else "false"
+    })
+    submitted = time.monotonic() - start
+    if response.status_code != 202:
+        return {"ok": False, "latency": time.monotonic() - start, "submit": submitted}
+    success, first_token = await follow_job(client, response.json()["events_url"])
+    return {
+        "ok": success,
+        "latency": time.monotonic() - start,
+        "submit": submitted,
+        "first_token": None if first_token is None else submitted + first_token
+    }
+
+
+async def deferred_once(client: httpx.AsyncClient, args, index: int, file_ids: list) -> dict:
+    """Deferred generation: submit, then wait for the batch poller to save the guide"""
+    return await generate_once(client, args, index, file_ids, deferred=True)
+
+
+async def list_files_once(client: httpx.AsyncClient, args, index: int, file_ids: list) -> dict:
+    start = time.monotonic()
+    response = await client.get("/api/list-files")
+    return {"ok": response.status_code == 200, "latency": time.monotonic() - start}
+
+
+async def run_level(base_url: str, cookies: list, scenario: str, concurrency: int, args, monitor) -> dict:
+    """Run args.requests requests of one scenario with `concurrency` clients"""
+    operation = {"generate": generate_once, "deferred": deferred_once, "list-files": list_files_once}[scenario]
+    users = args.users or concurrency
+    clients = [
+        httpx.AsyncClient(base_url=base_url, cookies=cookies[n % len(cookies)], timeout=600)
+        for n in range(users)
+    ]
+    counter = iter(range(args.requests))
+    results = []
+
+    async def worker(worker_index: int):
+        client = clients[worker_index % len(clients)]
+        for index in counter:
+            first = (index * args.sessions) % max(1, args.drive_files - args.sessions)
+            file_ids = [f"file{n:05d}" for n in range(first, first + args.sessions)]
+            try:
+                results.append(await operation(client, args, index, file_ids))
+            except httpx.HTTPError as e:
+                results.append({"ok": False, "latency": 0.0, "error": str(e)})
+
+    monitor.reset()
+    start = time.monotonic()
+    await asyncio.gather(*(worker(n) for n in range(concurrency)))
+    elapsed = time.monotonic() - start
+    for client in clients:
+        await client.aclose()
+
+    succeeded = [result for result in results if result["ok"]]
+    summary = {
+        "scenario": scenario,
+        "concurrency": concurrency,
+        "requests": len(results),
+        "errors": len(results) - len(succeeded),
+        "elapsed_seconds": round(elapsed, 3),
+        "throughput_rps": round(len(succeeded) / elapsed, 3) if elapsed else None,
+        "latency": latency_summary([result["latency"] for result in succeeded]),
+        "loop_blocking": monitor.summary()
+    }
+    if scenario in ("generate", "deferred"):
+        summary["submit_latency"] = latency_summary([result["submit"] for result in succeeded])
+        summary["first_token_latency"] = latency_summary(
+            [result["first_token"] for result in succeeded if result.get("first_token") is not None]
+        )
+    return summary
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_summary(results: list, baseline: dict = None):
+    previous = {
+        (result["scenario"], result["concurrency"]): result for result in (baseline or {}).get("results", [])
+    }
+    print(f"{'scenario':<11} {'conc':>4} {'ok':>5} {'err':>4} {'p50':>8} {'p95':>8} {'p99':>8} {'rps':>8} {'blocked':>8}")
+    for result in results:
+        latency = result["latency"]
+        print(
+            f"{result['scenario']:<11} {result['concurrency']:>4} {result['requests'] - result['errors']:>5} "
+            f"{result['errors']:>4} {latency['p50'] or 0:>8.3f} {latency['p95'] or 0:>8.3f} "
+            f"{latency['p99'] or 0:>8.3f} {result['throughput_rps'] or 0:>8.2f} "
+            f"{result['loop_blocking']['blocked_seconds']:>8.3f}"
+        )
+        before = previous.get((result["scenario"], result["concurrency"]))
+        if before and before["latency"]["p95"] and latency["p95"] and before["throughput_rps"]:
+            print(
+                f"{'':<16} vs baseline: p95 {latency['p95'] / before['latency']['p95'] - 1:+.1%}, "
+                f"throughput {result['throughput_rps'] / before['throughput_rps'] - 1:+.1%}"
+            )
+
+
+def main():
+    args = parse_args()
+    scenarios = [name.strip() for name in args.scenario.split(",") if name.strip()]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        sys.exit(f"Unknown scenario(s): {', '.join(sorted(unknown))}")
+    levels = [int(level) for level in args.concurrency.split(",")]
+
+    config = FakeConfig(
+        first_token_latency=args.first_token_latency,
+        tokens_per_second=args.tokens_per_second,
+        output_tokens=args.output_tokens,
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate,
+        truncate_rate=args.truncate_rate,
+        drive_latency=args.drive_latency,
+        drive_files=args.drive_files
+    )
+    fakes = [
+        BackgroundServer(create_anthropic_app(config)),
+        BackgroundServer(create_openai_app(config)),
+        BackgroundServer(create_drive_app(config))
+    ]
+    anthropic_url, openai_url, drive_url = (server.start() for server in fakes)
+    configure_environment(args, anthropic_url, openai_url, drive_url)
+
+    from app import main as app_main
+    app_main.batch_poller.client = FakeBatchClient(config, delay=args.batch_delay)
+    monitor = LoopMonitor()
+    server = AppServer(app_main.app, monitor)
+    base_url = server.start()
+    cookies = login_cookies(app_main, max([args.users] + levels), drive_url)
+
+    results = []
+    try:
+        for scenario in scenarios:
+            for concurrency in levels:
+                print(f"Running {scenario} at concurrency {concurrency}...", flush=True)
+                results.append(asyncio.run(run_level(base_url, cookies, scenario, concurrency, args, monitor)))
+    finally:
+        server.stop()
+        for fake in fakes:
+            fake.stop()
+
+    report = {
+        "timestamp": datetime.utcnow().isoformat(),
+        "commit": git_commit(),
+        "python": sys.version.split()[0],
+        "config": vars(args),
+        "results": results
+    }
+    output = args.output or os.path.join(
+        os.path.dirname(__file__), "results", f"{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+    print_summary(results, baseline)
+    print(f"Results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -113,11 +113,226 @@ function toggleGenerateButton() {
     generateBtn.disabled = !(seriesTitle && targetAudience && model && hasFiles);
 }
 
+// Streamed guide text, keyed by session number (0 = whole guide in single mode)
+let sessionTexts = {};
+
+// Pending preview render (requestAnimationFrame id)
+let previewFrame = null;
+
+// Update the progress line in the loading overlay
+function setProgress(message) {
+    document.getElementById('loadingProgress').textContent = message;
+}
+
+// Render the guide preview from the sessions received so far, at most once
+// per animation frame (token events arrive far faster than the screen updates)
+function renderPreview() {
+    if (previewFrame !== null) {
+        return;
+    }
+    previewFrame = requestAnimationFrame(() => {
+        previewFrame = null;
+        const preview = document.getElementById('guidePreview');
+        const keys = Object.keys(sessionTexts).map(Number).sort((a, b) => a - b);
+        preview.textContent = keys.map(key => sessionTexts[key]).join('\n\n---\n\n');
+        preview.classList.remove('hidden');
+        preview.scrollTop = preview.scrollHeight;
+    });
+}
+
+// Handle one Server-Sent Event from the generation stream
+function handleStreamEvent(event, data) {
+    switch (event) {
+        case 'stage':
+            if (data.stage === 'drive_read' && data.status === 'completed') {
+                setProgress(`Read ${data.files} sermon file(s) in ${data.seconds.toFixed(1)}s`);
+            } else if (data.status === 'started') {
+                const labels = {
+                    drive_read: 'Reading sermon files from Google Drive...',
+                    generation: 'Generating study guide...',
+                    upload: 'Saving study guide to Google Drive...'
+                };
+                setProgress(labels[data.stage] || data.stage);
+            }
+            break;
+        case 'generation_started':
+            if (data.cached) {
+                setProgress('Reusing a previously generated guide...');
+            }
+            break;
+        case 'condensed':
+            setProgress(`Condensed long transcript(s) for session(s) ${data.sessions.join(', ')}`);
+            break;
+        case 'series_context':
+            if (data.status === 'started') {
+                setProgress('Planning the series...');
+            }
+            break;
+        case 'session_started':
+            sessionTexts[data.session] = '';
+            if (data.session) {
+                setProgress(`Writing session ${data.session}...`);
+            }
+            renderPreview();
+            break;
+        case 'token':
+            sessionTexts[data.session] = (sessionTexts[data.session] || '') + data.text;
+            renderPreview();
+            break;
+        case 'session_completed':
+            sessionTexts[data.session] = data.content;
+            if (data.session) {
+                setProgress(`Session ${data.session} complete`);
+            }
+            renderPreview();
+            break;
+        case 'session_failed':
+            sessionTexts[data.session] = `Session ${data.session} failed: ${data.error}`;
+            renderPreview();
+            break;
+    }
+}
+
+// Show the final result of a generation in the success or error modal
+function showResult(result) {
+    localStorage.removeItem('activeJobId');
+    document.getElementById('loadingOverlay').classList.add('hidden');
+    loadJobs();
+
+    if (result && result.success) {
+        // Show success modal
+        document.getElementById('driveLink').href = result.file_url;
+        document.getElementById('successModal').classList.remove('hidden');
+    } else {
+        // Show error modal
+        document.getElementById('errorMessage').textContent = (result && result.detail) || 'An unexpected error occurred.';
+        document.getElementById('errorModal').classList.remove('hidden');
+    }
+}
+
+// Deferred job handed to the batch queue: stop waiting and show it in the job list
+function showDeferred() {
+    localStorage.removeItem('activeJobId');
+    document.getElementById('loadingOverlay').classList.add('hidden');
+    document.getElementById('deferredModal').classList.remove('hidden');
+    loadJobs();
+}
+
+// Labels for job statuses in the job list
+const JOB_STATUS_LABELS = {
+    queued: 'Queued',
+    running: 'In progress',
+    deferred: 'Scheduled (within 24 hours)',
+    completed: 'Saved to Drive',
+    failed: 'Failed'
+};
+
+let jobsRefreshTimer = null;
+
+// Show the user's recent jobs; refresh while any are unfinished
+async function loadJobs() {
+    clearTimeout(jobsRefreshTimer);
+    let jobs;
+    try {
+        const response = await fetch('/api/jobs');
+        if (!response.ok) {
+            return;
+        }
+        jobs = (await response.json()).jobs;
+    } catch (error) {
+        console.error('Error loading jobs:', error);
+        return;
+    }
+
+    const list = document.getElementById('jobsList');
+    list.innerHTML = '';
+    jobs.forEach(job => {
+        const item = document.createElement('li');
+        item.className = 'job-item';
+
+        const title = document.createElement('span');
+        title.textContent = job.series_title;
+        item.appendChild(title);
+
+        const status = document.createElement('span');
+        status.className = `job-status ${job.status}`;
+        if (job.status === 'completed' && job.file_url) {
+            const link = document.createElement('a');
+            link.href = job.file_url;
+            link.target = '_blank';
+            link.textContent = JOB_STATUS_LABELS.completed;
+            status.appendChild(link);
+        } else {
+            status.textContent = JOB_STATUS_LABELS[job.status] || job.status;
+            if (job.error) {
+                status.title = job.error;
+            }
+        }
+        item.appendChild(status);
+        list.appendChild(item);
+    });
+    document.getElementById('jobsContainer').classList.toggle('hidden', jobs.length === 0);
+
+    if (jobs.some(job => !['completed', 'failed'].includes(job.status))) {
+        jobsRefreshTimer = setTimeout(loadJobs, 60000);
+    }
+}
+
+// Follow a background job's progress (EventSource reconnects automatically)
+function followJob(jobId) {
+    localStorage.setItem('activeJobId', jobId);
+    document.getElementById('loadingOverlay').classList.remove('hidden');
+
+    const source = new EventSource(`/api/jobs/${jobId}/events`);
+    const streamEvents = ['stage', 'generation_started', 'condensed', 'series_context', 'session_started', 'token', 'session_completed', 'session_failed'];
+
+    streamEvents.forEach(name => {
+        source.addEventListener(name, e => handleStreamEvent(name, JSON.parse(e.data)));
+    });
+
+    source.addEventListener('status', e => {
+        const job = JSON.parse(e.data);
+        if (job.status === 'deferred') {
+            source.close();
+            showDeferred();
+        } else if (job.status === 'queued') {
+            setProgress('Waiting for a free worker...');
+        } else if (job.progress && job.progress.sessions) {
+            setProgress(`In progress: ${job.progress.sessions_completed} of ${job.progress.sessions} sessions complete`);
+        }
+    });
+
+    source.addEventListener('complete', e => {
+        source.close();
+        showResult(JSON.parse(e.data));
+    });
+
+    source.addEventListener('error', e => {
+        // Server-sent error events carry data; connection errors do not
+        if (e.data) {
+            source.close();
+            showResult({ success: false, detail: JSON.parse(e.data).detail });
+        } else if (source.readyState === EventSource.CLOSED) {
+            fetch(`/api/jobs/${jobId}`).then(response => {
+                if (response.status === 404) {
+                    showResult({ success: false, detail: 'Generation job not found.' });
+                } else {
+                    setTimeout(() => followJob(jobId), 3000);
+                }
+            }).catch(() => setTimeout(() => followJob(jobId), 3000));
+        }
+    });
+}
+
 // Handle form submission
 async function handleSubmit(event) {
     event.preventDefault();
 
     // Show loading overlay
+    sessionTexts = {};
+    document.getElementById('guidePreview').textContent = '';
+    document.getElementById('guidePreview').classList.add('hidden');
+    setProgress('Starting...');
     document.getElementById('loadingOverlay').classList.remove('hidden');
 
     const formData = new FormData(event.target);
@@ -130,23 +345,14 @@ async function handleSubmit(event) {
 
         const result = await response.json();
 
-        // Hide loading overlay
-        document.getElementById('loadingOverlay').classList.add('hidden');
-
-        if (response.ok && result.success) {
-            // Show success modal
-            document.getElementById('driveLink').href = result.file_url;
-            document.getElementById('successModal').classList.remove('hidden');
+        if (response.ok && result.job_id) {
+            followJob(result.job_id);
         } else {
-            // Show error modal
-            document.getElementById('errorMessage').textContent = result.detail || 'An unexpected error occurred.';
-            document.getElementById('errorModal').classList.remove('hidden');
+            showResult({ success: false, detail: result.detail });
         }
     } catch (error) {
         console.error('Error:', error);
-        document.getElementById('loadingOverlay').classList.add('hidden');
-        document.getElementById('errorMessage').textContent = 'Network error: ' + error.message;
-        document.getElementById('errorModal').classList.remove('hidden');
+        showResult({ success: false, detail: 'Network error: ' + error.message });
     }
 }
 
@@ -154,6 +360,7 @@ async function handleSubmit(event) {
 function closeModal() {
     document.getElementById('successModal').classList.add('hidden');
     document.getElementById('errorModal').classList.add('hidden');
+    document.getElementById('deferredModal').classList.add('hidden');
 
     // Reset form
     document.getElementById('generateForm').reset();
@@ -181,4 +388,12 @@ document.addEventListener('DOMContentLoaded', function() {
 
     // Initialize display
     updateSelectedFilesDisplay();
+    loadJobs();
+
+    // Resume following a generation that was running before a reload
+    const activeJobId = localStorage.getItem('activeJobId');
+    if (activeJobId) {
+        setProgress('Reconnecting to your generation...');
+        followJob(activeJobId);
+    }
 });